@@ -4,11 +4,18 @@ import logging
 from src.core.settings import configure_settings
 from src.core.rag import initialize_rag_system
 from langchain_core.messages import HumanMessage
+from src.tools.response_cache import get_response_cache
+from src.tools.cassette import get_cassette
+from src.tools.blast_cache import get_blast_cache
+from src.agents.blast_agent.batch import prefetch_blast_results
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 开始前把待处理问题中的BLAST序列合并提交并写入缓存（需要启用BLAST结果缓存），默认关闭
+BLAST_BATCH = os.getenv("BLAST_BATCH", "0") == "1"
+
 def load_questions(file_path: str) -> dict:
     """从JSON文件加载嵌套结构问题"""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -44,6 +51,12 @@ def main():
     else:
         done_set = set()
     
+    # 回放模式不访问NCBI，预取没有意义
+    cassette = get_cassette()
+    if BLAST_BATCH and not (cassette is not None and cassette.replaying):
+        pending = [question for task, info in qas.items() for question in info if (task, question) not in done_set]
+        print(f"BLAST批量预取: {prefetch_blast_results(pending)}")
+    
     print(f"\n开始处理 {input_file}")
     print("="*50)
     
@@ -113,5 +126,17 @@ def main():
                 print("="*50)
                 continue
 
+    # 输出E-utilities缓存命中情况
+    cache = get_response_cache()
+    if cache is not None:
+        print(f"E-utilities缓存统计: {cache.stats()}")
+    blast_cache = get_blast_cache()
+    if blast_cache is not None:
+        print(f"BLAST结果缓存统计: {blast_cache.stats()}")
+    # 录制/回放模式（OPENBIO_HTTP_MODE=record/replay）下的cassette命中情况
+    cassette = get_cassette()
+    if cassette is not None:
+        print(f"HTTP cassette统计: {cassette.stats()}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,419 @@
+"""
+本地模拟的NCBI服务，实现EutilsComponent和BlastComponent用到的接口子集：
+- /entrez/eutils/{esearch,esummary,efetch,epost}.fcgi（支持usehistory=y和WebEnv/query_key）
+- /blast/Blast.cgi?CMD=Put|Get（签发RID，结果就绪前返回Status=WAITING）
+
+数据来自 fixtures/ncbi.json，可注入延迟和错误，用于无网络环境下的压测：
+
+    python -m mock_ncbi.server --port 8800 --latency 0.2 --jitter 0.1 --error-rate 0.05
+
+然后把组件指向本地服务：
+
+    EUTILS_BASE_URL=http://127.0.0.1:8800/entrez/eutils
+    BLAST_BASE_URL=http://127.0.0.1:8800/blast/Blast.cgi
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "ncbi.json")
+
+# esearch检索词中需要忽略的部分：字段限定如[gene]、布尔运算符
+FIELD_TAG = re.compile(r"\[[^\]]*\]")
+BOOLEAN_OPS = {"and", "or", "not"}
+
+class MockNCBI:
+    """模拟服务的状态：fixture数据、BLAST任务和注入配置"""
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 retry_after=None, blast_delay=5.0, seed=None):
+        self.records = {db: records for db, records in fixtures.items() if db != "blast"}
+        self.blast_fixtures = fixtures.get("blast", [])
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.blast_delay = blast_delay
+        self.rng = random.Random(seed)
+        self.jobs = {}
+        # History Server: WebEnv -> [(db, ids), ...]，query_key从1开始
+        self.history = {}
+        self.lock = threading.Lock()
+
+    # ---- 注入 ----
+
+    def delay(self):
+        with self.lock:
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency + extra > 0:
+            time.sleep(self.latency + extra)
+
+    def should_fail(self):
+        with self.lock:
+            return self.error_rate > 0 and self.rng.random() < self.error_rate
+
+    # ---- E-utilities ----
+
+    def esearch(self, params):
+        db = params.get("db", "")
+        if db not in self.records:
+            return {"error": f"Invalid db name specified: {db}"}
+        term = params.get("term", "")
+        tokens = [t for t in re.split(r"[\s+]+", FIELD_TAG.sub(" ", term).lower())
+                  if t and t not in BOOLEAN_OPS]
+        ids = [uid for uid, record in self.records[db].items() if self._matches(db, record, tokens)]
+        retstart = int(params.get("retstart", 0))
+        retmax = int(params.get("retmax", 20))
+        result = {
+            "count": str(len(ids)),
+            "retmax": str(len(ids[retstart:retstart + retmax])),
+            "retstart": str(retstart),
+        }
+        if params.get("usehistory") == "y":
+            webenv, query_key = self._post_history(params.get("WebEnv"), db, ids)
+            result.update({"querykey": query_key, "webenv": webenv})
+        result.update({
+            "idlist": ids[retstart:retstart + retmax],
+            "translationset": [],
+            "querytranslation": term,
+        })
+        return {"header": {"type": "esearch", "version": "0.3"}, "esearchresult": result}
+
+    def _post_history(self, webenv, db, ids):
+        with self.lock:
+            if webenv not in self.history:
+                webenv = f"MCID_{uuid.uuid4().hex[:24]}"
+                self.history[webenv] = []
+            self.history[webenv].append((db, ids))
+            return webenv, str(len(self.history[webenv]))
+
+    def epost(self, params):
+        """EPost只返回XML"""
+        db = params.get("db", "")
+        ids = [i.strip() for i in params.get("id", "").split(",") if i.strip()]
+        if db not in self.records or not ids:
+            return "<?xml version=\"1.0\"?>\n<ePostResult><ERROR>Invalid db or empty id list</ERROR></ePostResult>\n"
+        webenv, query_key = self._post_history(params.get("WebEnv"), db, ids)
+        return f"<?xml version=\"1.0\"?>\n<ePostResult>\n\t<QueryKey>{query_key}</QueryKey>\n\t<WebEnv>{webenv}</WebEnv>\n</ePostResult>\n"
+
+    def _matches(self, db, record, tokens):
+        text = json.dumps(record, ensure_ascii=False).lower()
+        if db == "snp":
+            # dbSNP按rs号检索
+            text += f" rs{record.get('snp_id', '')}"
+        return bool(tokens) and all(re.search(rf"(?<![\w-]){re.escape(t)}(?![\w-])", text) for t in tokens)
+
+    def _records(self, params):
+        db = params.get("db", "")
+        if db not in self.records:
+            return None, {"error": f"Invalid db name specified: {db}"}
+        if params.get("query_key") and params.get("WebEnv"):
+            ids = self._history_ids(params)
+            if ids is None:
+                return None, {"esummaryresult": [f"Unable to obtain query #{params['query_key']}"]}
+        else:
+            ids = [i.strip() for i in params.get("id", "").split(",") if i.strip()]
+        if not ids:
+            return None, {"error": "Empty id list - nothing todo"}
+        return [(uid, self.records[db].get(uid)) for uid in ids], None
+
+    def _history_ids(self, params):
+        with self.lock:
+            queries = self.history.get(params["WebEnv"], [])
+        index = int(params["query_key"]) - 1
+        if not 0 <= index < len(queries) or queries[index][0] != params.get("db"):
+            return None
+        retstart = int(params.get("retstart", 0))
+        retmax = int(params.get("retmax", 10000))
+        return queries[index][1][retstart:retstart + retmax]
+
+    def esummary(self, params):
+        records, error = self._records(params)
+        if error:
+            return error
+        result = {"uids": [uid for uid, record in records if record is not None]}
+        for uid, record in records:
+            result[uid] = record if record is not None else {"uid": uid, "error": "cannot get document summary"}
+        return {"header": {"type": "esummary", "version": "0.3"}, "result": result}
+
+    def efetch(self, params):
+        """efetch按文本格式返回完整记录，gene库与NCBI的文本格式一致"""
+        records, error = self._records(params)
+        if error:
+            return error
+        blocks = []
+        for n, (uid, record) in enumerate(records, 1):
+            if record is None:
+                blocks.append(f"{n}. Error: ID {uid} not found")
+                continue
+            if params.get("db") == "gene":
+                blocks.append(self._gene_text(n, record))
+                continue
+            lines = [f"{n}. {record.get('name') or record.get('title') or uid}"]
+            for key, value in record.items():
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, ensure_ascii=False)
+                if value not in ("", None):
+                    lines.append(f"{key}: {value}")
+            blocks.append("\n".join(lines))
+        return "\n\n".join(blocks) + "\n"
+
+    def _gene_text(self, n, record):
+        organism = record.get("organism", {})
+        lines = [
+            f"{n}. {record['name']}",
+            f"Official Symbol: {record['name']} and Name: {record['description']} "
+            f"[{organism.get('scientificname', '')} ({organism.get('commonname', '')})]",
+        ]
+        if record.get("otheraliases"):
+            lines.append(f"Other Aliases: {record['otheraliases']}")
+        if record.get("otherdesignations"):
+            lines.append(f"Other Designations: {record['otherdesignations'].replace('|', '; ')}")
+        lines.append(f"Chromosome: {record.get('chromosome', '')}; Location: {record.get('maplocation', '')}")
+        for info in record.get("genomicinfo", []):
+            start, stop = sorted((info["chrstart"] + 1, info["chrstop"] + 1))
+            strand = ", complement" if info["chrstart"] > info["chrstop"] else ""
+            lines.append(f"Annotation: Chromosome {info['chrloc']} {info['chraccver']} ({start}..{stop}{strand})")
+        lines.append(f"ID: {record['uid']}")
+        return "\n".join(lines)
+
+    # ---- BLAST ----
+
+    def _blast_queries(self, text):
+        """QUERY可以是单条序列或多条FASTA记录，返回[(query_def, sequence)]"""
+        if not text.lstrip().startswith(">"):
+            query = re.sub(r"\s+", "", text).upper()
+            return [("Query_1", query)] if query else []
+        queries = []
+        for record in text.split(">")[1:]:
+            defline, _, sequence = record.partition("\n")
+            sequence = re.sub(r"\s+", "", sequence).upper()
+            if sequence:
+                queries.append((defline.strip() or f"Query_{len(queries) + 1}", sequence))
+        return queries
+
+    def blast_put(self, params):
+        queries = self._blast_queries(params.get("QUERY", ""))
+        if not queries:
+            return "Message ID#24 Error: Query contains no sequence data\n"
+        rid = uuid.uuid4().hex[:11].upper()
+        with self.lock:
+            self.jobs[rid] = {
+                "queries": queries,
+                "hitlist_size": int(params.get("HITLIST_SIZE", 10)),
+                "ready_at": time.monotonic() + self.blast_delay,
+            }
+        rtoe = max(1, int(round(self.blast_delay)))
+        return f"<!--QBlastInfoBegin\n    RID = {rid}\n    RTOE = {rtoe}\nQBlastInfoEnd\n-->\n"
+
+    def blast_get(self, params):
+        rid = params.get("RID", "")
+        with self.lock:
+            job = self.jobs.get(rid)
+        if job is None:
+            return "<!--QBlastInfoBegin\n\tStatus=UNKNOWN\nQBlastInfoEnd\n-->\n"
+        if time.monotonic() < job["ready_at"]:
+            return "<!--QBlastInfoBegin\n\tStatus=WAITING\nQBlastInfoEnd\n-->\n"
+        results = [(query_def, query, self._blast_hits(query)[:job["hitlist_size"]]) for query_def, query in job["queries"]]
+        if params.get("FORMAT_TYPE", "HTML").upper() == "XML":
+            return self._blast_xml(rid, results)
+        return "\n".join(self._blast_text(rid, query, hits) for _, query, hits in results)
+
+    def _blast_hits(self, query):
+        for fixture in self.blast_fixtures:
+            sequence = fixture["query"].upper()
+            if sequence in query or query in sequence:
+                return fixture["hits"]
+        return []
+
+    def _blast_text(self, rid, query, hits):
+        lines = [
+            "BLASTN 2.16.0+",
+            "",
+            f"RID: {rid}",
+            "",
+            "Database: Nucleotide collection (nt)",
+            "",
+            "Query=",
+            f"Length={len(query)}",
+            "",
+        ]
+        if not hits:
+            lines.append("***** No hits found *****")
+            return "\n".join(lines) + "\n"
+        lines.append(f"{'':70}Score     E")
+        lines.append(f"{'Sequences producing significant alignments:':70}(Bits)  Value")
+        lines.append("")
+        for hit in hits:
+            title = f"{hit['accession']} {hit['definition']}"[:68]
+            lines.append(f"{title:70}{hit['bit_score']:<8}{hit['evalue']:.0e}")
+        for hit in hits:
+            lines += [
+                "",
+                f">{hit['accession']} {hit['definition']}",
+                f"Length={hit['length']}",
+                "",
+                f" Score = {hit['bit_score']} bits, Expect = {hit['evalue']:.0e}",
+                f" Identities = {hit['identity']}/{hit['align_len']} ({100 * hit['identity'] // hit['align_len']}%), Gaps = 0/{hit['align_len']}",
+                " Strand=Plus/Plus",
+                "",
+                f"Query  1{'':8}{hit['align_len']}",
+                f"Sbjct  {hit['hit_from']}{'':8}{hit['hit_to']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def _blast_xml(self, rid, results):
+        iterations = []
+        for n, (query_def, query, hits) in enumerate(results, 1):
+            iterations.append(f"""    <Iteration>
+      <Iteration_iter-num>{n}</Iteration_iter-num>
+      <Iteration_query-ID>Query_{n}</Iteration_query-ID>
+      <Iteration_query-def>{escape(query_def)}</Iteration_query-def>
+      <Iteration_query-len>{len(query)}</Iteration_query-len>
+      <Iteration_hits>
+{self._blast_hits_xml(hits)}
+      </Iteration_hits>
+    </Iteration>""")
+        return f"""<?xml version="1.0"?>
+<BlastOutput>
+  <BlastOutput_program>blastn</BlastOutput_program>
+  <BlastOutput_db>nt</BlastOutput_db>
+  <BlastOutput_query-def>RID {rid}</BlastOutput_query-def>
+  <BlastOutput_query-len>{len(results[0][1])}</BlastOutput_query-len>
+  <BlastOutput_iterations>
+{chr(10).join(iterations)}
+  </BlastOutput_iterations>
+</BlastOutput>
+"""
+
+    def _blast_hits_xml(self, hits):
+        hit_xml = []
+        for n, hit in enumerate(hits, 1):
+            hit_xml.append(f"""        <Hit>
+          <Hit_num>{n}</Hit_num>
+          <Hit_id>ref|{escape(hit['accession'])}|</Hit_id>
+          <Hit_def>{escape(hit['definition'])}</Hit_def>
+          <Hit_accession>{escape(hit['accession'])}</Hit_accession>
+          <Hit_len>{hit['length']}</Hit_len>
+          <Hit_hsps>
+            <Hsp>
+              <Hsp_num>1</Hsp_num>
+              <Hsp_bit-score>{hit['bit_score']}</Hsp_bit-score>
+              <Hsp_evalue>{hit['evalue']}</Hsp_evalue>
+              <Hsp_query-from>1</Hsp_query-from>
+              <Hsp_query-to>{hit['align_len']}</Hsp_query-to>
+              <Hsp_hit-from>{hit['hit_from']}</Hsp_hit-from>
+              <Hsp_hit-to>{hit['hit_to']}</Hsp_hit-to>
+              <Hsp_identity>{hit['identity']}</Hsp_identity>
+              <Hsp_align-len>{hit['align_len']}</Hsp_align-len>
+            </Hsp>
+          </Hit_hsps>
+        </Hit>""")
+        return "\n".join(hit_xml)
+
+def make_handler(mock: MockNCBI):
+    eutils = {"esearch.fcgi": mock.esearch, "esummary.fcgi": mock.esummary, "efetch.fcgi": mock.efetch, "epost.fcgi": mock.epost}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._handle(dict(parse_qsl(urlparse(self.path).query, keep_blank_values=True)))
+
+        def do_POST(self):
+            params = dict(parse_qsl(urlparse(self.path).query, keep_blank_values=True))
+            length = int(self.headers.get("Content-Length", 0))
+            params.update(parse_qsl(self.rfile.read(length).decode("utf-8"), keep_blank_values=True))
+            self._handle(params)
+
+        def _handle(self, params):
+            mock.delay()
+            if mock.should_fail():
+                headers = {"Retry-After": str(mock.retry_after)} if mock.retry_after is not None else {}
+                return self._send(mock.error_status, "text/plain", b"Service temporarily unavailable\n", headers)
+
+            path = urlparse(self.path).path
+            endpoint = path.rsplit("/", 1)[-1]
+            if path.startswith("/entrez/eutils/") and endpoint in eutils:
+                result = eutils[endpoint](params)
+                if isinstance(result, str):
+                    content_type = "text/xml" if result.startswith("<?xml") else "text/plain"
+                    return self._send(200, content_type, result.encode("utf-8"))
+                return self._send(200, "application/json", json.dumps(result).encode("utf-8"))
+            if path == "/blast/Blast.cgi":
+                cmd = params.get("CMD", "")
+                if cmd == "Put":
+                    return self._send(200, "text/html", mock.blast_put(params).encode("utf-8"))
+                if cmd == "Get":
+                    body = mock.blast_get(params)
+                    content_type = "text/xml" if body.startswith("<?xml") else "text/plain"
+                    return self._send(200, content_type, body.encode("utf-8"))
+                return self._send(400, "text/plain", f"Unsupported CMD: {cmd}\n".encode("utf-8"))
+            self._send(404, "text/plain", b"Not found\n")
+
+        def _send(self, status, content_type, body, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return Handler
+
+def create_server(host="127.0.0.1", port=8800, fixtures_path=DEFAULT_FIXTURES, **options) -> ThreadingHTTPServer:
+    """创建（未启动的）模拟服务，options 见 MockNCBI"""
+    with open(fixtures_path, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    server = ThreadingHTTPServer((host, port), make_handler(MockNCBI(fixtures, **options)))
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock NCBI E-utilities and BLAST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="fixture JSON file")
+    parser.add_argument("--latency", type=float, default=0.0, help="base latency per request (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After header of injected errors")
+    parser.add_argument("--blast-delay", type=float, default=5.0, help="seconds before a BLAST RID is ready")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for latency and error injection")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = create_server(
+        args.host, args.port, args.fixtures,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        error_status=args.error_status, retry_after=args.retry_after,
+        blast_delay=args.blast_delay, seed=args.seed,
+    )
+    print(f"Mock NCBI server listening on http://{args.host}:{args.port}")
+    print(f"  EUTILS_BASE_URL=http://{args.host}:{args.port}/entrez/eutils")
+    print(f"  BLAST_BASE_URL=http://{args.host}:{args.port}/blast/Blast.cgi")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
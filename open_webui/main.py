@@ -1,11 +1,12 @@
 from fastapi import FastAPI, Request, Depends, status, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.concurrency import run_in_threadpool
+from anyio.from_thread import run as run_from_thread
 
 
 from starlette.responses import StreamingResponse, Response
 from pydantic import BaseModel, ConfigDict
-from typing import List, Union, Generator, Iterator
+from typing import List, Union, Generator, Iterator, AsyncIterator
 
 
 from utils.pipelines.auth import bearer_security, get_current_user
@@ -684,16 +685,65 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
 
         if form_data.stream:
 
-            def stream_content():
-                res = pipe(
-                    user_message=user_message,
-                    model_id=pipeline_id,
-                    messages=messages,
-                    body=form_data.model_dump(),
-                )
+            def format_line(line):
+                if isinstance(line, BaseModel):
+                    line = line.model_dump_json()
+                    line = f"data: {line}"
+
+                try:
+                    line = line.decode("utf-8")
+                except:
+                    pass
+
+                logging.info(f"stream_content:Generator:{line}")
+
+                if line.startswith("data:"):
+                    return f"{line}\n\n"
+                else:
+                    line = stream_message_template(form_data.model, line)
+                    return f"data: {json.dumps(line)}\n\n"
+
+            def finish_lines():
+                finish_message = {
+                    "id": f"{form_data.model}-{str(uuid.uuid4())}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": form_data.model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {},
+                            "logprobs": None,
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+
+                yield f"data: {json.dumps(finish_message)}\n\n"
+                yield f"data: [DONE]"
+
+            res = pipe(
+                user_message=user_message,
+                model_id=pipeline_id,
+                messages=messages,
+                body=form_data.model_dump(),
+            )
+
+            logging.info(f"stream:true:{res}")
+
+            # 异步生成器直接在事件循环上消费，不占用线程池线程
+            if isinstance(res, AsyncIterator):
+
+                async def astream_content():
+                    async for line in res:
+                        yield format_line(line)
+
+                    for line in finish_lines():
+                        yield line
 
-                logging.info(f"stream:true:{res}")
+                return StreamingResponse(astream_content(), media_type="text/event-stream")
 
+            def stream_content():
                 if isinstance(res, str):
                     message = stream_message_template(form_data.model, res)
                     logging.info(f"stream_content:str:{message}")
@@ -701,41 +751,10 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
 
                 if isinstance(res, Iterator):
                     for line in res:
-                        if isinstance(line, BaseModel):
-                            line = line.model_dump_json()
-                            line = f"data: {line}"
-
-                        try:
-                            line = line.decode("utf-8")
-                        except:
-                            pass
-
-                        logging.info(f"stream_content:Generator:{line}")
-
-                        if line.startswith("data:"):
-                            yield f"{line}\n\n"
-                        else:
-                            line = stream_message_template(form_data.model, line)
-                            yield f"data: {json.dumps(line)}\n\n"
+                        yield format_line(line)
 
                 if isinstance(res, str) or isinstance(res, Generator):
-                    finish_message = {
-                        "id": f"{form_data.model}-{str(uuid.uuid4())}",
-                        "object": "chat.completion.chunk",
-                        "created": int(time.time()),
-                        "model": form_data.model,
-                        "choices": [
-                            {
-                                "index": 0,
-                                "delta": {},
-                                "logprobs": None,
-                                "finish_reason": "stop",
-                            }
-                        ],
-                    }
-
-                    yield f"data: {json.dumps(finish_message)}\n\n"
-                    yield f"data: [DONE]"
+                    yield from finish_lines()
 
             return StreamingResponse(stream_content(), media_type="text/event-stream")
         else:
@@ -762,6 +781,13 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
                     for stream in res:
                         message = f"{message}{stream}"
 
+                if isinstance(res, AsyncIterator):
+
+                    async def collect():
+                        return "".join([stream async for stream in res])
+
+                    message = run_from_thread(collect)
+
                 logging.info(f"stream:false:{message}")
                 return {
                     "id": f"{form_data.model}-{str(uuid.uuid4())}",
@@ -1,6 +1,6 @@
 import os
 import sys
-from typing import List, Dict, Union, Generator, Iterator, Any
+from typing import List, Dict, Union, Generator, Iterator, AsyncIterator, Any
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, BaseMessage
 
 # 添加项目根目录到 Python 路径
@@ -9,6 +9,7 @@ sys.path.append(ROOT_DIR)
 
 from src.core.settings import configure_settings
 from src.core.rag import initialize_rag_system
+from src.tools.http_client import close_session, aclose_async_client
 
 class Pipeline:
     def __init__(self):
@@ -40,11 +41,13 @@ class Pipeline:
 
     async def on_shutdown(self):
         print("[OpenBio] Pipeline 关闭")
+        close_session()
+        await aclose_async_client()
 
 
     def pipe(
         self, user_message: str, model_id: str, messages: List[Dict], body: dict
-    ) -> Union[str, Generator, Iterator]:
+    ) -> Union[str, Generator, Iterator, AsyncIterator]:
         
         original_cwd = os.getcwd()
         if ROOT_DIR != original_cwd:
@@ -64,7 +67,8 @@ class Pipeline:
                 ]
             }
 
-            def stream_workflow_responses():
+            # 使用astream驱动工作流：等待LLM和NCBI时不占用线程
+            async def stream_workflow_responses():
                 final_answer_content = None
                 thinking_steps_started = False
                 
@@ -79,7 +83,9 @@ class Pipeline:
                 
                 print("[STREAM_DEBUG] Starting stream_workflow_responses generator (ONLY metadata.thinking_content for <think> block)...")
 
-                for chunk_idx, chunk in enumerate(self.workflow.stream(inputs, {"recursion_limit": 25})):
+                chunk_idx = -1
+                async for chunk in self.workflow.astream(inputs, {"recursion_limit": 25}):
+                    chunk_idx += 1
                     print(f"\n[STREAM_DEBUG] Chunk {chunk_idx + 1}: {chunk}")
                     
                     for node_name, node_output_value in chunk.items():
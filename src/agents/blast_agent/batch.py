@@ -0,0 +1,97 @@
+import os
+import re
+import logging
+from typing import Dict, Iterable, List
+
+from ...tools.call_api import call_api
+from ...tools.blast_scheduler import get_blast_scheduler, READY
+from ...tools.blast_cache import get_blast_cache, blast_cache_key
+from ...tools.param_keys import clean_sequence
+from ...tools.endpoints import blast_base_url
+from ...tools.identifiers import extract_sequence
+from .component import BLAST_PROGRAM, BLAST_DATABASE, MEGABLAST, MAX_DOWNLOAD_BYTES, confident_local_hits
+from .parser import split_blast_xml
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+# 批量预取：评测开始前把所有问题中的序列合并为multi-FASTA一次提交，
+# 结果按Iteration_query-def拆分后写入BLAST结果缓存，之后各问题的BLAST节点直接命中缓存
+BATCH_SIZE = int(os.getenv("BLAST_BATCH_SIZE", "20"))
+# 批量任务运行时间比单条长，允许更多轮询次数
+BATCH_MAX_POLLS = int(os.getenv("BLAST_BATCH_MAX_POLLS", "20"))
+# 与BlastComponent快速路径的默认hitlist_size一致，保证缓存键相同
+HITLIST_SIZE = 10
+
+def _pending_sequences(questions: Iterable[str]) -> Dict[str, tuple]:
+    """
+    收集问题中尚未缓存、本地参考索引也无法可信定位的序列，
+    返回 {缓存键: (序列, 链方向)}，相同（含反向互补）序列只保留一条
+    """
+    cache = get_blast_cache()
+    pending = {}
+    for question in questions:
+        sequence = extract_sequence(question)
+        if sequence is None:
+            continue
+        sequence = clean_sequence(sequence)
+        key, strand = blast_cache_key(sequence, BLAST_PROGRAM, BLAST_DATABASE, MEGABLAST, HITLIST_SIZE)
+        if key in pending or cache.get(key) is not None:
+            continue
+        # BLAST节点会直接使用本地比对结果，不需要提交
+        if confident_local_hits(sequence) is not None:
+            continue
+        pending[key] = (sequence, strand)
+    return pending
+
+def _submit(batch: List[tuple]):
+    """提交一批序列，返回RID；失败时返回None"""
+    fasta = "".join(f">query_{n}\n{sequence}\n" for n, (_, sequence, _) in enumerate(batch))
+    url = f"{blast_base_url()}?CMD=Put&PROGRAM={BLAST_PROGRAM}&MEGABLAST={MEGABLAST}&DATABASE={BLAST_DATABASE}&FORMAT_TYPE=XML&HITLIST_SIZE={HITLIST_SIZE}"
+    # 多条序列的QUERY较长，以POST表单发送
+    api_response = call_api(url, data={"QUERY": fasta})
+    if api_response is None:
+        return None
+    rid_match = re.search('RID = (.*)\n', api_response.decode('utf-8', errors='ignore'))
+    return rid_match.group(1).strip() if rid_match else None
+
+def prefetch_blast_results(questions: Iterable[str], batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    """
+    批量提交问题中的BLAST序列并把结果写入缓存，返回统计 {"sequences", "batches", "cached"}
+    没有启用BLAST结果缓存时不做任何事；失败的批次不影响后续单独查询
+    """
+    stats = {"sequences": 0, "batches": 0, "cached": 0}
+    cache = get_blast_cache()
+    if cache is None:
+        return stats
+    pending = [(key, sequence, strand) for key, (sequence, strand) in _pending_sequences(questions).items()]
+    stats["sequences"] = len(pending)
+
+    # 先提交全部批次，再统一等待，各批次在NCBI上并行运行
+    scheduler = get_blast_scheduler()
+    jobs = []
+    for offset in range(0, len(pending), batch_size):
+        batch = pending[offset:offset + batch_size]
+        rid = _submit(batch)
+        if rid is None:
+            logger.error(f"批量提交BLAST失败，{len(batch)}条序列改为单独查询")
+            continue
+        get_url = f"{blast_base_url()}?CMD=Get&FORMAT_TYPE=XML&RID={rid}"
+        future = scheduler.submit(rid, get_url, max_bytes=MAX_DOWNLOAD_BYTES * len(batch), max_polls=BATCH_MAX_POLLS)
+        jobs.append((rid, batch, future))
+        stats["batches"] += 1
+
+    for rid, batch, future in jobs:
+        result = future.result()
+        if result["status"] != READY:
+            logger.error(f"批量BLAST任务未完成 RID: {rid}, 状态: {result['status']}")
+            continue
+        documents = split_blast_xml(result["response"])
+        for n, (key, _, strand) in enumerate(batch):
+            document = documents.get(f"query_{n}")
+            if document is None:
+                continue
+            cache.set_rid(key, strand, rid)
+            cache.set_result(key, rid, document)
+            stats["cached"] += 1
+    return stats
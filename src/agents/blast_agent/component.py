@@ -1,15 +1,57 @@
+import os
 import re
 import logging
-import time
+import asyncio
 import json
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from typing import Dict, Any, List
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from langchain_ollama import ChatOllama
-from ...tools.call_api import call_api
+from ...tools.call_api import call_api, acall_api
+from ...tools.circuit_breaker import get_circuit_breaker
+from ...tools.blast_scheduler import get_blast_scheduler, max_wait, READY, WAITING, FAILED, UNAVAILABLE
+from ...tools.blast_cache import get_blast_cache, blast_cache_key
+from ...tools.local_aligner import get_local_aligner, render_hits
+from ...tools.endpoints import blast_base_url, blast_host
+from ...tools.identifiers import extract_sequence
+from ...tools.param_keys import blast_key, used_keys, record_used, render_used_params
+from .parser import parse_blast_xml, render_queries
+# 无法解析为XML时（如旧缓存中的Text格式结果）渲染进提示的最大字节数
+MAX_RESPONSE_BYTES = 10000
+# 获取XML结果时最多读取的字节数；结果增量解析，只有前BLAST_TOP_HITS条命中渲染进提示
+MAX_DOWNLOAD_BYTES = int(os.getenv("BLAST_MAX_DOWNLOAD_BYTES", "1048576"))
+TOP_HITS = int(os.getenv("BLAST_TOP_HITS", "5"))
+# BLAST检索参数（同时作为结果缓存键的一部分）
+BLAST_PROGRAM = "blastn"
+BLAST_DATABASE = "nt"
+MEGABLAST = "on"
+# 本地参考索引（见 src/tools/local_aligner.py）比对的可信阈值：
+# 最佳比对一致性不低于LOCAL_ALIGN_MIN_IDENTITY，且次佳位置明显更差时直接使用，否则提交远程BLAST
+LOCAL_ALIGN_MIN_IDENTITY = float(os.getenv("LOCAL_ALIGN_MIN_IDENTITY", "0.95"))
+LOCAL_ALIGN_MIN_MARGIN = float(os.getenv("LOCAL_ALIGN_MIN_MARGIN", "0.02"))
+# 问题中有唯一的DNA序列时直接使用，不调用LLM提取
+FAST_PATH = os.getenv("BLAST_FAST_PATH", "1") != "0"
 # 设置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
+def confident_local_hits(sequence: str):
+    """用本地参考索引比对，结果可信时返回(比对器, 命中列表)，否则返回None"""
+    aligner = get_local_aligner()
+    if aligner is None:
+        return None
+    try:
+        hits = aligner.align(sequence)
+    except Exception as e:
+        logger.error(f"本地比对出错: {str(e)}")
+        return None
+    if not hits or hits[0]["identity"] < LOCAL_ALIGN_MIN_IDENTITY:
+        return None
+    # 多个位置同样好（重复序列）时交给远程BLAST
+    if len(hits) > 1 and hits[1]["identity"] > hits[0]["identity"] - LOCAL_ALIGN_MIN_MARGIN:
+        return None
+    return aligner, hits
+
 class BlastComponent:
     def __init__(self):
         self.llm = ChatOllama(
@@ -19,19 +61,18 @@ class BlastComponent:
             temperature=0
         )
     
-    def is_duplicate_params(self, new_params: Dict[str, Any], used_params: List[Dict[str, Any]]) -> bool:
+    def is_duplicate_params(self, new_params: Dict[str, Any], metadata: Dict[str, Any]) -> bool:
         """
         检查BLAST参数是否重复
-        只检查sequence是否重复，hitlist_size可以不同
+        只检查sequence是否重复（按序列哈希），hitlist_size可以不同
         """
-        for old_params in used_params:
-            # 只检查sequence是否相同
-            if new_params.get('sequence') == old_params.get('sequence'):
-                return True
-        return False
+        return blast_key(new_params) in self._used_keys(metadata)
 
-    def init_blast_query(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """第一步：初始化BLAST查询，生成PUT请求"""
+    def _used_keys(self, metadata: Dict[str, Any]):
+        return used_keys(metadata, "used_blast_params", "used_blast_keys", blast_key)
+
+    def _build_query_prompt(self, state: Dict[str, Any]):
+        """构建BLAST参数提取提示，缺少用户问题时返回错误结果"""
         # 确保保留metadata
         metadata = state.get("metadata", {})
         messages = state["messages"]
@@ -70,9 +111,7 @@ class BlastComponent:
         # 格式化已使用过的参数
         used_params_text = ""
         if used_params:
-            used_params_text = "\nPreviously used sequences(for reference):\n"
-            for i, params in enumerate(used_params, 1):
-                used_params_text += f"{i}. {params['sequence'][:50]}...\n"
+            used_params_text = "\nPreviously used sequences(for reference):\n" + render_used_params(used_params) + "\n"
         
         # 构建单一提示
         combined_prompt = f"""
@@ -102,144 +141,353 @@ IMPORTANT:
 """
         
         # 使用单一SystemMessage
-        blast_prompt = [SystemMessage(content=combined_prompt)]
-        
-        try:
-            response = self.llm.invoke(blast_prompt)
-            
-            # 解析JSON响应
-            try:
-                params = json.loads(response.content)
-            except json.JSONDecodeError:
-                json_match = re.search(r'({.*?})', response.content.replace('\n', ''))
-                if not json_match:
-                    logger.error(f"无法从LLM响应中提取有效的JSON: {response}")
-                    return {
-                        "messages": messages + [
-                            AIMessage(content="Cannot extract valid JSON from LLM response",
-                                    additional_kwargs={"type": "blast_error"})
-                        ],
-                        "status": "error",
-                        "metadata": {
-                            **metadata,
-                            "thinking_content": "Cannot extract valid JSON from LLM response"
-                        }
-                    }
-                params = json.loads(json_match.group(1))
+        return [SystemMessage(content=combined_prompt)]
 
-            # 使用重复检查方法
-            if self.is_duplicate_params(params, used_params):
-                logger.warning(f"检测到重复的序列: {params['sequence'][:50]}...")
-                return {
-                    "messages": messages + [
-                        AIMessage(content="This sequence has been used before. Please try with a different sequence or rephrase your question to use a new sequence.",
-                                additional_kwargs={"type": "blast_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "Duplicate sequence detected"
-                    }
-                }
+    def _fast_params(self, state: Dict[str, Any]):
+        """从问题中直接提取序列，提取不到或该序列已经查询过时返回None"""
+        if not FAST_PATH:
+            return None
+        user_question = [msg for msg in state["messages"] if isinstance(msg, HumanMessage) and msg.additional_kwargs.get("type") == "user_question"]
+        if not user_question:
+            return None
+        sequence = extract_sequence(user_question[0].content)
+        if sequence is None:
+            return None
+        params = {"sequence": sequence, "hitlist_size": 10}
+        if self.is_duplicate_params(params, state.get("metadata", {})):
+            return None
+        logger.info(f"从问题中直接提取到序列: {sequence[:50]}...")
+        return params
 
-            # 验证必要的参数是否存在
-            if "sequence" not in params:
-                logger.error(f"缺少必要的序列参数: {params}")
+    def _parse_query_params(self, state: Dict[str, Any], content: str):
+        """解析LLM输出的参数；出错时返回错误结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+
+        # 解析JSON响应
+        try:
+            params = json.loads(content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'({.*?})', content.replace('\n', ''))
+            if not json_match:
+                logger.error(f"无法从LLM响应中提取有效的JSON: {content}")
                 return {
                     "messages": messages + [
-                        AIMessage(content="Missing required sequence parameter",
+                        AIMessage(content="Cannot extract valid JSON from LLM response",
                                 additional_kwargs={"type": "blast_error"})
                     ],
                     "status": "error",
                     "metadata": {
                         **metadata,
-                        "thinking_content": "Missing required sequence parameter"
+                        "thinking_content": "Cannot extract valid JSON from LLM response"
                     }
                 }
+            params = json.loads(json_match.group(1))
+        return params
 
-            # 构建BLAST URL
-            url = "https://blast.ncbi.nlm.nih.gov/blast/Blast.cgi?CMD=Put&PROGRAM=blastn&MEGABLAST=on&DATABASE=nt&FORMAT_TYPE=XML"
-            url += f"&QUERY={params['sequence']}"
-            if "hitlist_size" in params:
-                url += f"&HITLIST_SIZE={params['hitlist_size']}"
-            else:
-                url += "&HITLIST_SIZE=10"  # 默认值
+    def _build_put_url(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """检查参数并构建PUT请求URL，返回(params, url)；出错时返回错误结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_blast_params", [])
 
-            logger.info(f"生成的BLAST URL: {url}")
-            
-            # 发起PUT请求
-            api_response = call_api(url)
-            if api_response is None:
-                return {
-                    "messages": messages + [
-                        AIMessage(content="BLAST Put request failed",
-                                additional_kwargs={"type": "blast_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "BLAST Put request failed"
-                    }
+        # 使用重复检查方法
+        if self.is_duplicate_params(params, metadata):
+            logger.warning(f"检测到重复的序列: {params['sequence'][:50]}...")
+            return {
+                "messages": messages + [
+                    AIMessage(content="This sequence has been used before. Please try with a different sequence or rephrase your question to use a new sequence.",
+                            additional_kwargs={"type": "blast_error"})
+                ],
+                "status": "error",
+                "metadata": {
+                    **metadata,
+                    "thinking_content": "Duplicate sequence detected"
                 }
-            
-            # 提取RID
-            rid_match = re.search('RID = (.*)\n', api_response.decode('utf-8'))
-            if not rid_match:
-                logger.error("无法从BLAST响应中提取RID")
-                return {
-                    "messages": messages + [
-                        AIMessage(content="Could not extract RID from BLAST response",
-                                additional_kwargs={"type": "blast_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "Could not extract RID from BLAST response"
-                    }
+            }
+
+        # 验证必要的参数是否存在
+        if "sequence" not in params:
+            logger.error(f"缺少必要的序列参数: {params}")
+            return {
+                "messages": messages + [
+                    AIMessage(content="Missing required sequence parameter",
+                            additional_kwargs={"type": "blast_error"})
+                ],
+                "status": "error",
+                "metadata": {
+                    **metadata,
+                    "thinking_content": "Missing required sequence parameter"
                 }
-                
-            rid = rid_match.group(1)
-            
-            # 记录使用过的参数
-            used_params.append(params)
-            
-            # 返回结果，更新metadata
+            }
+
+        # 构建BLAST URL
+        url = f"{blast_base_url()}?CMD=Put&PROGRAM={BLAST_PROGRAM}&MEGABLAST={MEGABLAST}&DATABASE={BLAST_DATABASE}&FORMAT_TYPE=XML"
+        url += f"&QUERY={params['sequence']}"
+        if "hitlist_size" in params:
+            url += f"&HITLIST_SIZE={params['hitlist_size']}"
+        else:
+            url += "&HITLIST_SIZE=10"  # 默认值
+
+        logger.info(f"生成的BLAST URL: {url}")
+        return params, url
+
+    def _put_result(self, state: Dict[str, Any], params: Dict[str, Any], url: str, api_response) -> Dict[str, Any]:
+        """处理PUT请求结果，提取RID"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_blast_params", [])
+        
+        if api_response is None:
             return {
                 "messages": messages + [
-                    AIMessage(
-                        content=f"Initiated BLAST query with: [{url}]\nReceived RID: {rid}",
-                        additional_kwargs={
-                            "type": "blast_progress",
-                            "parameters": params  # 在消息中也保存参数，方便查看
-                        }
-                    )
+                    AIMessage(content="BLAST Put request failed",
+                            additional_kwargs={"type": "blast_error"})
                 ],
-                "next": "fetch_results",
+                "status": "error",
                 "metadata": {
                     **metadata,
-                    "blast_rid": rid,
-                    "attempt": 0,
-                    "used_blast_params": used_params,  # 更新使用过的参数列表
-                    "thinking_content": f"Initialize BLAST query: {url}, RID: {rid}"
+                    "thinking_content": "BLAST Put request failed"
                 }
             }
-            
-        except Exception as e:
-            logger.error(f"BLAST查询初始化过程中出错: {str(e)}")
+        
+        # 提取RID
+        rid_match = re.search('RID = (.*)\n', api_response.decode('utf-8'))
+        if not rid_match:
+            logger.error("无法从BLAST响应中提取RID")
             return {
                 "messages": messages + [
-                    AIMessage(content=f"Error initializing BLAST query: {str(e)}",
+                    AIMessage(content="Could not extract RID from BLAST response",
                             additional_kwargs={"type": "blast_error"})
                 ],
                 "status": "error",
                 "metadata": {
                     **metadata,
-                    "thinking_content": f"Error initializing BLAST query: {str(e)}"
+                    "thinking_content": "Could not extract RID from BLAST response"
                 }
             }
+            
+        rid = rid_match.group(1)
+        cache = get_blast_cache()
+        if cache is not None:
+            cache.set_rid(*self._cache_key(params), rid)
+        
+        # 记录使用过的参数
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        
+        # 返回结果，更新metadata
+        return {
+            "messages": messages + [
+                AIMessage(
+                    content=f"Initiated BLAST query with: [{url}]\nReceived RID: {rid}",
+                    additional_kwargs={
+                        "type": "blast_progress",
+                        "parameters": params  # 在消息中也保存参数，方便查看
+                    }
+                )
+            ],
+            "next": "fetch_results",
+            "metadata": {
+                **metadata,
+                "blast_rid": rid,
+                "blast_params": params,
+                "attempt": 0,
+                "used_blast_params": used_params,  # 更新使用过的参数列表
+                "thinking_content": f"Initialize BLAST query: {url}, RID: {rid}"
+            }
+        }
+
+    def _cache_key(self, params: Dict[str, Any]):
+        """返回(缓存键, 链方向)"""
+        return blast_cache_key(params["sequence"], BLAST_PROGRAM, BLAST_DATABASE, MEGABLAST, params.get("hitlist_size", 10))
+
+    def _record_params(self, metadata: Dict[str, Any], used_params: List[Dict[str, Any]], params: Dict[str, Any]):
+        """记录使用过的参数，同时更新键列表，返回(metadata, 参数列表)的新副本"""
+        return record_used(metadata, used_params, params, "used_blast_params", "used_blast_keys", blast_key)
+
+    def _local_alignment_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """用本地参考索引比对，结果可信时直接返回最终结果，否则返回None"""
+        local = confident_local_hits(params["sequence"])
+        if local is None:
+            return None
+        aligner, hits = local
+        
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_blast_params", [])
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        best = hits[0]
+        return {
+            "messages": messages + [
+                AIMessage(
+                    content=f"BLAST Results (local alignment):\n\n{render_hits(hits, aligner.meta['source'])}",
+                    additional_kwargs={"type": "blast_response", "source": "local_index", "hits": hits}
+                )
+            ],
+            "metadata": {
+                **metadata,
+                "used_blast_params": used_params,
+                "thinking_content": f"Local alignment: {best['chromosome']}:{best['start']}-{best['end']} ({best['identity'] * 100:.1f}% identity)"
+            }
+        }
+
+    def _cached_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """
+        查询BLAST结果缓存：有缓存结果时直接返回最终结果；
+        只有仍在保留期内的RID时跳过Put，直接获取该RID的结果；未命中返回None
+        """
+        cache = get_blast_cache()
+        if cache is None:
+            return None
+        key, strand = self._cache_key(params)
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_blast_params", [])
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        rid = entry["rid"]
+        # 缓存条目来自反向互补序列时，命中的链方向与当前查询相反
+        note = ""
+        if entry["strand"] != strand:
+            note = " (cached result for the reverse complement of the query: hit strands are inverted relative to this query)"
+        
+        if entry["body"] is None:
+            logger.info(f"复用未过期的BLAST RID: {rid}")
+            return {
+                "messages": messages + [
+                    AIMessage(
+                        content=f"Reusing BLAST RID {rid} from an identical earlier query{note}",
+                        additional_kwargs={"type": "blast_progress", "parameters": params}
+                    )
+                ],
+                "next": "fetch_results",
+                "metadata": {
+                    **metadata,
+                    "blast_rid": rid,
+                    "blast_params": params,
+                    "attempt": 0,
+                    "used_blast_params": used_params,
+                    "thinking_content": f"Reusing BLAST RID: {rid}"
+                }
+            }
+        
+        logger.info(f"BLAST结果缓存命中, RID: {rid}")
+        response_text, hits = self._render_response(entry["body"])
+        return {
+            "messages": messages + [
+                AIMessage(
+                    content=f"BLAST Results{note}:\n\n{response_text}",
+                    additional_kwargs={"type": "blast_response", "rid": rid, "source": "cache", "strand": strand, "hits": hits}
+                )
+            ],
+            "metadata": {
+                **metadata,
+                "used_blast_params": used_params,
+                "thinking_content": "BLAST results loaded from cache"
+            }
+        }
+
+    def _render_response(self, api_response: bytes):
+        """
+        把结果解析为命中记录并渲染前TOP_HITS条，返回(文本, 第一个查询的命中记录)
+        无法解析时退回截断后的原始文本，命中记录为None
+        """
+        queries = parse_blast_xml(api_response, TOP_HITS)
+        if queries is not None:
+            response_text = render_queries(queries, TOP_HITS)
+            if len(api_response) >= MAX_DOWNLOAD_BYTES:
+                response_text += "\n... [result is truncated]"
+            return response_text, queries[0]["hits"] if queries else []
+        response_text = api_response[:MAX_RESPONSE_BYTES].decode('utf-8', errors='ignore')
+        if len(api_response) >= MAX_RESPONSE_BYTES:
+            response_text += "... [result is truncated]"
+        return response_text, None
+
+    def _query_error(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        logger.error(f"BLAST查询初始化过程中出错: {str(e)}")
+        return {
+            "messages": messages + [
+                AIMessage(content=f"Error initializing BLAST query: {str(e)}",
+                        additional_kwargs={"type": "blast_error"})
+            ],
+            "status": "error",
+            "metadata": {
+                **metadata,
+                "thinking_content": f"Error initializing BLAST query: {str(e)}"
+            }
+        }
+
+    def init_blast_query(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """第一步：初始化BLAST查询，生成PUT请求"""
+        params = self._fast_params(state)
+        if params is None:
+            blast_prompt = self._build_query_prompt(state)
+            if isinstance(blast_prompt, dict):
+                return blast_prompt
+        
+        try:
+            if params is None:
+                response = self.llm.invoke(blast_prompt)
+                params = self._parse_query_params(state, response.content)
+                if params.get("status") == "error":
+                    return params
+            request = self._build_put_url(state, params)
+            if isinstance(request, dict):
+                return request
+            params, url = request
+            # 本地参考索引可以可信地定位时不访问NCBI
+            local_result = self._local_alignment_result(state, params)
+            if local_result is not None:
+                return local_result
+            # 相同查询（含反向互补序列）已有结果或仍有效的RID时不再提交
+            cached = self._cached_result(state, params)
+            if cached is not None:
+                return cached
+            # 发起PUT请求
+            api_response = call_api(url)
+            return self._put_result(state, params, url, api_response)
+        except Exception as e:
+            return self._query_error(state, e)
+
+    async def ainit_blast_query(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """init_blast_query的异步版本"""
+        params = self._fast_params(state)
+        if params is None:
+            blast_prompt = self._build_query_prompt(state)
+            if isinstance(blast_prompt, dict):
+                return blast_prompt
+        
+        try:
+            if params is None:
+                response = await self.llm.ainvoke(blast_prompt)
+                params = self._parse_query_params(state, response.content)
+                if params.get("status") == "error":
+                    return params
+            request = self._build_put_url(state, params)
+            if isinstance(request, dict):
+                return request
+            params, url = request
+            # 本地参考索引可以可信地定位时不访问NCBI
+            # 本地比对（CPU密集）与缓存读写（SQLite）放到线程池执行，不阻塞事件循环
+            local_result = await asyncio.to_thread(self._local_alignment_result, state, params)
+            if local_result is not None:
+                return local_result
+            # 相同查询（含反向互补序列）已有结果或仍有效的RID时不再提交
+            cached = await asyncio.to_thread(self._cached_result, state, params)
+            if cached is not None:
+                return cached
+            api_response = await acall_api(url)
+            return await asyncio.to_thread(self._put_result, state, params, url, api_response)
+        except Exception as e:
+            return self._query_error(state, e)
     
-    def fetch_blast_results(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """第二步：获取BLAST查询结果"""
+    def _prepare_fetch(self, state: Dict[str, Any]):
+        """检查RID，返回(rid, get_url)；没有RID或服务熔断时返回错误结果"""
         metadata = state.get("metadata", {})
         messages = state["messages"]
         
@@ -259,80 +507,58 @@ IMPORTANT:
                 }
             }
         
-        # 获取当前尝试次数
-        attempt = metadata.get("attempt", 0)
-        metadata["attempt"] = attempt + 1
-        
-        logger.info(f"尝试获取BLAST结果, RID: {rid}, 尝试次数: {attempt+1}")
+        # BLAST服务熔断时直接失败，不再轮询等待
+        if not get_circuit_breaker(blast_host()).is_available():
+            logger.error("BLAST服务熔断中，停止获取结果")
+            return {
+                "messages": messages + [
+                    AIMessage(content="BLAST service is currently unavailable",
+                            additional_kwargs={"type": "blast_error"})
+                ],
+                "status": "error",
+                "metadata": {
+                    **metadata,
+                    "thinking_content": "BLAST service is currently unavailable"
+                }
+            }
         
         # 构建GET请求URL
-        get_url = f"https://blast.ncbi.nlm.nih.gov/blast/Blast.cgi?CMD=Get&FORMAT_TYPE=Text&RID={rid}"
-        
-        # 等待一段时间后再获取结果
-        waiting_time = min(15 * (attempt + 1), 60)  # 随着尝试次数增加等待时间，最长60秒
-        logger.info(f"等待 {waiting_time} 秒后获取结果...")
-        time.sleep(waiting_time)
-        
-        # 发起GET请求
-        api_response = call_api(get_url)
-        
-        if api_response is None:
-            if attempt < 3:  # 最多尝试3次
-                return {
-                    "messages": messages + [
-                        AIMessage(content=f"Waiting for BLAST results (attempt {attempt+1}/3)...",
-                                additional_kwargs={"type": "blast_progress"})
-                    ],
-                    "next": "fetch_results",  # 再次尝试获取结果
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": f"Waiting for BLAST results (attempt {attempt+1}/3)..."
-                    }
-                }
-            else:
-                return {
-                    "messages": messages + [
-                        AIMessage(content="Failed to retrieve BLAST results after multiple attempts",
-                                additional_kwargs={"type": "blast_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "Failed to retrieve BLAST results after multiple attempts"
-                    }
-                }
+        get_url = f"{blast_base_url()}?CMD=Get&FORMAT_TYPE=XML&RID={rid}"
+        logger.info(f"提交BLAST结果轮询, RID: {rid}")
+        return rid, get_url
+
+    def _fetch_result(self, state: Dict[str, Any], rid: str, get_url: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """处理调度器返回的轮询结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
         
-        # 检查是否仍在运行
-        response_text = api_response.decode('utf-8')
-        if "Status=WAITING" in response_text or "is still running" in response_text:
-            if attempt < 3:  # 最多尝试3次
-                return {
-                    "messages": messages + [
-                        AIMessage(content=f"BLAST analysis still running (attempt {attempt+1}/3)...",
-                                additional_kwargs={"type": "blast_progress"})
-                    ],
-                    "next": "fetch_results",  # 再次尝试获取结果
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": f"BLAST analysis still running (attempt {attempt+1}/3)..."
-                    }
-                }
-            else:
-                return {
-                    "messages": messages + [
-                        AIMessage(content="BLAST analysis is taking too long, please try again later",
-                                additional_kwargs={"type": "blast_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "BLAST analysis is taking too long, please try again later"
-                    }
+        errors = {
+            UNAVAILABLE: "BLAST service is currently unavailable",
+            FAILED: "Failed to retrieve BLAST results after multiple attempts",
+            WAITING: "BLAST analysis is taking too long, please try again later",
+        }
+        cache = get_blast_cache()
+        params = metadata.get("blast_params")
+        if result["status"] != READY:
+            if result["status"] == FAILED and cache is not None and params:
+                cache.discard(self._cache_key(params)[0], rid)
+            error = errors[result["status"]]
+            return {
+                "messages": messages + [
+                    AIMessage(content=error, additional_kwargs={"type": "blast_error"})
+                ],
+                "status": "error",
+                "metadata": {
+                    **metadata,
+                    "attempt": result["polls"],
+                    "thinking_content": error
                 }
+            }
         
-        # 裁剪过长的结果
-        if len(response_text) > 10000:
-            response_text = response_text[:10000] + "... [result is truncated]"
+        api_response = result["response"]
+        if cache is not None and params:
+            cache.set_result(self._cache_key(params)[0], rid, api_response)
+        response_text, hits = self._render_response(api_response)
         
         # 返回最终结果，但不进行分析
         return {
@@ -342,13 +568,48 @@ IMPORTANT:
                     additional_kwargs={
                         "type": "blast_response",
                         "url": get_url,
-                        "rid": rid
+                        "rid": rid,
+                        "hits": hits
                     }
                 )
             ],
             # 不再指向analyze_results
             "metadata": {
                 **metadata,
+                "attempt": result["polls"],
                 "thinking_content": f"BLAST results fetched"
             }
-        }
\ No newline at end of file
+        }
+
+    def _wait_timeout(self, state: Dict[str, Any], rid: str) -> Dict[str, Any]:
+        """等待调度器结果超时（调度线程异常等），按轮询次数用完处理"""
+        logger.error(f"等待BLAST结果超时 RID: {rid}")
+        return {"status": WAITING, "response": None, "polls": state.get("metadata", {}).get("attempt", 0)}
+
+    def fetch_blast_results(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """第二步：获取BLAST查询结果（由后台调度器轮询，这里只等待结果）"""
+        prepared = self._prepare_fetch(state)
+        if isinstance(prepared, dict):
+            return prepared
+        rid, get_url = prepared
+        future = get_blast_scheduler().submit(rid, get_url, max_bytes=MAX_DOWNLOAD_BYTES)
+        try:
+            result = future.result(timeout=max_wait())
+        except FuturesTimeoutError:
+            result = self._wait_timeout(state, rid)
+        return self._fetch_result(state, rid, get_url, result)
+
+    async def afetch_blast_results(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """fetch_blast_results的异步版本，等待期间不占用线程"""
+        prepared = self._prepare_fetch(state)
+        if isinstance(prepared, dict):
+            return prepared
+        rid, get_url = prepared
+        future = get_blast_scheduler().submit(rid, get_url, max_bytes=MAX_DOWNLOAD_BYTES)
+        try:
+            # shield：超时只放弃等待，不取消调度器中的任务（同一RID的其他等待方不受影响）
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=max_wait())
+        except asyncio.TimeoutError:
+            result = self._wait_timeout(state, rid)
+        # 写入结果缓存并解析XML，放到线程池执行
+        return await asyncio.to_thread(self._fetch_result, state, rid, get_url, result)
@@ -3,6 +3,7 @@ from .component import BlastComponent
 from typing import Annotated, Sequence
 from typing_extensions import TypedDict
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph.message import add_messages
 
 # 定义状态类型
@@ -19,8 +20,8 @@ def create_blast_subgraph():
     workflow = StateGraph(AgentState)
     
     # 添加节点，移除analyze_results节点
-    workflow.add_node("init_query", blast_component.init_blast_query)
-    workflow.add_node("fetch_results", blast_component.fetch_blast_results)
+    workflow.add_node("init_query", RunnableLambda(blast_component.init_blast_query, afunc=blast_component.ainit_blast_query))
+    workflow.add_node("fetch_results", RunnableLambda(blast_component.fetch_blast_results, afunc=blast_component.afetch_blast_results))
     
     # 设置入口点
     workflow.set_entry_point("init_query")
@@ -35,14 +36,8 @@ def create_blast_subgraph():
         }
     )
     
-    workflow.add_conditional_edges(
-        "fetch_results",
-        lambda x: x.get("next", END) if "next" in x else END,
-        {
-            "fetch_results": "fetch_results",  # 循环获取结果，直到完成或超时
-            END: END
-        }
-    )
+    # 轮询由后台调度器完成，fetch_results只执行一次
+    workflow.add_edge("fetch_results", END)
     
     # 编译子图
     return workflow.compile()
\ No newline at end of file
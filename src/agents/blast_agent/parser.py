@@ -0,0 +1,161 @@
+import re
+import logging
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+# BLAST XML（FORMAT_TYPE=XML）增量解析为紧凑记录，记录都是普通dict：
+# - query: query_id, query_def, query_len, hits, message（无命中时NCBI给出的说明）
+# - hit: accession, title, organism, chromosome, length, hsps
+# - hsp: bit_score, evalue, identities, align_len, gaps, identity（比例）,
+#   query_from, query_to, hit_from, hit_to, strand（plus/minus，hit_from/hit_to已按从小到大排列）
+
+# 每条命中最多保留的HSP数
+MAX_HSPS = 3
+# 每次喂给解析器的字节数
+CHUNK_SIZE = 1 << 16
+
+ORGANISM = re.compile(r"^(?:PREDICTED: |UNVERIFIED: )?([A-Z][a-z]+ [a-z]+)")
+CHROMOSOME = re.compile(r"\bchromosome ([0-9]{1,2}|[XYM]|MT)\b", re.I)
+
+def _text(elem, tag: str, default: str = "") -> str:
+    child = elem.find(tag)
+    if child is None or child.text is None:
+        return default
+    return child.text.strip()
+
+def _int(elem, tag: str) -> int:
+    try:
+        return int(_text(elem, tag, "0"))
+    except ValueError:
+        return 0
+
+def _float(elem, tag: str) -> float:
+    try:
+        return float(_text(elem, tag, "0"))
+    except ValueError:
+        return 0.0
+
+def _hsp(elem) -> Dict[str, Any]:
+    hit_from, hit_to = _int(elem, "Hsp_hit-from"), _int(elem, "Hsp_hit-to")
+    # 比对到负链时NCBI给出的hit-from大于hit-to（blastn的Hsp_hit-frame为-1）
+    strand = "minus" if hit_from > hit_to or _text(elem, "Hsp_hit-frame") == "-1" else "plus"
+    identities, align_len = _int(elem, "Hsp_identity"), _int(elem, "Hsp_align-len")
+    return {
+        "bit_score": _float(elem, "Hsp_bit-score"),
+        "evalue": _float(elem, "Hsp_evalue"),
+        "identities": identities,
+        "align_len": align_len,
+        "gaps": _int(elem, "Hsp_gaps"),
+        "identity": round(identities / align_len, 4) if align_len else 0.0,
+        "query_from": _int(elem, "Hsp_query-from"),
+        "query_to": _int(elem, "Hsp_query-to"),
+        "hit_from": min(hit_from, hit_to),
+        "hit_to": max(hit_from, hit_to),
+        "strand": strand,
+    }
+
+def _hit(elem) -> Dict[str, Any]:
+    title = _text(elem, "Hit_def")
+    organism = ORGANISM.match(title)
+    chromosome = CHROMOSOME.search(title)
+    return {
+        "accession": _text(elem, "Hit_accession") or _text(elem, "Hit_id"),
+        "title": title,
+        "organism": organism.group(1) if organism else "",
+        "chromosome": chromosome.group(1).upper() if chromosome else "",
+        "length": _int(elem, "Hit_len"),
+        "hsps": [_hsp(hsp) for hsp in elem.iter("Hsp")][:MAX_HSPS],
+    }
+
+def parse_blast_xml(data: bytes, max_hits: int = 10) -> Optional[List[Dict[str, Any]]]:
+    """
+    增量解析BLAST XML，每个查询（Iteration）只保留前max_hits条命中
+    已解析的元素随即清空，内容被截断时返回截断前完整解析的部分
+    不是BLAST XML（如Text格式的旧缓存）时返回None
+    """
+    if b"<BlastOutput" not in data[:4096]:
+        return None
+    parser = ET.XMLPullParser(events=("start", "end"))
+    queries = []
+    current = None
+    try:
+        for offset in range(0, len(data), CHUNK_SIZE):
+            parser.feed(data[offset:offset + CHUNK_SIZE])
+            for event, elem in parser.read_events():
+                if event == "start":
+                    if elem.tag == "Iteration":
+                        current = {"query_id": "", "query_def": "", "query_len": 0, "hits": [], "message": ""}
+                        queries.append(current)
+                    continue
+                if current is None:
+                    continue
+                if elem.tag == "Iteration_query-ID":
+                    current["query_id"] = (elem.text or "").strip()
+                elif elem.tag == "Iteration_query-def":
+                    current["query_def"] = (elem.text or "").strip()
+                elif elem.tag == "Iteration_query-len":
+                    current["query_len"] = int(elem.text or 0)
+                elif elem.tag == "Iteration_message":
+                    current["message"] = (elem.text or "").strip()
+                elif elem.tag == "Hit":
+                    if len(current["hits"]) < max_hits:
+                        current["hits"].append(_hit(elem))
+                    elem.clear()
+                elif elem.tag == "Iteration":
+                    elem.clear()
+                    current = None
+    except ET.ParseError as e:
+        logger.error(f"BLAST XML解析出错: {str(e)}")
+        if not queries:
+            return None
+    return queries
+
+ITERATION = re.compile(rb"<Iteration>.*?</Iteration>", re.S)
+QUERY_DEF = re.compile(rb"<Iteration_query-def>(.*?)</Iteration_query-def>", re.S)
+
+def split_blast_xml(data: bytes) -> Dict[str, bytes]:
+    """
+    把多查询（multi-FASTA）的BLAST XML按Iteration_query-def拆分为单查询的XML文档
+    返回 {query_def: 文档}；只包含完整的Iteration，被截断的最后一个查询不返回
+    """
+    start = data.find(b"<BlastOutput_iterations>")
+    if start < 0:
+        return {}
+    header = data[:start + len(b"<BlastOutput_iterations>")]
+    documents = {}
+    for match in ITERATION.finditer(data, start):
+        query_def = QUERY_DEF.search(match.group(0))
+        if query_def is None:
+            continue
+        name = query_def.group(1).decode("utf-8", errors="ignore").strip()
+        documents[name] = header + b"\n" + match.group(0) + b"\n</BlastOutput_iterations>\n</BlastOutput>\n"
+    return documents
+
+def _evalue(value: float) -> str:
+    return "0.0" if value == 0 else f"{value:.1e}"
+
+def render_hit(n: int, hit: Dict[str, Any]) -> str:
+    """单条命中渲染为一行文本，每个HSP给出一致性、E值和比对坐标"""
+    parts = [f"{n}. {hit['accession']} {hit['title']}"]
+    if hit["chromosome"]:
+        parts.append(f"chr{hit['chromosome']}")
+    for hsp in hit["hsps"]:
+        parts.append(
+            f"identity {hsp['identities']}/{hsp['align_len']} ({hsp['identity'] * 100:.1f}%), E={_evalue(hsp['evalue'])}, "
+            f"query {hsp['query_from']}-{hsp['query_to']}, subject {hsp['hit_from']}-{hsp['hit_to']} ({hsp['strand']})"
+        )
+    return " | ".join(parts)
+
+def render_queries(queries: List[Dict[str, Any]], top_n: int) -> str:
+    blocks = []
+    for query in queries:
+        lines = [f"Query: {query['query_def'] or query['query_id']} (length {query['query_len']})"]
+        if not query["hits"]:
+            lines.append(query["message"] or "No hits found")
+        for n, hit in enumerate(query["hits"][:top_n], 1):
+            lines.append(render_hit(n, hit))
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) if blocks else "No hits found"
@@ -1,10 +1,54 @@
+import os
 import re
 import json
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, AIMessage,SystemMessage
-from ...tools.call_api import call_api
+from ...tools.call_api import call_api, acall_api
+from ...tools.endpoints import eutils_url
+from ...tools.identifiers import extract_eutils_params, RSID_PATTERN
+from ...tools.param_keys import eutils_key, used_keys, record_used, render_used_params
+from ...tools.gene_index import get_gene_index
+from ...tools.snp_index import get_snp_index
+from ...tools.disease_index import get_disease_index
+from .parser import parse_response, render_records
+from .projection import project_records
+# 上游响应最多读取的字节数，超出部分不再下载
+MAX_DOWNLOAD_BYTES = int(os.getenv("EUTILS_MAX_DOWNLOAD_BYTES", "262144"))
+# 响应无法解析为结构化记录时，放入提示的原始文本最大长度
+MAX_RESPONSE_BYTES = 10000
+# ID数量超过该值时通过History Server（EPost + WebEnv/query_key）分批获取
+EPOST_THRESHOLD = int(os.getenv("EUTILS_EPOST_THRESHOLD", "10"))
+HISTORY_BATCH_SIZE = int(os.getenv("EUTILS_HISTORY_BATCH_SIZE", "20"))
+# 根据esearch结果直接链式调用efetch/esummary，只在ID集合为空或过多时才由LLM选择
+AUTO_CHAIN = os.getenv("EUTILS_AUTO_CHAIN", "1") != "0"
+AUTO_CHAIN_MAX_IDS = int(os.getenv("EUTILS_AUTO_CHAIN_MAX_IDS", "20"))
+# 问题中有唯一的rsID/Ensembl/LOC标识符时直接生成esearch参数，不调用LLM
+FAST_PATH = os.getenv("EUTILS_FAST_PATH", "1") != "0"
+# gene库的单个符号/别名/Ensembl ID检索先查本地基因索引（见 src/tools/gene_index.py），未命中再访问网络
+LOCAL_GENE_INDEX = os.getenv("EUTILS_LOCAL_GENE_INDEX", "1") != "0"
+# snp库的rsID检索先查本地内存映射索引（见 src/tools/snp_index.py），有rsID未收录时再访问网络
+LOCAL_SNP_INDEX = os.getenv("EUTILS_LOCAL_SNP_INDEX", "1") != "0"
+# omim库的疾病检索先查本地全文索引（见 src/tools/disease_index.py），直接给出相关基因和位置
+LOCAL_DISEASE_INDEX = os.getenv("EUTILS_LOCAL_DISEASE_INDEX", "1") != "0"
+# esearch检索式中可由本地索引处理的字段标签
+LOCAL_GENE_FIELDS = {"", "gene", "gene name", "sym", "symbol", "preferred symbol", "all", "all fields"}
+LOCAL_ORGANISM_FIELDS = {"orgn", "organism"}
+ORGANISM_ALIASES = {"human": "homo sapiens", "mouse": "mus musculus", "rat": "rattus norvegicus", "zebrafish": "danio rerio"}
+# 数据库不明确时（LLM给出的检索式不是rsID等特定标识符）同时在多个库中esearch，保留有结果的库
+FANOUT = os.getenv("EUTILS_FANOUT", "0") == "1"
+FANOUT_DBS = [db.strip() for db in os.getenv("EUTILS_FANOUT_DBS", "gene,snp,omim").split(",") if db.strip()]
+# 按问题类型只保留记录中相关的字段后再渲染进提示（见 projection.py）
+FIELD_PROJECTION = os.getenv("EUTILS_FIELD_PROJECTION", "1") != "0"
+# 各数据库获取详情使用的接口
+FETCH_METHODS = {
+    "gene": os.getenv("EUTILS_GENE_FETCH_METHOD", "efetch"),
+    "snp": "esummary",
+    "omim": "esummary",
+}
 # 设置日志
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
@@ -18,39 +62,48 @@ class EutilsComponent:
             num_ctx=16000
         )
     
-    def is_duplicate_params(self, new_params: Dict[str, Any], used_params: List[Dict[str, Any]]) -> bool:
+    def is_duplicate_params(self, new_params: Dict[str, Any], metadata: Dict[str, Any]) -> bool:
         """
-        检查参数是否重复
+        检查参数是否重复（按规范化键在已使用集合中查找）
         规则：
         1. esearch阶段：检查db和term是否与之前任何一轮都相同
-        2. efetch阶段：检查db和id是否与之前任何一轮都相同
+        2. efetch阶段：检查db和id集合是否与之前任何一轮都相同
         3. 两个阶段互不干扰
         """
-        # 判断当前是哪个阶段
-        is_esearch = 'term' in new_params
-        is_efetch = 'id' in new_params
-        
-        for old_params in used_params:
-            # 检查数据库是否相同
-            if new_params.get('db') != old_params.get('db'):
-                continue
-            
-            # esearch阶段：检查term
-            if is_esearch and 'term' in old_params:
-                if new_params['term'] == old_params['term']:
-                    return True
-                
-            # efetch阶段：检查id
-            if is_efetch and 'id' in old_params:
-                new_ids = set(new_params['id'].split(','))
-                old_ids = set(old_params['id'].split(','))
-                if new_ids == old_ids:
-                    return True
-        
-        return False
+        return eutils_key(new_params) in self._used_keys(metadata)
 
-    def init_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """第一步：初始化搜索，使用esearch API"""
+    def _used_keys(self, metadata: Dict[str, Any]):
+        return used_keys(metadata, "used_eutils_params", "used_eutils_keys", eutils_key)
+
+    def _record_params(self, metadata: Dict[str, Any], used_params: List[Dict[str, Any]], params: Dict[str, Any]):
+        """记录使用过的参数，同时更新键列表，返回(metadata, 参数列表)的新副本"""
+        return record_used(metadata, used_params, params, "used_eutils_params", "used_eutils_keys", eutils_key)
+
+    def _parse_params(self, content: str) -> Dict[str, Any]:
+        """从LLM响应中解析JSON参数"""
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'({.*?})', content.replace('\n', ''))
+            if not json_match:
+                raise ValueError("无法从LLM响应中提取有效的JSON")
+            return json.loads(json_match.group(1))
+
+    def _fast_params(self, state: Dict[str, Any]):
+        """从问题中的标识符直接生成esearch参数，没有匹配或参数已经用过时返回None"""
+        if not FAST_PATH:
+            return None
+        user_question = [msg for msg in state["messages"] if isinstance(msg, HumanMessage) and msg.additional_kwargs.get("type") == "user_question"]
+        if not user_question:
+            return None
+        params = extract_eutils_params(user_question[0].content)
+        if params is None or self.is_duplicate_params(params, state.get("metadata", {})):
+            return None
+        logger.info(f"从问题中直接识别到esearch参数: {params}")
+        return params
+
+    def _build_search_prompt(self, state: Dict[str, Any]):
+        """构建esearch参数生成提示，缺少用户问题时返回错误结果"""
         metadata = state.get("metadata", {})
         messages = state["messages"]
         
@@ -93,9 +146,7 @@ class EutilsComponent:
         # 格式化已使用过的参数为JSON格式
         used_params_text = ""
         if used_params:
-            used_params_text = "\nPreviously used parameters:\n"
-            for i, params in enumerate(used_params, 1):
-                used_params_text += f"{json.dumps(params, indent=2)}\n"
+            used_params_text = "\nPreviously used parameters:\n" + render_used_params(used_params) + "\n"
         
         # 构建单一提示
         combined_prompt = f"""
@@ -138,105 +189,397 @@ IMPORTANT:
 """
         
         # 使用单一SystemMessage
-        search_prompt = [SystemMessage(content=combined_prompt)]
+        return [SystemMessage(content=combined_prompt)]
+
+    def _build_search_url(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """检查esearch参数并构建URL，参数重复时返回错误结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
         
-        try:
-            response = self.llm.invoke(search_prompt)
-            
-            # 解析JSON响应
-            try:
-                params = json.loads(response.content)
-            except json.JSONDecodeError:
-                json_match = re.search(r'({.*?})', response.content.replace('\n', ''))
-                if not json_match:
-                    raise ValueError("无法从LLM响应中提取有效的JSON")
-                params = json.loads(json_match.group(1))
-            
-            # 使用通用参数检查方法
-            if self.is_duplicate_params(params, used_params):
-                logger.warning(f"检测到重复的参数: {params}")
-                return {
-                    "messages": messages + [
-                        AIMessage(content="Duplicate parameters detected (same database and term), please try with different parameters or a different database",
-                                additional_kwargs={"type": "eutils_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "Duplicate parameters detected (same database and term)."
-                    }
-                }
-            
-            # 验证必要的参数是否存在
-            if not all(key in params for key in ["db", "term"]):
-                raise ValueError("缺少必要的参数: db 或 term")
-            
-            # 构建URL
-            url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db={params['db']}&term={params['term']}&retmode=json&sort=relevance"
-            
-            # 添加可选参数
-            if "retmax" in params:
-                url += f"&retmax={params['retmax']}"
-            else:
-                url += "&retmax=10"  # 默认值
-            
-            logger.info(f"生成的esearch URL: {url}")
-            
-            # 调用API
-            api_response = call_api(url)
-            if api_response is None:
-                return {
-                    "messages": messages + [
-                        AIMessage(content=f"E-utilities esearch API call failed: {url}",
-                                additional_kwargs={"type": "eutils_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "E-utilities esearch API调用失败"
-                    }
+        # 使用通用参数检查方法
+        if self.is_duplicate_params(params, metadata):
+            logger.warning(f"检测到重复的参数: {params}")
+            return {
+                "messages": messages + [
+                    AIMessage(content="Duplicate parameters detected (same database and term), please try with different parameters or a different database",
+                            additional_kwargs={"type": "eutils_error"})
+                ],
+                "status": "error",
+                "metadata": {
+                    **metadata,
+                    "thinking_content": "Duplicate parameters detected (same database and term)."
                 }
-            
-            # 处理结果
-            if isinstance(api_response, bytes):
-                api_response = api_response.decode('utf-8')
-            
-            # 限制响应长度
-            if len(api_response) > 10000:
-                api_response = api_response[:10000] + "... [result is truncated]"
-            
-            # 记录使用过的参数
-            used_params.append(params)
-            
-            # 返回结果，更新metadata
+            }
+        
+        # 验证必要的参数是否存在
+        if not all(key in params for key in ["db", "term"]):
+            raise ValueError("缺少必要的参数: db 或 term")
+        
+        # 构建URL
+        # usehistory=y：结果同时保存在History Server上，后续可按query_key分批获取
+        url = f"{eutils_url('esearch')}?db={params['db']}&term={params['term']}&retmode=json&sort=relevance&usehistory=y"
+        
+        # 添加可选参数
+        if "retmax" in params:
+            url += f"&retmax={params['retmax']}"
+        else:
+            url += "&retmax=10"  # 默认值
+        
+        logger.info(f"生成的esearch URL: {url}")
+        return url
+
+    def _search_result(self, state: Dict[str, Any], params: Dict[str, Any], url: str, api_response) -> Dict[str, Any]:
+        """处理esearch结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
+        
+        if api_response is None:
             return {
                 "messages": messages + [
-                    AIMessage(
-                        content=f"[{url}]->\n[{api_response}]",
-                        additional_kwargs={"type": "eutils_progress", "parameters": params}
-                    )
+                    AIMessage(content=f"E-utilities esearch API call failed: {url}",
+                            additional_kwargs={"type": "eutils_error"})
                 ],
-                "next": "fetch_details",
+                "status": "error",
                 "metadata": {
                     **metadata,
-                    "used_eutils_params": used_params,  # 更新使用过的参数列表
-                    "thinking_content": f"E-utilities esearch results fetched:{api_response}.\n\n by calling {url}"
+                    "thinking_content": "E-utilities esearch API调用失败"
                 }
             }
-            
-        except Exception as e:
-            logger.error(f"E-utilities esearch过程中出错: {str(e)}")
+        
+        # 处理结果
+        message, api_response = self._search_message(params, url, api_response)
+        
+        # 记录使用过的参数
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        
+        # 返回结果，更新metadata
+        return {
+            "messages": messages + [message],
+            "next": "fetch_details",
+            "metadata": {
+                **metadata,
+                "used_eutils_params": used_params,  # 更新使用过的参数列表
+                "thinking_content": f"E-utilities esearch results fetched:{api_response}.\n\n by calling {url}"
+            }
+        }
+
+    def _search_message(self, params: Dict[str, Any], url: str, api_response: bytes):
+        """把esearch响应整理为eutils_progress消息，返回(消息, 渲染后的文本)"""
+        text = api_response.decode('utf-8', errors='ignore')
+        rendered, records = self._render_response("esearch", params.get("db"), api_response)
+        if records and records[0]["kind"] == "esearch":
+            ids = records[0]["ids"]
+        else:
+            ids = self._parse_idlist(text)
+        history = self._parse_search_history(params, text)
+        message = AIMessage(
+            content=f"[{url}]->\n[{rendered}]",
+            additional_kwargs={"type": "eutils_progress", "parameters": params, "ids": ids, "history": history, "records": records}
+        )
+        return message, rendered
+
+    def _fanout_searches(self, state: Dict[str, Any], params: Dict[str, Any], url: str, fast: bool):
+        """
+        返回需要并发执行的[(参数, URL)]，第一项是原始检索
+        问题中有明确标识符（快速路径）、检索式是rsID或未开启并发模式时只有原始检索
+        """
+        searches = [(params, url)]
+        if not FANOUT or fast or params.get("db") not in FANOUT_DBS or RSID_PATTERN.search(str(params.get("term", ""))):
+            return searches
+        metadata = state.get("metadata", {})
+        for db in FANOUT_DBS:
+            other = {**params, "db": db}
+            if db == params["db"] or self.is_duplicate_params(other, metadata):
+                continue
+            searches.append((other, self._build_search_url(state, other)))
+        return searches
+
+    def _fanout_result(self, state: Dict[str, Any], searches, responses) -> Dict[str, Any]:
+        """
+        合并多个库的esearch结果：每个有结果的库一条eutils_progress消息，
+        原始库（没有结果时为命中数最多的库）排在最后，由fetch_details继续处理
+        """
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
+        
+        hits, counts = [], {}
+        for (params, url), api_response in zip(searches, responses):
+            if api_response is None:
+                # 请求失败的库不计入已用参数，后续仍可重试
+                counts[params["db"]] = "failed"
+                continue
+            metadata, used_params = self._record_params(metadata, used_params, params)
+            message, rendered = self._search_message(params, url, api_response)
+            records = message.additional_kwargs["records"]
+            ids = message.additional_kwargs["ids"]
+            counts[params["db"]] = records[0]["count"] if records and records[0]["kind"] == "esearch" else len(ids)
+            if ids:
+                hits.append((params, message, rendered))
+        
+        counts_text = ", ".join(f"{db}={count}" for db, count in counts.items())
+        if not hits:
             return {
+                "messages": messages + [
+                    AIMessage(content=f"E-utilities esearch returned no results in any database ({counts_text})",
+                            additional_kwargs={"type": "eutils_error", "counts": counts})
+                ],
                 "status": "error",
-                "error": f"E-utilities esearch error: {str(e)}",
                 "metadata": {
                     **metadata,
-                    "thinking_content": f"E-utilities esearch error: {str(e)}"
+                    "used_eutils_params": used_params,
+                    "thinking_content": f"E-utilities esearch returned no results: {counts_text}"
                 }
             }
+        
+        primary_db = searches[0][0]["db"]
+        hits.sort(key=lambda hit: (hit[0]["db"] == primary_db, counts[hit[0]["db"]]))
+        hits[-1][1].additional_kwargs["counts"] = counts
+        return {
+            "messages": messages + [message for _, message, _ in hits],
+            "next": "fetch_details",
+            "metadata": {
+                **metadata,
+                "used_eutils_params": used_params,
+                "thinking_content": f"E-utilities esearch fan-out hit counts: {counts_text}\n\n" + "\n".join(rendered for _, _, rendered in hits)
+            }
+        }
+
+    def _render_response(self, method: str, db: str, api_response: bytes, question: str = ""):
+        """
+        把响应解析为紧凑记录并渲染为提示文本，返回(文本, 记录)
+        给出问题时按问题类型裁剪字段后再渲染，返回的记录保持完整
+        无法解析时退回截断后的原始文本，记录为None
+        """
+        # 读取时已按MAX_DOWNLOAD_BYTES截断，截断处可能是不完整的多字节字符
+        truncated = len(api_response) >= MAX_DOWNLOAD_BYTES
+        text = api_response.decode('utf-8', errors='ignore')
+        records = parse_response(method, db, text)
+        if records is not None:
+            rendered = render_records(self._project(records, question))
+        else:
+            rendered = text[:MAX_RESPONSE_BYTES]
+            truncated = truncated or len(text) > MAX_RESPONSE_BYTES
+        if truncated:
+            rendered += "... [result is truncated]"
+        return rendered, records
+
+    def _project(self, records: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
+        if not FIELD_PROJECTION or not question:
+            return records
+        return project_records(records, question)
+
+    def _user_question(self, state: Dict[str, Any]) -> str:
+        for msg in state["messages"]:
+            if isinstance(msg, HumanMessage) and msg.additional_kwargs.get("type") == "user_question":
+                return msg.content
+        return ""
+
+    def _parse_idlist(self, api_response: str) -> List[str]:
+        """
+        提取esearch结果中的idlist
+        使用正则而不是json解析，响应被截断时也能取到已完整返回的部分
+        """
+        idlist = re.search(r'"idlist":\s*\[([^\]]*)', api_response)
+        if not idlist:
+            return []
+        return re.findall(r'"(\d+)"', idlist.group(1))
+
+    def _parse_search_history(self, params: Dict[str, Any], api_response: str):
+        """提取esearch结果在History Server上的WebEnv/query_key（这些字段在idlist之前）"""
+        webenv = re.search(r'"webenv":\s*"([^"]+)"', api_response)
+        query_key = re.search(r'"querykey":\s*"([^"]+)"', api_response)
+        if not (webenv and query_key):
+            return None
+        return {"db": params.get("db"), "webenv": webenv.group(1), "query_key": query_key.group(1)}
+
+    def _local_gene_query(self, term: str):
+        """
+        解析可由本地索引回答的检索式：单个基因标识符，可附加一个物种限定
+        如 "PSMB10"、"PSMB10[sym] AND human[orgn]"，返回(标识符, 物种)，其他检索式返回None
+        """
+        gene, organism = None, None
+        for part in re.split(r"\s+AND\s+", term.strip()):
+            match = re.fullmatch(r'"?([\w.\-]+(?: [\w.\-]+)?)"?\s*(?:\[([^\]]*)\])?', part.strip())
+            if not match:
+                return None
+            value, field = match.group(1), (match.group(2) or "").strip().lower()
+            if field in LOCAL_ORGANISM_FIELDS and organism is None:
+                organism = ORGANISM_ALIASES.get(value.lower(), value.lower())
+            elif field in LOCAL_GENE_FIELDS and gene is None and " " not in value:
+                gene = value
+            else:
+                return None
+        if gene is None:
+            return None
+        return gene, organism
+
+    def _local_gene_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """在本地基因索引中查询，命中时直接返回最终结果（不再调用efetch），未命中返回None"""
+        if not LOCAL_GENE_INDEX or params.get("db") != "gene":
+            return None
+        index = get_gene_index()
+        query = self._local_gene_query(str(params.get("term", "")))
+        if index is None or query is None:
+            return None
+        gene, organism = query
+        try:
+            # 物种限定在索引查询内过滤，避免多物种共用的符号先被limit截掉目标物种
+            records = index.lookup(gene, limit=int(params.get("retmax", 10)), organism=organism)
+        except Exception as e:
+            logger.error(f"本地基因索引查询失败: {str(e)}")
+            return None
+        if not records:
+            return None
+        return self._local_result(state, params, "gene", records)
+
+    def _local_snp_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """检索式仅由rsID组成（可用OR连接）且全部收录在本地SNP索引中时直接返回结果，否则返回None"""
+        if not LOCAL_SNP_INDEX or params.get("db") != "snp":
+            return None
+        parts = re.split(r"\s+OR\s+", str(params.get("term", "")).strip())
+        rsids = [re.fullmatch(r"(rs\d+)(?:\[(?:rs|snp_id|all|all fields)\])?", p.strip(), re.I) for p in parts]
+        if not all(rsids):
+            return None
+        index = get_snp_index()
+        if index is None:
+            return None
+        try:
+            records = [index.lookup(m.group(1)) for m in rsids]
+        except Exception as e:
+            # 数组文件损坏或读取出错时退回网络查询
+            logger.error(f"本地SNP索引查询失败: {str(e)}")
+            return None
+        if not all(records):
+            return None
+        return self._local_result(state, params, "SNP", records)
+
+    def _local_disease_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """在本地疾病索引中按MIM号或疾病名称检索，命中时直接返回结果，否则返回None"""
+        if not LOCAL_DISEASE_INDEX or params.get("db") != "omim":
+            return None
+        index = get_disease_index()
+        if index is None:
+            return None
+        term = str(params.get("term", "")).strip()
+        try:
+            mim = re.fullmatch(r"(\d{6})(?:\[[^\]]*\])?", term)
+            if mim:
+                record = index.lookup_mim(mim.group(1))
+                records = [record] if record else []
+            else:
+                records = index.search(term, limit=int(params.get("retmax", 10)))
+        except Exception as e:
+            logger.error(f"本地疾病索引查询失败: {str(e)}")
+            return None
+        if not records:
+            return None
+        return self._local_result(state, params, "disease", records)
+
+    def _local_index_result(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """依次查询本地基因、SNP、疾病索引，都未命中返回None"""
+        return (self._local_gene_result(state, params)
+                or self._local_snp_result(state, params)
+                or self._local_disease_result(state, params))
+
+    def _local_result(self, state: Dict[str, Any], params: Dict[str, Any], source: str, records: List[Dict[str, Any]]):
+        """本地索引命中时的最终结果，与efetch/esummary结果格式一致，不再进入fetch_details"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        rendered = render_records(self._project(records, self._user_question(state)))
+        return {
+            "messages": messages + [
+                AIMessage(
+                    content=f"[local {source} index: {params['term']}]->\n[{rendered}]",
+                    additional_kwargs={"type": "eutils_response", "parameters": params, "records": records, "source": "local_index"}
+                )
+            ],
+            "metadata": {
+                **metadata,
+                "used_eutils_params": used_params,
+                "thinking_content": f"Local {source} index results: {rendered}"
+            }
+        }
+
+    def _search_error(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        metadata = state.get("metadata", {})
+        logger.error(f"E-utilities esearch过程中出错: {str(e)}")
+        return {
+            "status": "error",
+            "error": f"E-utilities esearch error: {str(e)}",
+            "metadata": {
+                **metadata,
+                "thinking_content": f"E-utilities esearch error: {str(e)}"
+            }
+        }
+
+    def init_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """第一步：初始化搜索，使用esearch API"""
+        params = self._fast_params(state)
+        fast = params is not None
+        if params is None:
+            search_prompt = self._build_search_prompt(state)
+            if isinstance(search_prompt, dict):
+                return search_prompt
+        
+        try:
+            if params is None:
+                response = self.llm.invoke(search_prompt)
+                params = self._parse_params(response.content)
+            url = self._build_search_url(state, params)
+            if isinstance(url, dict):
+                return url
+            # 先查本地基因/SNP/疾病索引
+            local_result = self._local_index_result(state, params)
+            if local_result is not None:
+                return local_result
+            # 数据库不明确时并发检索多个库
+            searches = self._fanout_searches(state, params, url, fast)
+            if len(searches) > 1:
+                with ThreadPoolExecutor(max_workers=len(searches)) as executor:
+                    responses = list(executor.map(lambda search: call_api(search[1], max_bytes=MAX_DOWNLOAD_BYTES), searches))
+                return self._fanout_result(state, searches, responses)
+            # 调用API
+            api_response = call_api(url, max_bytes=MAX_DOWNLOAD_BYTES)
+            return self._search_result(state, params, url, api_response)
+        except Exception as e:
+            return self._search_error(state, e)
+
+    async def ainit_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """init_search的异步版本"""
+        params = self._fast_params(state)
+        fast = params is not None
+        if params is None:
+            search_prompt = self._build_search_prompt(state)
+            if isinstance(search_prompt, dict):
+                return search_prompt
+        
+        try:
+            if params is None:
+                response = await self.llm.ainvoke(search_prompt)
+                params = self._parse_params(response.content)
+            url = self._build_search_url(state, params)
+            if isinstance(url, dict):
+                return url
+            # 本地索引查询（SQLite/内存映射文件）放到线程池执行，不阻塞事件循环
+            local_result = await asyncio.to_thread(self._local_index_result, state, params)
+            if local_result is not None:
+                return local_result
+            searches = self._fanout_searches(state, params, url, fast)
+            if len(searches) > 1:
+                responses = await asyncio.gather(*(acall_api(search_url, max_bytes=MAX_DOWNLOAD_BYTES) for _, search_url in searches))
+                return self._fanout_result(state, searches, responses)
+            api_response = await acall_api(url, max_bytes=MAX_DOWNLOAD_BYTES)
+            return self._search_result(state, params, url, api_response)
+        except Exception as e:
+            return self._search_error(state, e)
     
-    def fetch_details(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """第二步：获取详细信息，使用efetch或esummary API"""
+    def _build_fetch_prompt(self, state: Dict[str, Any]):
+        """构建efetch/esummary参数生成提示，缺少用户问题时返回错误结果"""
         metadata = state.get("metadata", {})
         messages = state["messages"]
         
@@ -275,9 +618,7 @@ IMPORTANT:
         # 格式化已使用过的参数为JSON格式
         used_params_text = ""
         if used_params:
-            used_params_text = "\nPreviously used parameters:\n"
-            for i, params in enumerate(used_params, 1):
-                used_params_text += f"{json.dumps(params, indent=2)}\n"
+            used_params_text = "\nPreviously used parameters:\n" + render_used_params(used_params) + "\n"
         
         # 构建单一提示
         combined_prompt = f"""
@@ -314,97 +655,277 @@ IMPORTANT:
 """
         
         # 使用单一SystemMessage
-        fetch_prompt = [SystemMessage(content=combined_prompt)]
+        return [SystemMessage(content=combined_prompt)]
+
+    def _chain_params(self, state: Dict[str, Any]):
+        """
+        根据刚完成的esearch结果直接确定efetch/esummary参数，省去一次LLM调用
+        ID集合为空、过多或已经查询过时返回None，交给LLM选择
+        """
+        if not AUTO_CHAIN or not state["messages"]:
+            return None
+        last_msg = state["messages"][-1]
+        if not isinstance(last_msg, AIMessage) or last_msg.additional_kwargs.get("type") != "eutils_progress":
+            return None
+        ids = last_msg.additional_kwargs.get("ids") or []
+        if not ids or len(ids) > AUTO_CHAIN_MAX_IDS:
+            return None
+        db = last_msg.additional_kwargs.get("parameters", {}).get("db")
+        params = {"method": FETCH_METHODS.get(db, "esummary"), "db": db, "id": ",".join(ids)}
+        if self.is_duplicate_params(params, state.get("metadata", {})):
+            return None
+        logger.info(f"根据esearch结果直接调用{params['method']}: {params}")
+        return params
+
+    def _build_fetch_url(self, state: Dict[str, Any], params: Dict[str, Any]):
+        """检查efetch/esummary参数并构建URL，参数重复时返回错误结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
         
-        try:
-            response = self.llm.invoke(fetch_prompt)
-            
-            # 解析JSON响应
-            try:
-                params = json.loads(response.content)
-            except json.JSONDecodeError:
-                json_match = re.search(r'({.*?})', response.content.replace('\n', ''))
-                if not json_match:
-                    raise ValueError("无法从LLM响应中提取有效的JSON")
-                params = json.loads(json_match.group(1))
-            
-            # 使用通用参数检查方法
-            if self.is_duplicate_params(params, used_params):
-                logger.warning(f"检测到重复的参数: {params}")
-                return {
-                    "messages": messages + [
-                        AIMessage(content="Duplicate parameters detected (same database and IDs), please try with different parameters or a different database",
-                                additional_kwargs={"type": "eutils_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "Duplicate parameters detected (same database and IDs)."
-                    }
-                }
-            
-            # 验证必要的参数是否存在
-            if not all(key in params for key in ["method", "db", "id"]):
-                raise ValueError("缺少必要的参数: method, db 或 id")
-            
-            # 构建URL
-            url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/{params['method']}.fcgi?db={params['db']}&id={params['id']}&retmode=json&sort=relevance"
-            
-            # 添加可选参数
-            if "retmax" in params:
-                url += f"&retmax={params['retmax']}"
-            
-            logger.info(f"生成的{params['method']} URL: {url}")
-            
-            # 调用API
-            api_response = call_api(url)
-            if api_response is None:
-                return {
-                    "messages": messages + [
-                        AIMessage(content=f"E-utilities API call failed: {url}",
-                                additional_kwargs={"type": "eutils_error"})
-                    ],
-                    "status": "error",
-                    "metadata": {
-                        **metadata,
-                        "thinking_content": "E-utilities API call failed"
-                    }
-                }
-            
-            # 处理结果
-            if isinstance(api_response, bytes):
-                api_response = api_response.decode('utf-8')
-            
-            # 限制响应长度
-            if len(api_response) > 10000:
-                api_response = api_response[:10000] + "... [result is truncated]"
-            
-            # 记录使用过的参数
-            used_params.append(params)
-            
-            # 返回最终结果
+        # 使用通用参数检查方法
+        if self.is_duplicate_params(params, metadata):
+            logger.warning(f"检测到重复的参数: {params}")
             return {
                 "messages": messages + [
-                    AIMessage(
-                        content=f"[{url}]->\n[{api_response}]",
-                        additional_kwargs={"type": "eutils_response", "parameters": params}
-                    )
+                    AIMessage(content="Duplicate parameters detected (same database and IDs), please try with different parameters or a different database",
+                            additional_kwargs={"type": "eutils_error"})
                 ],
+                "status": "error",
                 "metadata": {
                     **metadata,
-                    "used_eutils_params": used_params,  # 需要更新metadata
-                    "thinking_content": f"E-utilities details: {api_response}"
-                },
+                    "thinking_content": "Duplicate parameters detected (same database and IDs)."
+                }
             }
-            
-        except Exception as e:
-            logger.error(f"E-utilities fetch过程中出错: {str(e)}")
+        
+        # 验证必要的参数是否存在
+        if not all(key in params for key in ["method", "db", "id"]):
+            raise ValueError("缺少必要的参数: method, db 或 id")
+        
+        # 构建URL
+        url = f"{eutils_url(params['method'])}?db={params['db']}&id={params['id']}&retmode=json&sort=relevance"
+        
+        # 添加可选参数
+        if "retmax" in params:
+            url += f"&retmax={params['retmax']}"
+        
+        logger.info(f"生成的{params['method']} URL: {url}")
+        return url
+
+    def _id_list(self, params: Dict[str, Any]) -> List[str]:
+        ids = params.get("id", "")
+        if isinstance(ids, list):
+            ids = ",".join(str(i) for i in ids)
+        return [i.strip() for i in str(ids).split(",") if i.strip()]
+
+    def _find_search_history(self, state: Dict[str, Any], db: str, ids: List[str]):
+        """查找结果集与所选ID完全一致的esearch历史，可以直接复用其query_key"""
+        for msg in reversed(state["messages"]):
+            if isinstance(msg, AIMessage) and msg.additional_kwargs.get("type") == "eutils_progress":
+                history = msg.additional_kwargs.get("history")
+                if history and history["db"] == db and set(msg.additional_kwargs.get("ids", [])) == set(ids):
+                    return history
+        return None
+
+    def _epost_request(self, params: Dict[str, Any], ids: List[str]):
+        """EPost请求：ID列表放在POST表单中，避免过长的GET URL"""
+        return eutils_url("epost"), {"db": params["db"], "id": ",".join(ids)}
+
+    def _parse_epost(self, api_response):
+        if api_response is None:
+            return None
+        text = api_response.decode("utf-8", errors="ignore")
+        webenv = re.search(r"<WebEnv>([^<]+)</WebEnv>", text)
+        query_key = re.search(r"<QueryKey>([^<]+)</QueryKey>", text)
+        if not (webenv and query_key):
+            logger.error(f"EPost响应中没有WebEnv/QueryKey: {text[:200]}")
+            return None
+        return {"webenv": webenv.group(1), "query_key": query_key.group(1)}
+
+    def _history_urls(self, params: Dict[str, Any], history: Dict[str, Any], count: int) -> List[str]:
+        """按retstart/retmax分页，每批一次请求"""
+        base = (f"{eutils_url(params['method'])}?db={params['db']}&query_key={history['query_key']}"
+                f"&WebEnv={history['webenv']}&retmode=json&sort=relevance")
+        return [f"{base}&retstart={start}&retmax={HISTORY_BATCH_SIZE}" for start in range(0, count, HISTORY_BATCH_SIZE)]
+
+    def _history_expired(self, api_response) -> bool:
+        # 缓存中的esearch结果可能带着已过期的WebEnv
+        return api_response is not None and (
+            api_response.lstrip().startswith(b'{"error"') or b"Unable to obtain query" in api_response
+        )
+
+    def _join_batches(self, urls: List[str], responses: List[bytes]):
+        if not responses:
+            return urls[0], None
+        return "\n".join(urls[:len(responses)]), b"\n".join(responses)
+
+    def _fetch_history_batches(self, urls: List[str]):
+        """依次获取各批结果，返回(响应列表, WebEnv是否已失效)"""
+        responses = []
+        remaining = MAX_DOWNLOAD_BYTES
+        for url in urls:
+            api_response = call_api(url, max_bytes=remaining)
+            if self._history_expired(api_response):
+                return responses, True
+            if api_response is None:
+                break
+            responses.append(api_response)
+            # 超过下载上限后不再请求后续批次
+            remaining -= len(api_response)
+            if remaining <= 0:
+                break
+        return responses, False
+
+    def _fetch_by_history(self, state: Dict[str, Any], params: Dict[str, Any], ids: List[str]):
+        """通过History Server分批获取efetch/esummary结果，返回(URL, 响应)"""
+        # 所选ID正好是某次esearch的结果集时直接复用其query_key，否则先EPost
+        history = self._find_search_history(state, params["db"], ids)
+        if history is not None:
+            urls = self._history_urls(params, history, len(ids))
+            responses, expired = self._fetch_history_batches(urls)
+            # 第一批就失败（超时、熔断、重试后仍为5xx）时与WebEnv失效同样处理，不丢弃这组ID
+            if not expired and responses:
+                return self._join_batches(urls, responses)
+            logger.warning("esearch的WebEnv已失效，改用EPost" if expired else "按esearch的WebEnv获取失败，改用EPost")
+        epost_url, data = self._epost_request(params, ids)
+        history = self._parse_epost(call_api(epost_url, data=data))
+        if history is None:
+            return epost_url, None
+        urls = self._history_urls(params, history, len(ids))
+        responses, _ = self._fetch_history_batches(urls)
+        return self._join_batches(urls, responses)
+
+    async def _afetch_history_batches(self, urls: List[str]):
+        responses = []
+        remaining = MAX_DOWNLOAD_BYTES
+        for url in urls:
+            api_response = await acall_api(url, max_bytes=remaining)
+            if self._history_expired(api_response):
+                return responses, True
+            if api_response is None:
+                break
+            responses.append(api_response)
+            remaining -= len(api_response)
+            if remaining <= 0:
+                break
+        return responses, False
+
+    async def _afetch_by_history(self, state: Dict[str, Any], params: Dict[str, Any], ids: List[str]):
+        """_fetch_by_history的异步版本"""
+        history = self._find_search_history(state, params["db"], ids)
+        if history is not None:
+            urls = self._history_urls(params, history, len(ids))
+            responses, expired = await self._afetch_history_batches(urls)
+            # 第一批就失败（超时、熔断、重试后仍为5xx）时与WebEnv失效同样处理，不丢弃这组ID
+            if not expired and responses:
+                return self._join_batches(urls, responses)
+            logger.warning("esearch的WebEnv已失效，改用EPost" if expired else "按esearch的WebEnv获取失败，改用EPost")
+        epost_url, data = self._epost_request(params, ids)
+        history = self._parse_epost(await acall_api(epost_url, data=data))
+        if history is None:
+            return epost_url, None
+        urls = self._history_urls(params, history, len(ids))
+        responses, _ = await self._afetch_history_batches(urls)
+        return self._join_batches(urls, responses)
+
+    def _fetch_result(self, state: Dict[str, Any], params: Dict[str, Any], url: str, api_response) -> Dict[str, Any]:
+        """处理efetch/esummary结果"""
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        used_params = metadata.get("used_eutils_params", [])
+        
+        if api_response is None:
             return {
+                "messages": messages + [
+                    AIMessage(content=f"E-utilities API call failed: {url}",
+                            additional_kwargs={"type": "eutils_error"})
+                ],
                 "status": "error",
-                "error": f"E-utilities fetch error: {str(e)}",
-                "metadata": metadata,
-                "thinking_content": f"E-utilities fetch过程中出错: {str(e)}"
+                "metadata": {
+                    **metadata,
+                    "thinking_content": "E-utilities API call failed"
+                }
             }
+        
+        # 处理结果
+        api_response, records = self._render_response(params.get("method"), params.get("db"), api_response, self._user_question(state))
+        
+        # 记录使用过的参数
+        metadata, used_params = self._record_params(metadata, used_params, params)
+        
+        # 返回最终结果
+        return {
+            "messages": messages + [
+                AIMessage(
+                    content=f"[{url}]->\n[{api_response}]",
+                    additional_kwargs={"type": "eutils_response", "parameters": params, "records": records}
+                )
+            ],
+            "metadata": {
+                **metadata,
+                "used_eutils_params": used_params,  # 需要更新metadata
+                "thinking_content": f"E-utilities details: {api_response}"
+            },
+        }
+
+    def _fetch_error(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        metadata = state.get("metadata", {})
+        logger.error(f"E-utilities fetch过程中出错: {str(e)}")
+        return {
+            "status": "error",
+            "error": f"E-utilities fetch error: {str(e)}",
+            "metadata": metadata,
+            "thinking_content": f"E-utilities fetch过程中出错: {str(e)}"
+        }
+
+    def fetch_details(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """第二步：获取详细信息，使用efetch或esummary API"""
+        params = self._chain_params(state)
+        if params is None:
+            fetch_prompt = self._build_fetch_prompt(state)
+            if isinstance(fetch_prompt, dict):
+                return fetch_prompt
+        
+        try:
+            if params is None:
+                response = self.llm.invoke(fetch_prompt)
+                params = self._parse_params(response.content)
+            url = self._build_fetch_url(state, params)
+            if isinstance(url, dict):
+                return url
+            ids = self._id_list(params)
+            if len(ids) > EPOST_THRESHOLD:
+                url, api_response = self._fetch_by_history(state, params, ids)
+            else:
+                # 调用API
+                api_response = call_api(url, max_bytes=MAX_DOWNLOAD_BYTES)
+            return self._fetch_result(state, params, url, api_response)
+        except Exception as e:
+            return self._fetch_error(state, e)
+
+    async def afetch_details(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """fetch_details的异步版本"""
+        params = self._chain_params(state)
+        if params is None:
+            fetch_prompt = self._build_fetch_prompt(state)
+            if isinstance(fetch_prompt, dict):
+                return fetch_prompt
+        
+        try:
+            if params is None:
+                response = await self.llm.ainvoke(fetch_prompt)
+                params = self._parse_params(response.content)
+            url = self._build_fetch_url(state, params)
+            if isinstance(url, dict):
+                return url
+            ids = self._id_list(params)
+            if len(ids) > EPOST_THRESHOLD:
+                url, api_response = await self._afetch_by_history(state, params, ids)
+            else:
+                api_response = await acall_api(url, max_bytes=MAX_DOWNLOAD_BYTES)
+            return self._fetch_result(state, params, url, api_response)
+        except Exception as e:
+            return self._fetch_error(state, e)
 
     def format_eutils_history(self, eutils_history: List[AIMessage]) -> str:
         return "\n".join([f"[{msg.content}]" for msg in eutils_history])
\ No newline at end of file
@@ -3,6 +3,7 @@ from .component import EutilsComponent
 from typing import Annotated, Sequence
 from typing_extensions import TypedDict
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph.message import add_messages
 
 # 定义状态类型 - 与BLAST保持一致
@@ -19,8 +20,8 @@ def create_eutils_subgraph():
     workflow = StateGraph(AgentState)
     
     # 添加节点
-    workflow.add_node("init_search", eutils_component.init_search)
-    workflow.add_node("fetch_details", eutils_component.fetch_details)
+    workflow.add_node("init_search", RunnableLambda(eutils_component.init_search, afunc=eutils_component.ainit_search))
+    workflow.add_node("fetch_details", RunnableLambda(eutils_component.fetch_details, afunc=eutils_component.afetch_details))
     
     # 设置入口点
     workflow.set_entry_point("init_search")
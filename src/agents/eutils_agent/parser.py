@@ -0,0 +1,268 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+# 记录都是普通dict（保存在消息的additional_kwargs中，需要可序列化），kind字段标明类型：
+# - esearch: db, count, ids, translation
+# - gene: uid, symbol, name, organism, aliases, chromosome, map_location, annotation, mim, gene_type
+#   （本地基因索引的记录另有ensembl）
+# - snp: uid, rsid, genes, chromosome, position, variant_class, function, clinical_significance
+#   （本地SNP索引的记录另有gene_ids）
+# - omim: uid, mim, title, alt_titles, locus
+# - disease: 本地疾病索引的记录，uid, mim, concept_id, name, synonyms, genes, locations, sources
+# - summary: 其他数据库的esummary记录，只保留uid和标题类字段
+# - error: message
+
+def _iter_json(text: str):
+    """逐个解析拼接在一起的JSON文档（History Server分批获取的结果）"""
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            return
+        doc, pos = decoder.raw_decode(text, pos)
+        if not isinstance(doc, dict):
+            raise ValueError("Unexpected JSON document")
+        yield doc
+
+def _split(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value if v]
+    return [v.strip() for v in re.split(r"[,|;]", str(value)) if v.strip()]
+
+def parse_esearch(db: str, text: str) -> Optional[List[Dict[str, Any]]]:
+    try:
+        docs = list(_iter_json(text))
+    except ValueError:
+        return None
+    records = []
+    for doc in docs:
+        if "error" in doc:
+            records.append({"kind": "error", "message": doc["error"]})
+            continue
+        result = doc.get("esearchresult")
+        if result is None:
+            return None
+        if "ERROR" in result:
+            records.append({"kind": "error", "message": result["ERROR"]})
+            continue
+        records.append({
+            "kind": "esearch",
+            "db": db,
+            "count": int(result.get("count", 0)),
+            "ids": result.get("idlist", []),
+            "translation": result.get("querytranslation", ""),
+        })
+    return records
+
+def _gene_summary(uid: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    genomicinfo = doc.get("genomicinfo") or []
+    annotation = ""
+    if genomicinfo:
+        info = genomicinfo[0]
+        start, stop = sorted((info.get("chrstart", 0) + 1, info.get("chrstop", 0) + 1))
+        annotation = f"{info.get('chraccver', '')} ({start}..{stop})"
+    return {
+        "kind": "gene",
+        "uid": uid,
+        "symbol": doc.get("name", ""),
+        "name": doc.get("description", ""),
+        "organism": (doc.get("organism") or {}).get("scientificname", ""),
+        "aliases": _split(doc.get("otheraliases")),
+        "chromosome": doc.get("chromosome", ""),
+        "map_location": doc.get("maplocation", ""),
+        "annotation": annotation,
+        "mim": _split(doc.get("mim")),
+        # gene的esummary没有基因类型字段，部分数据源（如本地索引）会提供
+        "gene_type": doc.get("type_of_gene", ""),
+    }
+
+def _snp_summary(uid: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    chrpos = doc.get("chrpos", "")
+    chromosome, _, position = chrpos.partition(":")
+    return {
+        "kind": "snp",
+        "uid": uid,
+        "rsid": f"rs{doc.get('snp_id', uid)}",
+        "genes": [g.get("name", "") for g in doc.get("genes", []) if g.get("name")],
+        "chromosome": chromosome or doc.get("chr", ""),
+        "position": position,
+        "variant_class": doc.get("snp_class", ""),
+        "function": _split(doc.get("fxn_class")),
+        "clinical_significance": _split(doc.get("clinical_significance")),
+    }
+
+def _omim_summary(uid: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "kind": "omim",
+        "uid": uid,
+        "mim": doc.get("oid", uid),
+        "title": doc.get("title", ""),
+        # 标题本身形如"TITLE; SYMBOL"，多个别名之间以";;"分隔
+        "alt_titles": [t.strip() for t in doc.get("alttitles", "").split(";;") if t.strip()],
+        "locus": doc.get("locus", ""),
+    }
+
+SUMMARY_PARSERS = {"gene": _gene_summary, "snp": _snp_summary, "omim": _omim_summary}
+
+def parse_esummary(db: str, text: str) -> Optional[List[Dict[str, Any]]]:
+    try:
+        docs = list(_iter_json(text))
+    except ValueError:
+        return None
+    records = []
+    for doc in docs:
+        if "error" in doc:
+            records.append({"kind": "error", "message": doc["error"]})
+            continue
+        if "esummaryresult" in doc:
+            records.append({"kind": "error", "message": "; ".join(doc["esummaryresult"])})
+            continue
+        result = doc.get("result")
+        if result is None:
+            return None
+        for uid in result.get("uids", []):
+            item = result.get(uid, {})
+            if "error" in item:
+                records.append({"kind": "error", "message": f"{uid}: {item['error']}"})
+                continue
+            parser = SUMMARY_PARSERS.get(db)
+            if parser is not None:
+                records.append(parser(uid, item))
+            else:
+                records.append({
+                    "kind": "summary",
+                    "uid": uid,
+                    "title": item.get("title") or item.get("name") or item.get("description", ""),
+                })
+    return records
+
+GENE_TEXT_FIELDS = {
+    "Official Symbol": re.compile(r"^Official Symbol:\s*(\S+)\s+and Name:\s*(.*?)\s*\[(.*?)(?:\s*\(.*\))?\]\s*$", re.M),
+    "Other Aliases": re.compile(r"^Other Aliases:\s*(.*)$", re.M),
+    "Chromosome": re.compile(r"^Chromosome:\s*([^;]*);\s*Location:\s*(.*)$", re.M),
+    "Annotation": re.compile(r"^Annotation:\s*Chromosome\s+\S+\s+(.*)$", re.M),
+    "MIM": re.compile(r"^MIM:\s*(.*)$", re.M),
+    "ID": re.compile(r"^ID:\s*(\d+)", re.M),
+}
+
+def parse_gene_text(text: str) -> Optional[List[Dict[str, Any]]]:
+    """解析gene库efetch的文本格式（每条记录以"1. SYMBOL"开头）"""
+    blocks = re.split(r"\n\s*\n(?=\d+\.\s)", "\n" + text.strip())
+    records = []
+    for block in blocks:
+        symbol = GENE_TEXT_FIELDS["Official Symbol"].search(block)
+        uid = GENE_TEXT_FIELDS["ID"].search(block)
+        if not symbol or not uid:
+            continue
+        aliases = GENE_TEXT_FIELDS["Other Aliases"].search(block)
+        location = GENE_TEXT_FIELDS["Chromosome"].search(block)
+        annotation = GENE_TEXT_FIELDS["Annotation"].search(block)
+        mim = GENE_TEXT_FIELDS["MIM"].search(block)
+        records.append({
+            "kind": "gene",
+            "uid": uid.group(1),
+            "symbol": symbol.group(1),
+            "name": symbol.group(2),
+            "organism": symbol.group(3),
+            "aliases": _split(aliases.group(1)) if aliases else [],
+            "chromosome": location.group(1).strip() if location else "",
+            "map_location": location.group(2).strip() if location else "",
+            "annotation": annotation.group(1).strip() if annotation else "",
+            "mim": _split(mim.group(1)) if mim else [],
+            "gene_type": "",
+        })
+    return records or None
+
+def parse_response(method: str, db: str, text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    把E-utilities响应解析为紧凑的记录列表
+    无法识别的格式（如被截断的JSON）返回None，由调用方退回原始文本
+    """
+    if method == "esearch":
+        return parse_esearch(db, text)
+    if method == "esummary":
+        return parse_esummary(db, text)
+    if method == "efetch":
+        if text.lstrip().startswith("{"):
+            return parse_esummary(db, text)
+        if db == "gene":
+            return parse_gene_text(text)
+    return None
+
+def _join(values: List[str], limit: int = 10) -> str:
+    text = ", ".join(values[:limit])
+    if len(values) > limit:
+        text += f" (+{len(values) - limit} more)"
+    return text
+
+def render_record(record: Dict[str, Any]) -> str:
+    """单条记录渲染为一行文本，省略空字段"""
+    kind = record["kind"]
+    if kind == "error":
+        return f"Error: {record['message']}"
+    if kind == "esearch":
+        parts = [f"esearch {record['db']}: {record['count']} hits", f"ids: {_join(record['ids'], 20) or 'none'}"]
+        if record.get("translation"):
+            parts.append(f"query: {record['translation']}")
+        return " | ".join(parts)
+    if kind == "gene":
+        parts = [f"Gene {record['uid']}: {record['symbol']}" + (f" ({record['name']})" if record["name"] else "")]
+        if record["organism"]:
+            parts.append(record["organism"])
+        if record["gene_type"]:
+            parts.append(f"type: {record['gene_type']}")
+        if record["aliases"]:
+            parts.append(f"aliases: {_join(record['aliases'])}")
+        if record["chromosome"] or record["map_location"]:
+            parts.append(f"chr {record['chromosome']}, {record['map_location']}".strip(", "))
+        if record["annotation"]:
+            parts.append(f"annotation: {record['annotation']}")
+        if record["mim"]:
+            parts.append(f"MIM: {_join(record['mim'])}")
+        if record.get("ensembl"):
+            parts.append(f"Ensembl: {_join(record['ensembl'])}")
+        return " | ".join(parts)
+    if kind == "snp":
+        parts = [record["rsid"]]
+        if record["genes"]:
+            parts.append(f"genes: {_join(record['genes'])}")
+        if record["chromosome"]:
+            parts.append(f"chr{record['chromosome']}:{record['position']}" if record["position"] else f"chr{record['chromosome']}")
+        if record["variant_class"]:
+            parts.append(f"class: {record['variant_class']}")
+        if record["function"]:
+            parts.append(f"function: {_join(record['function'], 3)}")
+        if record["clinical_significance"]:
+            parts.append(f"clinical: {_join(record['clinical_significance'], 3)}")
+        return " | ".join(parts)
+    if kind == "omim":
+        parts = [f"OMIM {record['mim']}: {record['title']}"]
+        if record["alt_titles"]:
+            parts.append(f"alt: {_join(record['alt_titles'], 3)}")
+        if record["locus"]:
+            parts.append(f"locus: {record['locus']}")
+        return " | ".join(parts)
+    if kind == "disease":
+        parts = [f"Disease {'MIM ' + record['mim'] if record['mim'] else record['uid']}: {record['name']}"]
+        if record["genes"]:
+            parts.append(f"genes: {_join(record['genes'])}")
+        if record["locations"]:
+            parts.append(f"location: {_join(record['locations'], 3)}")
+        if record["synonyms"]:
+            parts.append(f"also: {_join(record['synonyms'], 3)}")
+        return " | ".join(parts)
+    return f"{record.get('uid', '')}: {record.get('title', '')}"
+
+def render_records(records: List[Dict[str, Any]]) -> str:
+    if not records:
+        return "No records found"
+    return "\n".join(render_record(record) for record in records)
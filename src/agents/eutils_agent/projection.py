@@ -0,0 +1,72 @@
+import re
+from typing import Any, Dict, List, Set
+
+# 按问题类型裁剪记录字段：渲染进提示之前只保留与问题相关的属性
+# 问题匹配不到任何类型时不裁剪
+
+QUESTION_TYPES = {
+    "location": re.compile(r"\b(chromosom\w*|locat\w*|locus|loci|cytogenetic|position|coordinates?|map(ped)?)\b", re.I),
+    "alias": re.compile(r"\b(alias\w*|synonyms?|also known|official (gene )?symbol|other names?|gene symbol|full name)\b", re.I),
+    "gene_type": re.compile(r"\b(protein[- ]coding|ncrna|non[- ]coding|pseudogene|type of gene|gene type)\b", re.I),
+    "disease": re.compile(r"\b(diseases?|disorders?|syndromes?|phenotypes?|omim|dystroph\w*|cancers?)\b", re.I),
+    "gene": re.compile(r"\bgenes?\b", re.I),
+    "function": re.compile(r"\b(clinical|pathogenic\w*|benign|consequence|missense|synonymous|variant class|functional class)\b", re.I),
+}
+
+# 每类记录始终保留的标识字段
+IDENTITY_FIELDS = {
+    "gene": {"kind", "uid", "symbol", "organism"},
+    "snp": {"kind", "uid", "rsid"},
+    "omim": {"kind", "uid", "mim", "title"},
+    "disease": {"kind", "uid", "mim", "concept_id", "name"},
+}
+
+# 记录类型 -> 问题类型 -> 保留字段
+PROFILES = {
+    "gene": {
+        "location": {"chromosome", "map_location", "annotation"},
+        "alias": {"aliases", "name"},
+        "gene_type": {"gene_type", "name"},
+        "disease": {"mim", "name"},
+    },
+    "snp": {
+        "location": {"chromosome", "position"},
+        "gene": {"genes", "gene_ids"},
+        "function": {"variant_class", "function", "clinical_significance"},
+    },
+    "omim": {
+        "location": {"locus"},
+        "alias": {"alt_titles"},
+        "gene": {"locus"},
+    },
+    "disease": {
+        "location": {"locations"},
+        "alias": {"synonyms"},
+        "gene": {"genes"},
+        "disease": {"genes", "synonyms"},
+    },
+}
+
+def question_types(question: str) -> Set[str]:
+    return {name for name, pattern in QUESTION_TYPES.items() if pattern.search(question or "")}
+
+def project_record(record: Dict[str, Any], types: Set[str]) -> Dict[str, Any]:
+    """只保留问题相关的字段，其余字段置空（保持字段齐全，渲染时会被省略）"""
+    profile = PROFILES.get(record.get("kind"))
+    if not profile:
+        return record
+    keep = set(IDENTITY_FIELDS[record["kind"]])
+    matched = False
+    for question_type in types:
+        if question_type in profile:
+            keep |= profile[question_type]
+            matched = True
+    if not matched:
+        return record
+    return {key: value if key in keep or not isinstance(value, (str, list)) else type(value)() for key, value in record.items()}
+
+def project_records(records: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
+    types = question_types(question)
+    if not types:
+        return records
+    return [project_record(record, types) for record in records]
@@ -1,7 +1,19 @@
 from typing import Dict, Any, List
 from langchain_core.messages import HumanMessage, ToolMessage
 import requests
+import httpx
 import uuid
+import time
+import json
+import asyncio
+from ...tools.http_client import get_session, get_async_client
+from ...tools.single_flight import SingleFlight
+from ...tools.circuit_breaker import get_circuit_breaker
+from ...tools.call_api import RETRY_STATUS
+from ...tools.cassette import get_cassette, cassette_key
+
+# 相同查询的并发请求只向Google发起一次
+_inflight = SingleFlight()
 
 class SearchComponent:
     def __init__(self):
@@ -20,7 +32,7 @@ class SearchComponent:
         except (IndexError, AttributeError):
             return ''
 
-    def google_search(self, query, num=5):
+    def _search_request(self, query, num=5):
         url = "https://www.googleapis.com/customsearch/v1"
         params = {
             "q": query,
@@ -28,45 +40,141 @@ class SearchComponent:
             "cx": self.cse_id,
             "num": num
         }
-        try:
-            resp = requests.get(url, params=params, timeout=10)
-            resp.raise_for_status() 
-            data = resp.json()
-            results = []
+        return url, params
+
+    def _parse_search_results(self, data):
+        results = []
+        
+        for item in data.get("items", []):
+            pagemap = item.get('pagemap', {})
+            metatags = pagemap.get('metatags', [])
+            article = pagemap.get('article', [])
+            person = pagemap.get('person', [])
             
-            for item in data.get("items", []):
-                pagemap = item.get('pagemap', {})
-                metatags = pagemap.get('metatags', [])
-                article = pagemap.get('article', [])
-                person = pagemap.get('person', [])
-                
-                # 构建结果
-                result = {
-                    "title": item.get("title", ""),
-                    "link": item.get("link", ""),
-                    "snippet": item.get("snippet", ""),
-                    "domain": item.get("displayLink", ""),
-                    "keywords": self._safe_get_first_item(article, "keywords"),
-                    "publish_date": self._safe_get_first_item(article, "datepublished"),
-                    "author": next((p.get("name") for p in person if p.get("name")), ""),
-                    "full_description": self._safe_get_metatag(metatags, "og:description") or item.get("snippet", "")
-                }
-                
-                # 清理结果：移除所有None值，替换为空字符串
-                result = {k: v if v is not None else "" for k, v in result.items()}
-                results.append(result)
-                
-            return results
+            # 构建结果
+            result = {
+                "title": item.get("title", ""),
+                "link": item.get("link", ""),
+                "snippet": item.get("snippet", ""),
+                "domain": item.get("displayLink", ""),
+                "keywords": self._safe_get_first_item(article, "keywords"),
+                "publish_date": self._safe_get_first_item(article, "datepublished"),
+                "author": next((p.get("name") for p in person if p.get("name")), ""),
+                "full_description": self._safe_get_metatag(metatags, "og:description") or item.get("snippet", "")
+            }
             
-        except requests.exceptions.RequestException as e:
-            print(f"搜索请求错误: {str(e)}")
+            # 清理结果：移除所有None值，替换为空字符串
+            result = {k: v if v is not None else "" for k, v in result.items()}
+            results.append(result)
+            
+        return results
+
+    def google_search(self, query, num=5):
+        return _inflight.do((query, num), lambda: self._google_search(query, num))
+
+    def _google_search(self, query, num=5):
+        url, params = self._search_request(query, num)
+        # 录制/回放模式下经过cassette
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return self._load_search_results(cassette.replay(cassette_key(url, params)))
+        started = time.monotonic()
+        content = self._fetch_search(url, params)
+        if cassette is not None:
+            cassette.record(cassette_key(url, params), content, time.monotonic() - started)
+        return self._load_search_results(content)
+
+    def _load_search_results(self, content):
+        if content is None:
             return []
+        try:
+            return self._parse_search_results(json.loads(content))
         except ValueError as e:
             print(f"JSON解析错误: {str(e)}")
             return []
+
+    def _fetch_search(self, url, params):
+        """请求Google CSE，返回原始响应内容，失败返回None"""
+        # Google CSE不可用时快速失败
+        breaker = get_circuit_breaker(url)
+        if not breaker.allow_request():
+            print(f"搜索服务熔断中，跳过请求: {breaker.host}")
+            return None
+        try:
+            started = time.monotonic()
+            resp = get_session().get(url, params=params, timeout=10)
+            # 只有429/5xx计为失败；其他4xx（如API key无效、查询错误）说明服务本身可用
+            if resp.status_code in RETRY_STATUS:
+                breaker.record_failure()
+                print(f"搜索服务返回 HTTP {resp.status_code}")
+                return None
+            breaker.record_success(time.monotonic() - started)
+            resp.raise_for_status() 
+            return resp.content
+            
+        except requests.exceptions.HTTPError as e:
+            print(f"搜索请求错误: {str(e)}")
+            return None
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure()
+            print(f"搜索请求错误: {str(e)}")
+            return None
         except Exception as e:
+            breaker.record_failure()
             print(f"未预期的错误: {str(e)}")
-            return []
+            return None
+        except BaseException:
+            breaker.release_probe()
+            raise
+
+    async def agoogle_search(self, query, num=5):
+        """google_search的异步版本"""
+        return await _inflight.ado((query, num), lambda: self._agoogle_search(query, num))
+
+    async def _agoogle_search(self, query, num=5):
+        url, params = self._search_request(query, num)
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return self._load_search_results(await cassette.areplay(cassette_key(url, params)))
+        started = time.monotonic()
+        content = await self._afetch_search(url, params)
+        if cassette is not None:
+            # gzip追加写入放到线程池执行，不阻塞事件循环
+            await asyncio.to_thread(cassette.record, cassette_key(url, params), content, time.monotonic() - started)
+        return self._load_search_results(content)
+
+    async def _afetch_search(self, url, params):
+        # Google CSE不可用时快速失败
+        breaker = get_circuit_breaker(url)
+        if not breaker.allow_request():
+            print(f"搜索服务熔断中，跳过请求: {breaker.host}")
+            return None
+        try:
+            started = time.monotonic()
+            resp = await get_async_client().get(url, params=params, timeout=10)
+            if resp.status_code in RETRY_STATUS:
+                breaker.record_failure()
+                print(f"搜索服务返回 HTTP {resp.status_code}")
+                return None
+            breaker.record_success(time.monotonic() - started)
+            resp.raise_for_status()
+            return resp.content
+            
+        except httpx.HTTPStatusError as e:
+            print(f"搜索请求错误: {str(e)}")
+            return None
+        except httpx.HTTPError as e:
+            breaker.record_failure()
+            print(f"搜索请求错误: {str(e)}")
+            return None
+        except Exception as e:
+            breaker.record_failure()
+            print(f"未预期的错误: {str(e)}")
+            return None
+        except BaseException:
+            # 任务被取消（如客户端断开）时归还探测名额
+            breaker.release_probe()
+            raise
 
     def extract_related_text(self, related):
         texts = []
@@ -77,9 +185,8 @@ class SearchComponent:
                 texts.extend(self.extract_related_text(item["Topics"]))
         return texts
 
-    def init_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        messages = state["messages"]
-        user_question = [msg for msg in messages if isinstance(msg, HumanMessage)]
+    def _get_question(self, state: Dict[str, Any]):
+        user_question = [msg for msg in state["messages"] if isinstance(msg, HumanMessage)]
         
         if not user_question:
             return {
@@ -87,10 +194,11 @@ class SearchComponent:
                 "error": "No user question found",
                 "metadata": state.get("metadata", {})
             }
-        question = user_question[0].content
+        return user_question[0].content
 
+    def _build_result(self, state: Dict[str, Any], question: str, results: List[dict]) -> Dict[str, Any]:
+        messages = state["messages"]
         try:
-            results = self.google_search(question)
             if not results:
                 context = "No relevant information found from Google Search."
             else:
@@ -138,4 +246,19 @@ class SearchComponent:
                 **state.get("metadata", {}),
                 "search_results": results if results else []
             }
-        }
\ No newline at end of file
+        }
+
+    def init_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        question = self._get_question(state)
+        if isinstance(question, dict):
+            return question
+        results = self.google_search(question)
+        return self._build_result(state, question, results)
+
+    async def ainit_search(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """init_search的异步版本"""
+        question = self._get_question(state)
+        if isinstance(question, dict):
+            return question
+        results = await self.agoogle_search(question)
+        return self._build_result(state, question, results)
\ No newline at end of file
@@ -27,7 +27,8 @@ You should may a decision that whether the conversation history can answer the q
 """
 
     
-    def evaluate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_prompt(self, state: Dict[str, Any]):
+        """更新评估计数并构建评估提示，需要直接结束评估时返回结果字典"""
         # 获取或初始化评估计数器
         if "metadata" not in state:
             state["metadata"] = {}
@@ -124,67 +125,91 @@ CONVERSATION HISTORY:
 Please return your decision as a JSON object.
 """)
         ]
-        
+        return eval_prompt
+
+    def _parse_response(self, state: Dict[str, Any], response) -> Dict[str, Any]:
+        """根据评估结果决定下一步"""
+        eval_count = state["metadata"]["eval_count"]
+        # 解析JSON响应
         try:
-            response = self.llm.invoke(eval_prompt)
-            
-            # 解析JSON响应
-            try:
-                eval_result = json.loads(response.content)
-            except json.JSONDecodeError:
-                json_match = re.search(r'({.*?})', response.content.replace('\n', ''))
-                if not json_match:
-                    logger.error(f"无法从评估响应中提取有效的JSON: {response}")
-                    return {
-                        "next": "router",
-                        "metadata": {
-                            **state["metadata"],
-                            "eval_error": "Invalid JSON response from evaluator",
-                            "thinking_content": "Invalid JSON response from evaluator"
-                        }
-                    }
-                eval_result = json.loads(json_match.group(1))
-            
-            logger.info(f"Evaluator决策: {eval_result} (评估轮数: {eval_count}/5)")
-            
-            if eval_result["next_step"] == "CONTINUE":
-                logger.info(f"信息不足，返回router继续查询。原因: {eval_result['reason']}")
+            eval_result = json.loads(response.content)
+        except json.JSONDecodeError:
+            json_match = re.search(r'({.*?})', response.content.replace('\n', ''))
+            if not json_match:
+                logger.error(f"无法从评估响应中提取有效的JSON: {response}")
                 return {
                     "next": "router",
                     "metadata": {
                         **state["metadata"],
-                        "eval_result": eval_result,
-                        "thinking_content": f"Information is insufficient, return router to continue querying.{eval_result['reason']}"
+                        "eval_error": "Invalid JSON response from evaluator",
+                        "thinking_content": "Invalid JSON response from evaluator"
                     }
                 }
-            elif eval_result["next_step"] == "GENERATE":
-                logger.info(f"信息足够，进入生成阶段。原因: {eval_result['reason']}")
-                return {
-                    "next": "generate",
-                    "metadata": {
-                        **state["metadata"],
-                        "eval_result": eval_result,
-                        "thinking_content": f"Information is sufficient, enter generate stage.{eval_result['reason']}"
-                    }
+            eval_result = json.loads(json_match.group(1))
+        
+        logger.info(f"Evaluator决策: {eval_result} (评估轮数: {eval_count}/5)")
+        
+        if eval_result["next_step"] == "CONTINUE":
+            logger.info(f"信息不足，返回router继续查询。原因: {eval_result['reason']}")
+            return {
+                "next": "router",
+                "metadata": {
+                    **state["metadata"],
+                    "eval_result": eval_result,
+                    "thinking_content": f"Information is insufficient, return router to continue querying.{eval_result['reason']}"
                 }
-            else:
-                logger.info("输出不规范，返回router继续查询")
-                return {
-                    "next": "router",
-                    "metadata": {
-                        **state["metadata"],
-                        "eval_error": "Invalid decision from evaluator",
-                        "thinking_content": "Invalid decision from evaluator, return router to continue querying"
-                    }
+            }
+        elif eval_result["next_step"] == "GENERATE":
+            logger.info(f"信息足够，进入生成阶段。原因: {eval_result['reason']}")
+            return {
+                "next": "generate",
+                "metadata": {
+                    **state["metadata"],
+                    "eval_result": eval_result,
+                    "thinking_content": f"Information is sufficient, enter generate stage.{eval_result['reason']}"
                 }
-            
-        except Exception as e:
-            logger.error(f"评估过程中出错: {str(e)}")
+            }
+        else:
+            logger.info("输出不规范，返回router继续查询")
             return {
                 "next": "router",
                 "metadata": {
                     **state["metadata"],
-                    "eval_error": f"Evaluation error: {str(e)}",
-                    "thinking_content": f"Evaluation error: {str(e)}"
+                    "eval_error": "Invalid decision from evaluator",
+                    "thinking_content": "Invalid decision from evaluator, return router to continue querying"
                 }
             }
+
+    def _error_result(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        logger.error(f"评估过程中出错: {str(e)}")
+        return {
+            "next": "router",
+            "metadata": {
+                **state["metadata"],
+                "eval_error": f"Evaluation error: {str(e)}",
+                "thinking_content": f"Evaluation error: {str(e)}"
+            }
+        }
+
+    def evaluate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        eval_prompt = self._build_prompt(state)
+        if isinstance(eval_prompt, dict):
+            return eval_prompt
+        
+        try:
+            response = self.llm.invoke(eval_prompt)
+            return self._parse_response(state, response)
+        except Exception as e:
+            return self._error_result(state, e)
+
+    async def aevaluate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """evaluate的异步版本"""
+        eval_prompt = self._build_prompt(state)
+        if isinstance(eval_prompt, dict):
+            return eval_prompt
+        
+        try:
+            response = await self.llm.ainvoke(eval_prompt)
+            return self._parse_response(state, response)
+        except Exception as e:
+            return self._error_result(state, e)
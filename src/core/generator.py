@@ -16,7 +16,8 @@ class Generator:
             temperature=0
         )
     
-    def generate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_prompt(self, state: Dict[str, Any]):
+        """构建生成提示，返回(提示, 是否为无关问题)；缺少用户问题时返回错误结果"""
         # 保留metadata
         metadata = state.get("metadata", {})
         messages = state["messages"]
@@ -31,19 +32,7 @@ Please generate a polite response that:
 3. Politely declines to answer the current question
 4. Keep the response concise and professional
 """
-            response = self.llm.invoke([SystemMessage(content=irrelevant_prompt)])
-            
-            return {
-                "messages": messages + [
-                    AIMessage(
-                        content=response.content,
-                        additional_kwargs={"type": "final_answer"}
-                    )
-                ],
-                "next": "END",
-                "metadata": metadata,
-                "thinking_content": "User question is not related to bioinformatics, generate a polite response to decline."
-            }
+            return [SystemMessage(content=irrelevant_prompt)], True
 
         # 获取所有用户消息
         user_messages = [msg for msg in messages if isinstance(msg, HumanMessage)]
@@ -94,8 +83,23 @@ Please adhere to the following requirements:
 Please generate your final answer now.
 """
         
-        # 调用LLM生成答案 - 使用单一提示
-        response = self.llm.invoke([SystemMessage(content=combined_prompt)])
+        return [SystemMessage(content=combined_prompt)], False
+
+    def _build_result(self, state: Dict[str, Any], response, irrelevant: bool) -> Dict[str, Any]:
+        metadata = state.get("metadata", {})
+        messages = state["messages"]
+        if irrelevant:
+            return {
+                "messages": messages + [
+                    AIMessage(
+                        content=response.content,
+                        additional_kwargs={"type": "final_answer"}
+                    )
+                ],
+                "next": "END",
+                "metadata": metadata,
+                "thinking_content": "User question is not related to bioinformatics, generate a polite response to decline."
+            }
         
         logger.info("答案生成完成")
         
@@ -112,3 +116,21 @@ Please generate your final answer now.
                 "thinking_content": f"Generate final answer."
             }
         }
+
+    def generate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        prepared = self._build_prompt(state)
+        if isinstance(prepared, dict):
+            return prepared
+        prompt, irrelevant = prepared
+        # 调用LLM生成答案 - 使用单一提示
+        response = self.llm.invoke(prompt)
+        return self._build_result(state, response, irrelevant)
+
+    async def agenerate(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """generate的异步版本"""
+        prepared = self._build_prompt(state)
+        if isinstance(prepared, dict):
+            return prepared
+        prompt, irrelevant = prepared
+        response = await self.llm.ainvoke(prompt)
+        return self._build_result(state, response, irrelevant)
@@ -2,6 +2,7 @@
 from typing import Annotated, Sequence, Optional, Dict, Any
 from typing_extensions import TypedDict
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END, START
 from langgraph.graph.message import add_messages
 from .router import Router
@@ -26,10 +27,10 @@ def initialize_rag_system():
     # 创建工作流
     workflow = StateGraph(AgentState)
     
-    # 添加节点
-    workflow.add_node("router", router.route)
-    workflow.add_node("evaluator", evaluator.evaluate)
-    workflow.add_node("generator", generator.generate)
+    # 添加节点（同时提供同步与异步实现，图可以用 stream 或 astream 驱动）
+    workflow.add_node("router", RunnableLambda(router.route, afunc=router.aroute))
+    workflow.add_node("evaluator", RunnableLambda(evaluator.evaluate, afunc=evaluator.aevaluate))
+    workflow.add_node("generator", RunnableLambda(generator.generate, afunc=generator.agenerate))
     workflow.add_node("eutils_agent", create_eutils_subgraph())
     workflow.add_node("blast_agent", create_blast_subgraph())
     workflow.add_node("search_agent", create_search_subgraph())  # 添加搜索代理
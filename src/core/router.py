@@ -2,9 +2,19 @@ from langchain_ollama import ChatOllama
 import logging
 import json
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from ..tools.circuit_breaker import get_circuit_breaker
+from ..tools.endpoints import eutils_host, blast_host
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
+def agent_upstreams():
+    """各agent依赖的上游服务，熔断时路由避开对应agent"""
+    return {
+        "eutils_agent": eutils_host(),
+        "blast_agent": blast_host(),
+        "search_agent": "www.googleapis.com",
+    }
+
 class Router:
     def __init__(self):
         self.llm = ChatOllama(
@@ -15,7 +25,12 @@ class Router:
             temperature=0
         )
     
-    def route(self, state):
+    def _unavailable_agents(self):
+        """返回上游熔断中的agent"""
+        return [agent for agent, host in agent_upstreams().items() if not get_circuit_breaker(host).is_available()]
+
+    def _build_prompt(self, state, unavailable):
+        """构建路由提示，缺少用户问题时返回错误结果"""
         # 保留metadata
         metadata = state.get("metadata", {})
         messages = state["messages"]
@@ -80,6 +95,9 @@ CONVERSATION HISTORY:
 PREVIOUS EVALUATOR'S OPINION:
 {eval_reason}
 --------------------------------
+UNAVAILABLE AGENTS (upstream service is down, do NOT choose them):
+{", ".join(unavailable) if unavailable else "None"}
+--------------------------------
 
 You MUST output your decision in the following JSON format:
 {{
@@ -90,51 +108,84 @@ You MUST output your decision in the following JSON format:
 Do not include any other text or formatting. ONLY return the JSON object.
 """
         
-        # 构建单一消息的提示
-        router_prompt = [SystemMessage(content=combined_prompt)]
-        
-        # 添加重试机制
-        max_retries = 3
-        for attempt in range(max_retries):
-            response = self.llm.invoke(router_prompt)
+        return [SystemMessage(content=combined_prompt)]
+
+    def _parse_response(self, response, metadata, unavailable):
+        """解析路由结果，格式不正确或选择了不可用的agent时返回None"""
+        try:
+            # 尝试解析JSON响应
+            response_json = json.loads(response.content)
             
-            try:
-                # 尝试解析JSON响应
-                response_json = json.loads(response.content)
+            # 验证JSON格式是否正确
+            if "agent" in response_json and "reason" in response_json:
+                agent = response_json["agent"]
+                reason = response_json["reason"]
                 
-                # 验证JSON格式是否正确
-                if "agent" in response_json and "reason" in response_json:
-                    agent = response_json["agent"]
-                    reason = response_json["reason"]
-                    
-                    if agent in ["eutils_agent", "blast_agent", "search_agent","irrelevant_questions"]:
-                        # 记录路由决策和原因
-                        logger.info(f"路由决策: {agent}, 原因: {reason}")
-                        return {
-                            "next": agent,
-                            "metadata": {
-                                **metadata,
-                                "routing_reason": "IRRELEVANT REQUEST." if agent == "irrelevant_questions" else reason,
-                                "thinking_content": f"{agent} was chosen for the next step. Reason: {reason}"
-                            }
+                if agent in unavailable:
+                    logger.warning(f"{agent} 的上游服务熔断中，重新路由")
+                elif agent in ["eutils_agent", "blast_agent", "search_agent","irrelevant_questions"]:
+                    # 记录路由决策和原因
+                    logger.info(f"路由决策: {agent}, 原因: {reason}")
+                    return {
+                        "next": agent,
+                        "metadata": {
+                            **metadata,
+                            "routing_reason": "IRRELEVANT REQUEST." if agent == "irrelevant_questions" else reason,
+                            "thinking_content": f"{agent} was chosen for the next step. Reason: {reason}"
                         }
-                    else:
-                        logger.warning(f"未知的agent: {agent}")
+                    }
                 else:
-                    logger.warning(f"JSON响应格式不正确: {response_json}")
-            except json.JSONDecodeError:
-                logger.warning(f"尝试 {attempt + 1}/{max_retries}: 无法解析JSON: {response.content}")
-            
-            logger.warning(f"尝试 {attempt + 1}/{max_retries}: {response.content}")
-        
-        # 默认使用 eutils
-        logger.warning("多次尝试失败，默认使用 eutils")
+                    logger.warning(f"未知的agent: {agent}")
+            else:
+                logger.warning(f"JSON响应格式不正确: {response_json}")
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析JSON: {response.content}")
+        return None
+
+    def _default_route(self, metadata, unavailable):
+        # 默认使用 eutils，eutils熔断时依次退回到其他可用的agent
+        agent = next((a for a in agent_upstreams() if a not in unavailable), "eutils_agent")
+        logger.warning(f"多次尝试失败，默认使用 {agent}")
         return {
-            "next": "eutils_agent",
+            "next": agent,
             "metadata": {
                 **metadata,
-                "thinking_content": "Failed to route, default to eutils"
+                "thinking_content": f"Failed to route, default to {agent}"
             }
         }
+
+    def route(self, state):
+        metadata = state.get("metadata", {})
+        unavailable = self._unavailable_agents()
+        router_prompt = self._build_prompt(state, unavailable)
+        if isinstance(router_prompt, dict):
+            return router_prompt
+        
+        # 添加重试机制
+        max_retries = 3
+        for attempt in range(max_retries):
+            response = self.llm.invoke(router_prompt)
+            result = self._parse_response(response, metadata, unavailable)
+            if result is not None:
+                return result
+            logger.warning(f"尝试 {attempt + 1}/{max_retries}: {response.content}")
+        
+        return self._default_route(metadata, unavailable)
+
+    async def aroute(self, state):
+        """route的异步版本"""
+        metadata = state.get("metadata", {})
+        unavailable = self._unavailable_agents()
+        router_prompt = self._build_prompt(state, unavailable)
+        if isinstance(router_prompt, dict):
+            return router_prompt
+        
+        max_retries = 3
+        for attempt in range(max_retries):
+            response = await self.llm.ainvoke(router_prompt)
+            result = self._parse_response(response, metadata, unavailable)
+            if result is not None:
+                return result
+            logger.warning(f"尝试 {attempt + 1}/{max_retries}: {response.content}")
         
-    
\ No newline at end of file
+        return self._default_route(metadata, unavailable)
@@ -0,0 +1,177 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, Optional
+from .param_keys import clean_sequence
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# 结果缓存时间（nt库持续更新），RID在NCBI上的保留时间（官方约36小时，保守取24小时）
+DEFAULT_RESULT_TTL = 30 * 24 * 3600
+DEFAULT_RID_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+PLUS = "plus"
+MINUS = "minus"
+
+# IUPAC核苷酸互补
+COMPLEMENT = str.maketrans("ACGTURYKMBVDHSWN", "TGCAAYRMKVBHDSWN")
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(COMPLEMENT)[::-1]
+
+def canonical_sequence(sequence: str):
+    """
+    正链与反向互补链取字典序较小者作为规范序列，两条链命中同一条缓存
+    返回(规范序列, 原序列相对规范序列的链方向)
+    """
+    sequence = clean_sequence(sequence)
+    rc = reverse_complement(sequence)
+    if rc < sequence:
+        return rc, MINUS
+    return sequence, PLUS
+
+def blast_cache_key(sequence: str, program: str, database: str, megablast: str, hitlist_size: int):
+    """缓存键：规范序列与检索参数的哈希，返回(键, 链方向)"""
+    canonical, strand = canonical_sequence(sequence)
+    # LLM给出的hitlist_size可能是字符串
+    raw = f"{canonical}|{program}|{database}|{megablast}|{int(hitlist_size)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest(), strand
+
+class BlastCache:
+    """
+    基于SQLite的BLAST结果缓存
+    - 提交Put后先记录RID，仍在NCBI保留期内的RID可以被相同查询复用（包括并发的相同查询）
+    - 获取到结果后保存结果内容，相同查询直接返回，不再提交
+    - 记录缓存条目对应的链方向，反向互补序列命中时提示调用方
+    - 结果总大小超过上限时按最近访问时间（LRU）淘汰
+    """
+    def __init__(self, path: str, result_ttl: int = DEFAULT_RESULT_TTL, rid_ttl: int = DEFAULT_RID_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.result_ttl = result_ttl
+        self.rid_ttl = rid_ttl
+        self.hits = 0
+        self.rid_reuses = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS blast_results (
+                key TEXT PRIMARY KEY,
+                strand TEXT,
+                rid TEXT,
+                rid_expires_at REAL,
+                body BLOB,
+                size INTEGER DEFAULT 0,
+                expires_at REAL,
+                last_access REAL
+            )
+        """)
+        # 兼容旧版本创建的缓存文件
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(blast_results)")}
+        if "size" not in columns:
+            self._conn.execute("ALTER TABLE blast_results ADD COLUMN size INTEGER DEFAULT 0")
+            self._conn.execute("UPDATE blast_results SET size = COALESCE(LENGTH(body), 0)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_blast_results_last_access ON blast_results(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        返回 {"rid", "strand", "body"}：body不为空时是有效的缓存结果，
+        否则rid仍在保留期内可以复用；都无效时返回None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT strand, rid, rid_expires_at, body, expires_at FROM blast_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            strand, rid, rid_expires_at, body, expires_at = row
+            if body is not None and expires_at > now:
+                self._conn.execute("UPDATE blast_results SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+                return {"rid": rid, "strand": strand, "body": body}
+            if rid and rid_expires_at > now:
+                self.rid_reuses += 1
+                return {"rid": rid, "strand": strand, "body": None}
+            self.misses += 1
+            return None
+
+    def set_rid(self, key: str, strand: str, rid: str):
+        """记录新提交的RID，清除过期的结果"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO blast_results (key, strand, rid, rid_expires_at, body, expires_at, last_access) VALUES (?, ?, ?, ?, NULL, 0, ?)
+                   ON CONFLICT(key) DO UPDATE SET strand = excluded.strand, rid = excluded.rid, rid_expires_at = excluded.rid_expires_at,
+                   body = NULL, size = 0, expires_at = 0, last_access = excluded.last_access""",
+                (key, strand, rid, now + self.rid_ttl, now)
+            )
+            self._conn.commit()
+
+    def set_result(self, key: str, rid: str, body: bytes):
+        """保存RID对应的结果；条目已被更新的RID替换时不覆盖"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE blast_results SET body = ?, size = ?, expires_at = ?, last_access = ? WHERE key = ? AND rid = ?",
+                (body, len(body), now + self.result_ttl, now, key, rid)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的条目，直到结果总大小不超过上限"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blast_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM blast_results WHERE size > 0 ORDER BY last_access ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM blast_results WHERE key = ?", evicted)
+        logger.info(f"BLAST缓存淘汰 {len(evicted)} 条记录")
+
+    def discard(self, key: str, rid: str):
+        """RID在NCBI上已失效或获取失败时删除对应条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM blast_results WHERE key = ? AND rid = ? AND body IS NULL", (key, rid))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blast_results WHERE body IS NOT NULL").fetchone()
+        return {"hits": self.hits, "rid_reuses": self.rid_reuses, "misses": self.misses, "entries": entries, "bytes": size}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_blast_cache() -> Optional[BlastCache]:
+    """获取共享的BLAST结果缓存，设置 BLAST_CACHE=0 时禁用"""
+    global _cache
+    if os.getenv("BLAST_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.getenv("BLAST_CACHE_PATH", os.path.join(ROOT_DIR, "cache", "blast.sqlite3"))
+                result_ttl = int(os.getenv("BLAST_CACHE_TTL", str(DEFAULT_RESULT_TTL)))
+                rid_ttl = int(os.getenv("BLAST_RID_TTL", str(DEFAULT_RID_TTL)))
+                max_bytes = int(float(os.getenv("BLAST_CACHE_MAX_MB", "256")) * 1024 * 1024)
+                _cache = BlastCache(path, result_ttl, rid_ttl, max_bytes)
+    return _cache
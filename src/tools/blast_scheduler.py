@@ -0,0 +1,145 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from .call_api import call_api, CALL_DEADLINE
+from .circuit_breaker import get_circuit_breaker
+from .cassette import get_cassette
+from .endpoints import blast_host
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+# 轮询间隔：第n次轮询前等待 min(POLL_INTERVAL * n, MAX_POLL_INTERVAL) 秒，即15、30、45、60秒
+POLL_INTERVAL = float(os.getenv("BLAST_POLL_INTERVAL", "15"))
+MAX_POLL_INTERVAL = float(os.getenv("BLAST_MAX_POLL_INTERVAL", "60"))
+MAX_POLLS = int(os.getenv("BLAST_MAX_POLLS", "4"))
+# 图节点等待轮询结果的上限（秒），默认为全部轮询间隔加上每次GET请求的deadline
+MAX_WAIT = os.getenv("BLAST_MAX_WAIT")
+# 同时进行的GET请求数（调度循环本身只有一个线程）
+POLL_WORKERS = int(os.getenv("BLAST_POLL_WORKERS", "4"))
+
+# 任务结果的status
+READY = "ready"              # 得到结果，response为结果内容
+WAITING = "waiting"          # 轮询次数用完仍在运行
+FAILED = "failed"            # 最后一次GET请求失败，或RID在NCBI上不存在/已过期
+UNAVAILABLE = "unavailable"  # BLAST服务熔断中
+
+def _poll_delay(polls: int) -> float:
+    # 回放模式不访问NCBI，轮询间隔没有意义（每次回放的延迟由OPENBIO_REPLAY_LATENCY注入）
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        return 0.0
+    return min(POLL_INTERVAL * (polls + 1), MAX_POLL_INTERVAL)
+
+def max_wait(max_polls: Optional[int] = None) -> float:
+    """等待submit返回的Future的最长时间，超过后按WAITING处理"""
+    if MAX_WAIT is not None:
+        return float(MAX_WAIT)
+    polls = max_polls or MAX_POLLS
+    return sum(min(POLL_INTERVAL * (n + 1), MAX_POLL_INTERVAL) for n in range(polls)) + polls * CALL_DEADLINE
+
+def _is_running(response: bytes) -> bool:
+    text = response.decode("utf-8", errors="ignore")
+    return "Status=WAITING" in text or "is still running" in text
+
+def _is_unknown(response: bytes) -> bool:
+    return "Status=UNKNOWN" in response.decode("utf-8", errors="ignore")
+
+class BlastScheduler:
+    """
+    后台BLAST任务调度：所有未完成的RID由一个调度线程统一按时间轮询
+    图节点提交RID后等待Future（异步节点用asyncio.wrap_future），等待期间不占用线程
+    """
+    def __init__(self, poll_workers: int = POLL_WORKERS):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=poll_workers, thread_name_prefix="blast-poll")
+
+    def submit(self, rid: str, url: str, max_bytes: Optional[int] = None, max_polls: Optional[int] = None) -> Future:
+        """
+        提交RID，返回Future，结果为 {"status", "response", "polls"}
+        同一RID已在轮询时返回同一个Future
+        max_polls: 最多轮询次数，默认MAX_POLLS（批量任务运行时间更长）
+        """
+        with self._cond:
+            job = self._jobs.get(rid)
+            if job is not None:
+                return job["future"]
+            future = Future()
+            self._jobs[rid] = {
+                "rid": rid,
+                "url": url,
+                "max_bytes": max_bytes,
+                "future": future,
+                "polls": 0,
+                "max_polls": max_polls or MAX_POLLS,
+                "due": time.monotonic() + _poll_delay(0),
+                "polling": False,
+            }
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="blast-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._jobs)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                idle = [job for job in self._jobs.values() if not job["polling"]]
+                due = [job for job in idle if job["due"] <= now]
+                if not due:
+                    self._cond.wait(min(job["due"] for job in idle) - now if idle else None)
+                    continue
+                for job in due:
+                    job["polling"] = True
+            for job in due:
+                self._executor.submit(self._poll, job)
+
+    def _poll(self, job: Dict[str, Any]):
+        result = None
+        if not get_circuit_breaker(blast_host()).is_available():
+            logger.error(f"BLAST服务熔断中，停止轮询 RID: {job['rid']}")
+            result = {"status": UNAVAILABLE, "response": None, "polls": job["polls"]}
+        else:
+            try:
+                response = call_api(job["url"], max_bytes=job["max_bytes"])
+            except Exception as e:
+                logger.error(f"轮询BLAST结果出错 RID: {job['rid']}: {str(e)}")
+                response = None
+            job["polls"] += 1
+            if response is not None and _is_unknown(response):
+                result = {"status": FAILED, "response": response, "polls": job["polls"]}
+            elif response is not None and not _is_running(response):
+                result = {"status": READY, "response": response, "polls": job["polls"]}
+            elif job["polls"] >= job["max_polls"]:
+                result = {"status": WAITING if response is not None else FAILED, "response": response, "polls": job["polls"]}
+
+        with self._cond:
+            if result is None:
+                job["due"] = time.monotonic() + _poll_delay(job["polls"])
+                job["polling"] = False
+                self._cond.notify()
+                return
+            self._jobs.pop(job["rid"], None)
+        job["future"].set_result(result)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_blast_scheduler() -> BlastScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = BlastScheduler()
+    return _scheduler
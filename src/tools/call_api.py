@@ -1,40 +1,314 @@
-import urllib.request
-import urllib.error
+import os
+import asyncio
+import httpx
+import requests
 import time
+import random
 import logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse, urlencode
+from .http_client import get_session, get_async_client
+from .rate_limiter import get_rate_limiter
+from .response_cache import get_response_cache, normalize_url
+from .single_flight import SingleFlight
+from .circuit_breaker import get_circuit_breaker
+from .cassette import get_cassette, cassette_key
+from .endpoints import eutils_host
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.ERROR)
 
-def call_api(url, max_retries=3):
-	# 设置最大重试次数，避免无限重试
-	retry_count = 0
-	time.sleep(1)
+# 相同URL的并发请求只向上游发起一次
+_inflight = SingleFlight()
+
+# 超时与重试配置（秒）
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+CALL_DEADLINE = float(os.getenv("API_CALL_DEADLINE", "90"))
+BACKOFF_BASE = float(os.getenv("API_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "30"))
+# NCBI在负载高时返回的可重试状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 可缓存的E-utilities接口
+CACHEABLE_EUTILS = ("esearch.fcgi", "esummary.fcgi", "efetch.fcgi")
+
+def _is_cacheable(url, data=None):
+	parsed = urlparse(url)
+	# WebEnv只在History Server上短期有效，按WebEnv获取的结果不缓存
+	if data is not None or "WebEnv=" in parsed.query:
+		return False
+	return parsed.hostname == eutils_host() and parsed.path.endswith(CACHEABLE_EUTILS)
+
+def _prepare_url(url):
 	url = url.replace(' ', '+')
+	# 配置了NCBI API key时附加到E-utilities请求上，以获得10次/秒的配额
+	api_key = os.getenv("NCBI_API_KEY")
+	if api_key and urlparse(url).hostname == eutils_host() and "api_key=" not in url:
+		url += f"&api_key={api_key}"
+	return url
+
+def _retry_after(value):
+	"""解析Retry-After头（秒数或HTTP日期），无法解析时返回None"""
+	if not value:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+	except (TypeError, ValueError):
+		return None
+
+def _retry_delay(attempt, retry_after=None):
+	"""优先遵循Retry-After，否则使用带抖动的指数退避（full jitter）"""
+	delay = _retry_after(retry_after)
+	if delay is not None:
+		return delay
+	return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def _store(cache, url, content, complete=True):
+	# E-utilities的错误响应也是HTTP 200，不缓存
+	if cache is not None and not content.lstrip().startswith(b'{"error"'):
+		cache.set(url, content, complete)
+
+def _read_capped(chunks, max_bytes, deadline_at=None):
+	"""
+	流式读取（已按Content-Encoding解压的）响应体，超过max_bytes后提前停止
+	超过deadline_at（time.monotonic()）时抛出超时，避免缓慢滴漏的响应拖过整体截止时间
+	返回(内容, 是否完整)
+	"""
+	buf = bytearray()
+	for chunk in chunks:
+		if deadline_at is not None and time.monotonic() > deadline_at:
+			raise requests.exceptions.Timeout("API call deadline exceeded while reading response body")
+		buf.extend(chunk)
+		if max_bytes is not None and len(buf) >= max_bytes:
+			logger.info(f"响应超过 {max_bytes} 字节，提前停止读取")
+			return bytes(buf[:max_bytes]), False
+	return bytes(buf), True
+
+def _iter_body(response, chunk_size=16384):
+	"""
+	逐块读取响应体：iter_content每块会等满chunk_size字节才返回，
+	urllib3的read1有数据就返回，读取循环才能及时检查截止时间
+	"""
+	raw = response.raw
+	if not hasattr(raw, "read1"):
+		yield from response.iter_content(chunk_size=chunk_size)
+		return
+	while True:
+		chunk = raw.read1(chunk_size, decode_content=True)
+		if not chunk:
+			return
+		yield chunk
+
+async def _aread_capped(chunks, max_bytes, deadline_at=None):
+	buf = bytearray()
+	async for chunk in chunks:
+		if deadline_at is not None and time.monotonic() > deadline_at:
+			raise httpx.ReadTimeout("API call deadline exceeded while reading response body")
+		buf.extend(chunk)
+		if max_bytes is not None and len(buf) >= max_bytes:
+			logger.info(f"响应超过 {max_bytes} 字节，提前停止读取")
+			return bytes(buf[:max_bytes]), False
+	return bytes(buf), True
 
-	while retry_count < max_retries:
+def call_api(url, max_retries=3, deadline=None, max_bytes=None, data=None):
+	"""
+	调用上游API，返回响应内容（bytes），失败时返回None
+	deadline: 整个调用（包括重试和等待）的最长时间，默认API_CALL_DEADLINE
+	max_bytes: 最多读取的（解压后）字节数，超过时提前终止下载并截断
+	data: 表单参数，不为空时以POST发送（如EPost的ID列表）
+	"""
+	url = _prepare_url(url)
+	# 回放模式直接从cassette读取，不访问网络
+	cassette = get_cassette()
+	if cassette is not None and cassette.replaying:
+		return _cap(cassette.replay(cassette_key(url, data)), max_bytes)
+	started = time.monotonic()
+	content = _call(url, max_retries, deadline, max_bytes, data)
+	if cassette is not None:
+		cassette.record(cassette_key(url, data), content, time.monotonic() - started)
+	return content
+
+def _cap(content, max_bytes):
+	if content is None or max_bytes is None:
+		return content
+	return content[:max_bytes]
+
+def _inflight_key(url, max_bytes, data):
+	return (normalize_url(url), max_bytes, urlencode(sorted(data.items())) if data else None)
+
+def _call(url, max_retries, deadline, max_bytes, data):
+	# 先查本地响应缓存
+	cache = get_response_cache() if _is_cacheable(url, data) else None
+	if cache is not None:
+		cached = cache.get(url, max_bytes)
+		if cached is not None:
+			return cached
+	deadline_at = time.monotonic() + (deadline or CALL_DEADLINE)
+	try:
+		# 等待进行中的相同请求同样受截止时间限制
+		return _inflight.do(_inflight_key(url, max_bytes, data), lambda: _request(url, cache, max_retries, deadline_at, max_bytes, data),
+			timeout=deadline_at - time.monotonic())
+	except TimeoutError:
+		logger.error(f"API call deadline exceeded: {url}")
+		return None
+
+def _request(url, cache, max_retries, deadline_at, max_bytes, data):
+	# 按host共享的令牌桶，取代每次请求前固定sleep
+	limiter = get_rate_limiter(url)
+	# 按host的熔断器，上游故障时快速失败
+	breaker = get_circuit_breaker(url)
+	# 共享会话，复用到同一host的keep-alive连接
+	session = get_session()
+
+	# 设置最大重试次数，避免无限重试
+	for attempt in range(max_retries):
+		remaining = deadline_at - time.monotonic()
+		if remaining <= 0:
+			break
+		if not breaker.allow_request():
+			logger.error(f"Circuit breaker open for {breaker.host}, skip calling: {url}")
+			return None
 		try:
-			logger.info(f"Calling API with URL: {url}")
-			req = urllib.request.Request(url)
-			with urllib.request.urlopen(req) as response:
-				call = response.read()
-			return call
-		except urllib.error.HTTPError as e:
-			# 如果遇到HTTP 500错误，进行重试
-			if e.code == 500:
-				retry_count += 1
-				logger.warning(f"HTTP 500 Error encountered. Retry {retry_count}/{max_retries}...")
-				time.sleep(5)  # 等待5秒后重试
-			else:
-				# 对于其他错误，直接记录并返回None
-				logger.error(f"Error calling API with URL: {url}")
-				logger.error(f"Exception: {str(e)}", exc_info=True)
+			# 限流等待会超过截止时间时不再发起请求
+			if limiter is not None and not limiter.acquire(max_wait=remaining):
+				logger.error(f"API call deadline exceeded while rate limited: {url}")
 				return None
+			logger.info(f"Calling API with URL: {url}")
+			started = time.monotonic()
+			# stream=True：按需读取响应体，达到上限后不再下载剩余部分
+			method = "GET" if data is None else "POST"
+			with session.request(method, url, data=data, timeout=(CONNECT_TIMEOUT, min(READ_TIMEOUT, remaining)), stream=True) as response:
+				if response.status_code in RETRY_STATUS:
+					breaker.record_failure()
+					delay = _retry_delay(attempt, response.headers.get("Retry-After"))
+					logger.warning(f"HTTP {response.status_code} Error encountered. Retry {attempt + 1}/{max_retries}...")
+				else:
+					# 4xx说明上游本身可用
+					breaker.record_success(time.monotonic() - started)
+					response.raise_for_status()
+					content, complete = _read_capped(_iter_body(response), max_bytes, deadline_at)
+					_store(cache, url, content, complete)
+					return content
+		except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+			# 连接失败或超时同样视为暂时性错误
+			breaker.record_failure()
+			delay = _retry_delay(attempt)
+			logger.warning(f"Transient error: {str(e)}. Retry {attempt + 1}/{max_retries}...")
+		except requests.exceptions.HTTPError as e:
+			# 对于其他HTTP错误，直接记录并返回None
+			logger.error(f"Error calling API with URL: {url}")
+			logger.error(f"Exception: {str(e)}", exc_info=True)
+			return None
 		except Exception as e:
+			breaker.record_failure()
 			logger.error(f"Error calling API with URL: {url}")
 			logger.error(f"Exception: {str(e)}", exc_info=True)
 			return None
+		except BaseException:
+			# 被中断时没有结果，归还熔断器的探测名额，否则半开状态会一直拒绝请求
+			breaker.release_probe()
+			raise
+
+		if attempt + 1 >= max_retries:
+			break
+		# 等待后会超过截止时间则不再重试
+		if time.monotonic() + delay >= deadline_at:
+			logger.error(f"API call deadline exceeded: {url}")
+			return None
+		time.sleep(delay)
 
 	# 如果重试次数用完，返回None
+	logger.error(f"API call failed after {max_retries} attempts.")
+	return None
+
+async def acall_api(url, max_retries=3, deadline=None, max_bytes=None, data=None):
+	"""call_api的异步版本，等待期间不占用线程"""
+	url = _prepare_url(url)
+	cassette = get_cassette()
+	if cassette is not None and cassette.replaying:
+		return _cap(await cassette.areplay(cassette_key(url, data)), max_bytes)
+	started = time.monotonic()
+	content = await _acall(url, max_retries, deadline, max_bytes, data)
+	if cassette is not None:
+		await asyncio.to_thread(cassette.record, cassette_key(url, data), content, time.monotonic() - started)
+	return content
+
+async def _acall(url, max_retries, deadline, max_bytes, data):
+	cache = get_response_cache() if _is_cacheable(url, data) else None
+	if cache is not None:
+		# SQLite读写（WAL竞争时可能等待）放到线程池执行，不阻塞事件循环
+		cached = await asyncio.to_thread(cache.get, url, max_bytes)
+		if cached is not None:
+			return cached
+	deadline_at = time.monotonic() + (deadline or CALL_DEADLINE)
+	try:
+		return await asyncio.wait_for(
+			_inflight.ado(_inflight_key(url, max_bytes, data), lambda: _arequest(url, cache, max_retries, deadline_at, max_bytes, data)),
+			timeout=max(0.0, deadline_at - time.monotonic()))
+	except asyncio.TimeoutError:
+		logger.error(f"API call deadline exceeded: {url}")
+		return None
+
+async def _arequest(url, cache, max_retries, deadline_at, max_bytes, data):
+	limiter = get_rate_limiter(url)
+	breaker = get_circuit_breaker(url)
+	client = get_async_client()
+
+	for attempt in range(max_retries):
+		remaining = deadline_at - time.monotonic()
+		if remaining <= 0:
+			break
+		if not breaker.allow_request():
+			logger.error(f"Circuit breaker open for {breaker.host}, skip calling: {url}")
+			return None
+		try:
+			if limiter is not None and not await limiter.aacquire(max_wait=remaining):
+				logger.error(f"API call deadline exceeded while rate limited: {url}")
+				return None
+			logger.info(f"Calling API with URL: {url}")
+			read_timeout = min(READ_TIMEOUT, remaining)
+			started = time.monotonic()
+			method = "GET" if data is None else "POST"
+			async with client.stream(method, url, data=data, timeout=httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT)) as response:
+				if response.status_code in RETRY_STATUS:
+					breaker.record_failure()
+					delay = _retry_delay(attempt, response.headers.get("Retry-After"))
+					logger.warning(f"HTTP {response.status_code} Error encountered. Retry {attempt + 1}/{max_retries}...")
+				else:
+					breaker.record_success(time.monotonic() - started)
+					response.raise_for_status()
+					content, complete = await _aread_capped(response.aiter_bytes(), max_bytes, deadline_at)
+					await asyncio.to_thread(_store, cache, url, content, complete)
+					return content
+		except httpx.TransportError as e:
+			breaker.record_failure()
+			delay = _retry_delay(attempt)
+			logger.warning(f"Transient error: {str(e)}. Retry {attempt + 1}/{max_retries}...")
+		except httpx.HTTPStatusError as e:
+			logger.error(f"Error calling API with URL: {url}")
+			logger.error(f"Exception: {str(e)}", exc_info=True)
+			return None
+		except Exception as e:
+			breaker.record_failure()
+			logger.error(f"Error calling API with URL: {url}")
+			logger.error(f"Exception: {str(e)}", exc_info=True)
+			return None
+		except BaseException:
+			# 任务被取消（如客户端断开）时归还探测名额
+			breaker.release_probe()
+			raise
+
+		if attempt + 1 >= max_retries:
+			break
+		if time.monotonic() + delay >= deadline_at:
+			logger.error(f"API call deadline exceeded: {url}")
+			return None
+		await asyncio.sleep(delay)
+
 	logger.error(f"API call failed after {max_retries} attempts.")
 	return None
\ No newline at end of file
@@ -0,0 +1,176 @@
+import os
+import json
+import gzip
+import time
+import random
+import base64
+import asyncio
+import threading
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+from .response_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+LIVE = "live"
+RECORD = "record"
+REPLAY = "replay"
+
+# 与结果无关的密钥类参数不进入cassette
+SECRET_PARAMS = {"key", "api_key"}
+
+def cassette_key(url: str, params: Optional[dict] = None) -> str:
+    """请求在cassette中的键：规范化URL（包含查询参数，去掉密钥）"""
+    if params:
+        query = urlencode({k: v for k, v in params.items() if k not in SECRET_PARAMS})
+        url = f"{url}{'&' if '?' in url else '?'}{query}"
+    return normalize_url(url)
+
+def _latency_sampler(spec: str, seed: Optional[str]):
+    """
+    解析回放延迟配置，返回 (记录的延迟) -> 等待秒数 的函数
+    - none: 不等待（默认，只测量本地开销）
+    - recorded: 按录制时的实际耗时等待
+    - fixed:<秒>
+    - uniform:<最小>,<最大>
+    - lognormal:<mu>,<sigma>（中位数为 e^mu 秒）
+    """
+    rng = random.Random(seed)
+    name, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if name == "none":
+        return lambda recorded: 0.0
+    if name == "recorded":
+        return lambda recorded: recorded
+    if name == "fixed" and len(values) == 1:
+        return lambda recorded: values[0]
+    if name == "uniform" and len(values) == 2:
+        return lambda recorded: rng.uniform(values[0], values[1])
+    if name == "lognormal" and len(values) == 2:
+        return lambda recorded: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Invalid OPENBIO_REPLAY_LATENCY: {spec}")
+
+class Cassette:
+    """
+    HTTP录制/回放
+    - record: 把每次请求的响应（失败记为null）和耗时追加写入gzip压缩的JSONL文件
+    - replay: 从文件读取响应，不访问网络，可按配置注入延迟
+    同一个请求录制了多次时（如BLAST轮询）按录制顺序依次回放，用完后重复最后一条
+    """
+    def __init__(self, path: str, mode: str, latency: str = "none", seed: Optional[str] = None):
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self._latency = _latency_sampler(latency, seed)
+        if mode == REPLAY:
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette not found: {self.path}")
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        logger.info(f"加载cassette: {self.path}, {len(self._entries)} 个请求")
+
+    def record(self, key: str, body: Optional[bytes], latency: float):
+        entry = {"key": key, "latency": round(latency, 4), "body": None, "encoding": None}
+        if body is not None:
+            try:
+                entry["body"], entry["encoding"] = body.decode("utf-8"), "utf-8"
+            except UnicodeDecodeError:
+                entry["body"], entry["encoding"] = base64.b64encode(body).decode("ascii"), "base64"
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            # gzip支持多个member拼接，每条记录单独追加，中途退出也不会损坏已写入的内容
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def _next(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            self.hits += 1
+            return entries[min(position, len(entries) - 1)]
+
+    def _decode(self, entry: dict) -> Optional[bytes]:
+        if entry["body"] is None:
+            return None
+        if entry["encoding"] == "base64":
+            return base64.b64decode(entry["body"])
+        return entry["body"].encode("utf-8")
+
+    def replay(self, key: str) -> Optional[bytes]:
+        """返回录制的响应，未录制或录制时失败返回None"""
+        entry = self._next(key)
+        if entry is None:
+            logger.error(f"Request not found in cassette: {key}")
+            return None
+        delay = self._latency(entry["latency"])
+        if delay > 0:
+            time.sleep(delay)
+        return self._decode(entry)
+
+    async def areplay(self, key: str) -> Optional[bytes]:
+        """replay的异步版本：查找和解码（取锁、base64）放到线程池执行，注入的延迟用asyncio.sleep"""
+        entry = await asyncio.to_thread(self._next, key)
+        if entry is None:
+            logger.error(f"Request not found in cassette: {key}")
+            return None
+        delay = self._latency(entry["latency"])
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return await asyncio.to_thread(self._decode, entry)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses}
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    根据 OPENBIO_HTTP_MODE（live/record/replay）获取共享的cassette，live模式返回None
+    OPENBIO_CASSETTE_PATH: cassette文件路径
+    OPENBIO_REPLAY_LATENCY / OPENBIO_REPLAY_SEED: 回放时注入的延迟分布和随机种子
+    """
+    global _cassette
+    mode = os.getenv("OPENBIO_HTTP_MODE", LIVE).lower()
+    if mode == LIVE:
+        return None
+    if mode not in (RECORD, REPLAY):
+        raise ValueError(f"Invalid OPENBIO_HTTP_MODE: {mode}")
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                path = os.getenv("OPENBIO_CASSETTE_PATH", os.path.join(ROOT_DIR, "cassettes", "http.jsonl.gz"))
+                _cassette = Cassette(
+                    path,
+                    mode,
+                    latency=os.getenv("OPENBIO_REPLAY_LATENCY", "none"),
+                    seed=os.getenv("OPENBIO_REPLAY_SEED"),
+                )
+                logger.info(f"HTTP {mode} 模式, cassette: {path}")
+    return _cassette
@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+import logging
+from typing import Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    单个上游host的熔断器
+    - closed: 正常放行，连续失败（或慢调用）达到阈值后打开
+    - open: 直接拒绝请求，reset_timeout 后进入半开
+    - half_open: 只放行一个探测请求，成功则关闭，失败则重新打开；
+      探测请求被取消时由调用方release_probe，超过reset_timeout仍无结果的探测视为丢失，允许重新探测
+    """
+    def __init__(self, host: str, failure_threshold: int, latency_threshold: float, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def is_available(self) -> bool:
+        """不占用探测名额，仅判断当前是否可能放行请求"""
+        return self.state != OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = HALF_OPEN
+                self._probing = False
+            # 半开状态只放行一个探测请求
+            if self._probing and time.monotonic() - self._probe_started < self.reset_timeout:
+                return False
+            self._probing = True
+            self._probe_started = time.monotonic()
+            logger.info(f"{self.host} 熔断器半开，发送探测请求")
+            return True
+
+    def release_probe(self):
+        """请求在得到结果前被取消（如客户端断开）时调用，归还半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, latency: float = 0.0):
+        # 超过延迟阈值的调用按失败计
+        if self.latency_threshold and latency > self.latency_threshold:
+            logger.warning(f"{self.host} 响应过慢: {latency:.1f}s")
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"{self.host} 熔断器关闭")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"{self.host} 熔断器打开 (连续失败 {self._failures} 次)")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(url_or_host: str) -> CircuitBreaker:
+    """按host获取共享的熔断器"""
+    host = urlparse(url_or_host).hostname if "://" in url_or_host else url_or_host
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(
+                host,
+                failure_threshold=int(os.getenv("CB_FAILURE_THRESHOLD", "5")),
+                latency_threshold=float(os.getenv("CB_LATENCY_THRESHOLD", "30")),
+                reset_timeout=float(os.getenv("CB_RESET_TIMEOUT", "60")),
+            )
+        return _breakers[host]
+
+def breaker_states() -> Dict[str, str]:
+    """返回所有已知host的熔断器状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.host: breaker.state for breaker in breakers}
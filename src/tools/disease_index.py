@@ -0,0 +1,243 @@
+"""
+本地疾病→基因全文索引：把OMIM/MedGen的制表符文件导入SQLite FTS5，
+按疾病名称和同义词做BM25排序检索，返回相关基因符号和染色体位置
+
+支持的文件（按表头识别，支持.gz）：
+- OMIM morbidmap.txt: Phenotype / Gene/Locus And Other Related Symbols / MIM Number / Cyto Location
+- OMIM mimTitles.txt: Prefix / MIM Number / Preferred Title; symbol / Alternative Title(s); symbol(s) / ...
+- MedGen gene_condition_source_id: GeneID / AssociatedGenes / RelatedGenes / ConceptID / DiseaseName / ... / DiseaseMIM
+- 通用格式: disease / synonyms / genes / location（多个值以"|"或";"分隔）
+
+    python -m src.tools.disease_index morbidmap.txt mimTitles.txt gene_condition_source_id
+"""
+import os
+import re
+import gzip
+import sqlite3
+import argparse
+import threading
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# morbidmap的表型列形如"Breast-ovarian cancer, familial, 1, 604370 (3)"
+PHENOTYPE_PATTERN = re.compile(r"^(.*?)(?:,\s*(\d{6}))?\s*\((\d)\)\s*$")
+# 检索时忽略的常见词
+STOPWORDS = {"the", "of", "and", "or", "not", "in", "to", "with", "a", "an", "gene", "genes", "related", "associated", "disease", "diseases"}
+
+def _rows(path: str) -> Iterator[Dict[str, str]]:
+    """读取制表符文件；OMIM文件开头有多行#注释，最后一行#注释是表头"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        header = None
+        for line in f:
+            if line.startswith("#"):
+                if "\t" in line:
+                    header = [h.strip() for h in line.lstrip("#").rstrip("\n").split("\t")]
+                continue
+            if header is None:
+                header = [h.strip() for h in line.rstrip("\n").split("\t")]
+                continue
+            yield dict(zip(header, line.rstrip("\n").split("\t")))
+
+def _split(value: str, sep: str = r"[|;]") -> List[str]:
+    if not value or value == "-":
+        return []
+    return [v.strip() for v in re.split(sep, value) if v.strip() and v.strip() != "-"]
+
+class _Collector:
+    """按疾病合并多个来源的条目：有MIM号时按MIM号，否则按MedGen概念ID或名称"""
+    def __init__(self):
+        self.diseases: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, key: str, name: str = "", mim: str = "", concept_id: str = "",
+            synonyms: List[str] = (), genes: List[str] = (), locations: List[str] = (), source: str = ""):
+        disease = self.diseases.setdefault(key, {
+            "mim": "", "concept_id": "", "name": "", "synonyms": [], "genes": [], "locations": [], "sources": [],
+        })
+        disease["mim"] = disease["mim"] or mim
+        disease["concept_id"] = disease["concept_id"] or concept_id
+        disease["name"] = disease["name"] or name
+        for field, values in (("synonyms", synonyms), ("genes", genes), ("locations", locations), ("sources", [source])):
+            for value in values:
+                if value and value not in disease[field] and value != disease["name"]:
+                    disease[field].append(value)
+
+    def import_file(self, path: str) -> int:
+        count = 0
+        for row in _rows(path):
+            if "Phenotype" in row and "Cyto Location" in row:
+                self._morbidmap(row)
+            elif "Preferred Title; symbol" in row:
+                self._mim_title(row)
+            elif "DiseaseName" in row:
+                self._medgen(row)
+            elif "disease" in row:
+                self._generic(row)
+            else:
+                raise ValueError(f"Unrecognized disease table: {path}")
+            count += 1
+        return count
+
+    def _morbidmap(self, row: Dict[str, str]):
+        match = PHENOTYPE_PATTERN.match(row["Phenotype"])
+        if not match:
+            return
+        name, phenotype_mim = match.group(1).strip().strip("{}[]?"), match.group(2)
+        genes = _split(row.get("Gene/Locus And Other Related Symbols", ""), r",")
+        # 第一个是批准的基因符号，其余是别名
+        self.add(f"MIM:{phenotype_mim}" if phenotype_mim else f"NAME:{name.lower()}", name=name,
+                 mim=phenotype_mim or "", genes=genes[:1], locations=_split(row.get("Cyto Location", "")), source="OMIM")
+
+    def _mim_title(self, row: Dict[str, str]):
+        # 只导入表型条目（#、%和无前缀），基因条目（*、+）不是疾病
+        if row.get("Prefix", "") in ("Asterisk", "Plus", "Caret"):
+            return
+        mim = row["MIM Number"]
+        titles = [t.split(";")[0].strip() for t in _split(row.get("Alternative Title(s); symbol(s)", ""), r";;")]
+        titles += [t.split(";")[0].strip() for t in _split(row.get("Included Title(s); symbols", ""), r";;")]
+        self.add(f"MIM:{mim}", name=row["Preferred Title; symbol"].split(";")[0].strip(), mim=mim, synonyms=titles, source="OMIM")
+
+    def _medgen(self, row: Dict[str, str]):
+        mim = row.get("DiseaseMIM", "").strip()
+        if mim == "-":
+            mim = ""
+        key = f"MIM:{mim}" if mim else f"CUI:{row.get('ConceptID', '')}"
+        self.add(key, name=row["DiseaseName"], mim=mim, concept_id=row.get("ConceptID", ""),
+                 genes=_split(row.get("AssociatedGenes", "")), source=row.get("SourceName", "MedGen"))
+
+    def _generic(self, row: Dict[str, str]):
+        name = row["disease"].strip()
+        self.add(f"NAME:{name.lower()}", name=name, synonyms=_split(row.get("synonyms", "")),
+                 genes=_split(row.get("genes", "")), locations=_split(row.get("location", "")), source="local")
+
+def build_index(paths: List[str], path: str) -> int:
+    """导入疾病表生成索引，返回疾病条目数；先写入临时文件，完成后原子替换"""
+    collector = _Collector()
+    for table in paths:
+        collector.import_file(table)
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""
+        CREATE TABLE diseases (
+            id INTEGER PRIMARY KEY,
+            mim TEXT,
+            concept_id TEXT,
+            name TEXT,
+            synonyms TEXT,
+            genes TEXT,
+            locations TEXT,
+            sources TEXT
+        )
+    """)
+    # 外部内容FTS表：只保存倒排索引，文本从diseases表读取；porter词干化使"cancers"也能匹配"cancer"
+    conn.execute("""
+        CREATE VIRTUAL TABLE disease_fts USING fts5(
+            name, synonyms, content='diseases', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+        )
+    """)
+    rows = [
+        (i, d["mim"], d["concept_id"], d["name"], "|".join(d["synonyms"]), "|".join(d["genes"]),
+         "|".join(d["locations"]), "|".join(d["sources"]))
+        for i, d in enumerate(collector.diseases.values(), start=1) if d["name"]
+    ]
+    conn.executemany("INSERT INTO diseases VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("INSERT INTO disease_fts(disease_fts) VALUES ('rebuild')")
+    conn.execute("CREATE INDEX idx_diseases_mim ON diseases(mim)")
+    conn.commit()
+    conn.execute("INSERT INTO disease_fts(disease_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, path)
+    logger.info(f"疾病索引导入完成: {len(rows)} 个疾病 -> {path}")
+    return len(rows)
+
+def fts_query(text: str) -> Optional[str]:
+    """把自然语言/E-utilities检索式转换为FTS5查询：去掉字段标签和停用词，各词都需匹配"""
+    text = re.sub(r"\[[^\]]*\]", " ", text)
+    words = [w for w in re.findall(r"\w+", text.lower()) if w not in STOPWORDS]
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words)
+
+class DiseaseIndex:
+    """只读的本地疾病索引"""
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按BM25相关度检索，名称匹配的权重高于同义词"""
+        query = fts_query(text)
+        if query is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT d.id, d.mim, d.concept_id, d.name, d.synonyms, d.genes, d.locations, d.sources
+                FROM disease_fts JOIN diseases d ON d.id = disease_fts.rowid
+                WHERE disease_fts MATCH ?
+                ORDER BY bm25(disease_fts, 10.0, 3.0)
+                LIMIT ?
+            """, (query, limit)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def lookup_mim(self, mim: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT id, mim, concept_id, name, synonyms, genes, locations, sources FROM diseases WHERE mim = ?
+            """, (mim,)).fetchone()
+        return self._record(row) if row else None
+
+    def _record(self, row) -> Dict[str, Any]:
+        disease_id, mim, concept_id, name, synonyms, genes, locations, sources = row
+        return {
+            "kind": "disease",
+            "uid": mim or concept_id or str(disease_id),
+            "mim": mim,
+            "concept_id": concept_id,
+            "name": name,
+            "synonyms": _split(synonyms, r"\|"),
+            "genes": _split(genes, r"\|"),
+            "locations": _split(locations, r"\|"),
+            "sources": _split(sources, r"\|"),
+        }
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_disease_index() -> Optional[DiseaseIndex]:
+    """获取本地疾病索引，索引文件不存在或设置 DISEASE_INDEX=0 时返回None"""
+    global _index
+    if os.getenv("DISEASE_INDEX", "1") == "0":
+        return None
+    if _index is None:
+        path = os.getenv("DISEASE_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "disease_index.sqlite3"))
+        if not os.path.exists(path):
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = DiseaseIndex(path)
+    return _index
+
+def main():
+    parser = argparse.ArgumentParser(description="Import OMIM/MedGen disease tables into the local disease index")
+    parser.add_argument("tables", nargs="+", help="morbidmap.txt, mimTitles.txt, gene_condition_source_id or generic TSV files")
+    parser.add_argument("--output", default=os.getenv("DISEASE_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "disease_index.sqlite3")))
+    args = parser.parse_args()
+    count = build_index(args.tables, args.output)
+    print(f"Imported {count} diseases into {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+from urllib.parse import urlparse
+
+# NCBI服务地址，可通过环境变量指向本地mock服务（见 mock_ncbi/）
+# 每次调用时读取，便于在进程启动后（如 load_dotenv 之后）修改
+DEFAULT_EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+DEFAULT_BLAST_BASE_URL = "https://blast.ncbi.nlm.nih.gov/blast/Blast.cgi"
+
+def eutils_base_url() -> str:
+    return os.getenv("EUTILS_BASE_URL", DEFAULT_EUTILS_BASE_URL).rstrip("/")
+
+def blast_base_url() -> str:
+    return os.getenv("BLAST_BASE_URL", DEFAULT_BLAST_BASE_URL)
+
+def eutils_url(method: str) -> str:
+    """E-utilities接口地址，如 eutils_url("esearch")"""
+    return f"{eutils_base_url()}/{method}.fcgi"
+
+def eutils_host() -> str:
+    return urlparse(eutils_base_url()).hostname
+
+def blast_host() -> str:
+    return urlparse(blast_base_url()).hostname
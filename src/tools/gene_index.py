@@ -0,0 +1,211 @@
+"""
+本地基因索引：把NCBI的gene_info / gene2ensembl制表符文件导入SQLite，
+按基因符号、别名、Ensembl ID和LOC ID查询，命中时不再访问E-utilities
+
+导入（支持.gz）：
+
+    python -m src.tools.gene_index gene_info.gz --gene2ensembl gene2ensembl.gz --tax-id 9606
+"""
+import os
+import csv
+import gzip
+import sqlite3
+import argparse
+import threading
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# 查询键的类型，数值越小越优先
+SYMBOL, SYNONYM, ENSEMBL, LOCUS = 0, 1, 2, 3
+
+# 常见物种的名称，其余显示为taxid
+TAXON_NAMES = {
+    9606: "Homo sapiens",
+    10090: "Mus musculus",
+    10116: "Rattus norvegicus",
+    7955: "Danio rerio",
+    7227: "Drosophila melanogaster",
+    6239: "Caenorhabditis elegans",
+    559292: "Saccharomyces cerevisiae S288C",
+}
+HUMAN_TAX_ID = 9606
+
+def _open_tsv(path: str) -> Iterator[Dict[str, str]]:
+    """读取NCBI的制表符文件，表头以#开头"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        header = f.readline().lstrip("#").rstrip("\n").split("\t")
+        for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            yield dict(zip(header, row))
+
+def _values(value: str, sep: str = "|") -> List[str]:
+    # NCBI用"-"表示空值
+    if not value or value == "-":
+        return []
+    return [v for v in value.split(sep) if v and v != "-"]
+
+def build_index(gene_info: str, path: str, gene2ensembl: Optional[str] = None,
+                tax_ids: Optional[List[int]] = None, batch_size: int = 50000) -> int:
+    """
+    导入gene_info（以及可选的gene2ensembl），生成索引文件，返回导入的基因数
+    先写入临时文件，完成后原子替换，导入过程中旧索引仍可查询
+    """
+    tax_filter = set(tax_ids) if tax_ids else None
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    # 一次性批量导入，不需要日志和同步
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""
+        CREATE TABLE genes (
+            gene_id INTEGER PRIMARY KEY,
+            tax_id INTEGER,
+            symbol TEXT,
+            name TEXT,
+            synonyms TEXT,
+            chromosome TEXT,
+            map_location TEXT,
+            type_of_gene TEXT,
+            ensembl TEXT,
+            mim TEXT
+        )
+    """)
+    conn.execute("CREATE TABLE lookup (key TEXT, kind INTEGER, gene_id INTEGER)")
+
+    ensembl_ids: Dict[int, List[str]] = {}
+    if gene2ensembl:
+        for row in _open_tsv(gene2ensembl):
+            tax_id, gene_id = int(row["tax_id"]), int(row["GeneID"])
+            if tax_filter and tax_id not in tax_filter:
+                continue
+            ids = ensembl_ids.setdefault(gene_id, [])
+            ensembl = row.get("Ensembl_gene_identifier", "").split(".")[0]
+            if ensembl and ensembl not in ids:
+                ids.append(ensembl)
+
+    count = 0
+    genes, keys = [], []
+    for row in _open_tsv(gene_info):
+        tax_id, gene_id = int(row["tax_id"]), int(row["GeneID"])
+        if tax_filter and tax_id not in tax_filter:
+            continue
+        xrefs = _values(row.get("dbXrefs", ""))
+        ensembl = list(ensembl_ids.get(gene_id, []))
+        ensembl += [x.split(":", 1)[1] for x in xrefs if x.startswith("Ensembl:") and x.split(":", 1)[1] not in ensembl]
+        mim = [x.split(":", 1)[1] for x in xrefs if x.startswith("MIM:")]
+        synonyms = _values(row.get("Synonyms", ""))
+        symbol = row["Symbol"]
+        genes.append((
+            gene_id, tax_id, symbol, row.get("description", ""), "|".join(synonyms),
+            row.get("chromosome", ""), row.get("map_location", ""), row.get("type_of_gene", ""),
+            "|".join(ensembl), "|".join(mim),
+        ))
+        keys.append((symbol.upper(), SYMBOL, gene_id))
+        keys += [(s.upper(), SYNONYM, gene_id) for s in synonyms]
+        keys += [(e.upper(), ENSEMBL, gene_id) for e in ensembl]
+        keys.append((f"LOC{gene_id}", LOCUS, gene_id))
+        count += 1
+        if len(genes) >= batch_size:
+            conn.executemany("INSERT OR REPLACE INTO genes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", genes)
+            conn.executemany("INSERT INTO lookup VALUES (?, ?, ?)", keys)
+            genes, keys = [], []
+    conn.executemany("INSERT OR REPLACE INTO genes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", genes)
+    conn.executemany("INSERT INTO lookup VALUES (?, ?, ?)", keys)
+    # 数据导入完成后再建索引，比逐行维护索引快得多
+    conn.execute("CREATE INDEX idx_lookup_key ON lookup(key)")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_path, path)
+    logger.info(f"基因索引导入完成: {count} 个基因 -> {path}")
+    return count
+
+class GeneIndex:
+    """只读的本地基因索引"""
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def lookup(self, term: str, limit: int = 5, organism: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按符号、别名、Ensembl ID或LOC ID精确查询（不区分大小写）
+        返回与eutils_agent.parser一致的gene记录，符号匹配优先，同等条件下人类基因优先
+        organism: 物种学名，在查询中过滤（先过滤再取limit条）；不在TAXON_NAMES中的物种返回空列表
+        """
+        key = term.strip().upper()
+        if key.startswith("ENS"):
+            key = key.split(".")[0]
+        tax_filter, args = "", [key]
+        if organism:
+            tax_ids = [tax_id for tax_id, name in TAXON_NAMES.items() if name.lower() == organism.strip().lower()]
+            if not tax_ids:
+                return []
+            tax_filter = f"AND g.tax_id IN ({','.join('?' * len(tax_ids))})"
+            args += tax_ids
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT g.gene_id, g.tax_id, g.symbol, g.name, g.synonyms, g.chromosome,
+                       g.map_location, g.type_of_gene, g.ensembl, g.mim, MIN(l.kind) AS kind
+                FROM lookup l JOIN genes g ON g.gene_id = l.gene_id
+                WHERE l.key = ? {tax_filter}
+                GROUP BY g.gene_id
+                ORDER BY kind, g.tax_id != ?, g.gene_id
+                LIMIT ?
+            """, (*args, HUMAN_TAX_ID, limit)).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _record(self, row) -> Dict[str, Any]:
+        gene_id, tax_id, symbol, name, synonyms, chromosome, map_location, type_of_gene, ensembl, mim, _ = row
+        return {
+            "kind": "gene",
+            "uid": str(gene_id),
+            "symbol": symbol,
+            "name": name,
+            "organism": TAXON_NAMES.get(tax_id, f"taxid {tax_id}"),
+            "aliases": _values(synonyms),
+            "chromosome": chromosome,
+            "map_location": map_location,
+            "annotation": "",
+            "mim": _values(mim),
+            "gene_type": type_of_gene,
+            "ensembl": _values(ensembl),
+        }
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_gene_index() -> Optional[GeneIndex]:
+    """获取本地基因索引，索引文件不存在或设置 GENE_INDEX=0 时返回None"""
+    global _index
+    if os.getenv("GENE_INDEX", "1") == "0":
+        return None
+    if _index is None:
+        path = os.getenv("GENE_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "gene_index.sqlite3"))
+        if not os.path.exists(path):
+            return None
+        with _index_lock:
+            if _index is None:
+                _index = GeneIndex(path)
+    return _index
+
+def main():
+    parser = argparse.ArgumentParser(description="Import NCBI gene_info into the local gene index")
+    parser.add_argument("gene_info", help="gene_info(.gz) file")
+    parser.add_argument("--gene2ensembl", help="gene2ensembl(.gz) file")
+    parser.add_argument("--tax-id", type=int, action="append", help="only import these taxa (repeatable)")
+    parser.add_argument("--output", default=os.getenv("GENE_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "gene_index.sqlite3")))
+    args = parser.parse_args()
+    count = build_index(args.gene_info, args.output, args.gene2ensembl, args.tax_id)
+    print(f"Imported {count} genes into {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import asyncio
+import weakref
+import threading
+import logging
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+# 连接池配置：pool_connections 为缓存的 host 连接池数量，pool_maxsize 为每个 host 保持的 keep-alive 连接数
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+
+_session = None
+_session_lock = threading.Lock()
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    # 每个 host 一个 urllib3 连接池，池本身是线程安全的，连接在请求间复用（keep-alive）
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": os.getenv("USER_AGENT", "OpenBioLLM-RAG/1.0"),
+        "Connection": "keep-alive",
+        # 协商压缩传输，响应体在流式读取时自动解压
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+def get_session() -> requests.Session:
+    """获取进程内共享的 HTTP 会话（按 host 复用连接池）"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session()
+                logger.info(f"创建共享HTTP会话: pool_connections={POOL_CONNECTIONS}, pool_maxsize={POOL_MAXSIZE}")
+    return _session
+
+def close_session():
+    """关闭共享会话，释放所有 keep-alive 连接"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+# 异步客户端与事件循环绑定，按事件循环各自维护一个
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步 HTTP 客户端（同样按 host 复用 keep-alive 连接）"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers={"User-Agent": os.getenv("USER_AGENT", "OpenBioLLM-RAG/1.0"), "Accept-Encoding": "gzip, deflate"},
+            limits=httpx.Limits(max_connections=POOL_CONNECTIONS * POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+            timeout=None,
+        )
+        _async_clients[loop] = client
+    return client
+
+async def aclose_async_client():
+    """关闭当前事件循环的异步客户端"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,34 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# 问题中可以直接确定查询参数的标识符
+RSID_PATTERN = re.compile(r"\brs\d+\b", re.I)
+ENSEMBL_GENE_PATTERN = re.compile(r"\bENS[A-Z]*G\d{11}(?:\.\d+)?\b")
+LOC_PATTERN = re.compile(r"\bLOC\d+\b")
+# DNA序列：足够长的A/C/G/T/N连续片段，避免误匹配普通单词
+MIN_SEQUENCE_LENGTH = 30
+SEQUENCE_PATTERN = re.compile(rf"(?<![A-Za-z])[ACGTNacgtn]{{{MIN_SEQUENCE_LENGTH},}}(?![A-Za-z])")
+
+def _unique(matches: List[str]) -> List[str]:
+    return list(dict.fromkeys(matches))
+
+def extract_eutils_params(question: str) -> Optional[Dict[str, Any]]:
+    """
+    从问题中识别唯一的rsID、Ensembl基因ID或LOC ID，直接生成esearch参数
+    没有匹配或存在多个不同标识符（需要LLM判断）时返回None
+    """
+    rsids = _unique([m.lower() for m in RSID_PATTERN.findall(question)])
+    gene_ids = _unique(ENSEMBL_GENE_PATTERN.findall(question) + LOC_PATTERN.findall(question))
+    if len(rsids) + len(gene_ids) != 1:
+        return None
+    if rsids:
+        return {"db": "snp", "term": rsids[0], "retmax": 10}
+    # Ensembl ID的版本号不参与检索
+    return {"db": "gene", "term": gene_ids[0].split(".")[0], "retmax": 5}
+
+def extract_sequence(question: str) -> Optional[str]:
+    """从问题中提取唯一的DNA序列，没有或有多条不同序列时返回None"""
+    sequences = _unique([m.upper() for m in SEQUENCE_PATTERN.findall(question)])
+    if len(sequences) != 1:
+        return None
+    return sequences[0]
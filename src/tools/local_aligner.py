@@ -0,0 +1,342 @@
+"""
+本地短序列比对：在参考基因组FASTA上建立minimizer索引，把100-150bp的查询序列定位到染色体坐标
+
+索引内容（.npy文件，内存映射打开）：
+- packed: 2-bit压缩的参考序列（每字节4个碱基，N按A存储，另记N区间）
+- n_starts / n_ends: N区间
+- contig_offsets: 各序列在拼接坐标中的起点
+- mm_hash / mm_pos: 按哈希排序的(w,k)-minimizer，位置最低位记录取的是正链还是反向互补链
+
+比对：查询序列的minimizer向量化查表得到种子，按(链, 对角线)聚类，
+对候选区域做半全局编辑距离比对（numpy逐行计算），给出染色体坐标和一致性
+
+    python -m src.tools.local_aligner build GRCh38.fa.gz --output cache/ref_index
+    python -m src.tools.local_aligner align ACGT...
+"""
+import os
+import re
+import json
+import gzip
+import argparse
+import threading
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .snp_index import REFSEQ_CHROMOSOMES
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+DEFAULT_K = 15  # 奇数k保证k-mer与其反向互补不同
+DEFAULT_W = 10
+# 出现次数超过该值的minimizer（重复序列）不作为种子
+MAX_OCCURRENCES = int(os.getenv("LOCAL_ALIGN_MAX_OCC", "500"))
+MAX_CANDIDATES = 5
+DIAGONAL_BIN = 32
+# 建索引时每次处理的碱基数
+CHUNK_SIZE = 1 << 24
+
+ARRAYS = ("packed", "n_starts", "n_ends", "contig_offsets", "mm_hash", "mm_pos")
+N_CODE = 4
+ENCODE = np.full(256, N_CODE, dtype=np.uint8)
+for _i, _base in enumerate(b"ACGT"):
+    ENCODE[_base] = _i
+    ENCODE[ord(chr(_base).lower())] = _i
+
+def encode(sequence: str) -> np.ndarray:
+    """碱基编码为A0 C1 G2 T3，其他字符为N(4)"""
+    return ENCODE[np.frombuffer(sequence.encode("ascii", errors="replace"), dtype=np.uint8)]
+
+def reverse_complement_codes(codes: np.ndarray) -> np.ndarray:
+    rc = np.where(codes == N_CODE, N_CODE, 3 - codes.astype(np.int16)).astype(np.uint8)
+    return rc[::-1].copy()
+
+def _hash64(key: np.ndarray, mask: np.uint64) -> np.ndarray:
+    """可逆整数哈希（与minimap2相同），打散k-mer值，避免低复杂度序列集中在最小值"""
+    key = (~key + (key << np.uint64(21))) & mask
+    key = key ^ (key >> np.uint64(24))
+    key = (key + (key << np.uint64(3)) + (key << np.uint64(8))) & mask
+    key = key ^ (key >> np.uint64(14))
+    key = (key + (key << np.uint64(2)) + (key << np.uint64(4))) & mask
+    key = key ^ (key >> np.uint64(28))
+    key = (key + (key << np.uint64(31))) & mask
+    return key
+
+def minimizers(codes: np.ndarray, k: int, w: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算(w,k)-minimizer：每w个连续k-mer中哈希最小的一个（k-mer取正链与反向互补中较小者）
+    返回(哈希, 位置, 链)，含N的k-mer被跳过
+    """
+    n = len(codes) - k + 1
+    if n < 1:
+        empty = np.zeros(0, dtype=np.uint64)
+        return empty, empty, np.zeros(0, dtype=np.uint8)
+    fwd = np.zeros(n, dtype=np.uint64)
+    rev = np.zeros(n, dtype=np.uint64)
+    has_n = np.zeros(n, dtype=bool)
+    values = codes.astype(np.uint64)
+    for j in range(k):
+        window = values[j:j + n]
+        has_n |= codes[j:j + n] == N_CODE
+        fwd = (fwd << np.uint64(2)) | (window & np.uint64(3))
+        rev |= (np.uint64(3) - (window & np.uint64(3))) << np.uint64(2 * j)
+    strand = (rev < fwd).astype(np.uint8)
+    mask = np.uint64((1 << (2 * k)) - 1)
+    invalid = np.iinfo(np.uint64).max
+    hashes = np.where(has_n, invalid, _hash64(np.minimum(fwd, rev), mask))
+    if n <= w:
+        positions = np.array([int(np.argmin(hashes))])
+    else:
+        positions = np.unique(sliding_window_view(hashes, w).argmin(axis=1) + np.arange(n - w + 1))
+    positions = positions[hashes[positions] != invalid]
+    return hashes[positions], positions.astype(np.uint64), strand[positions]
+
+def _read_fasta(path: str) -> Iterator[Tuple[str, str, str]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        name, description, chunks = None, "", []
+        for line in f:
+            if line.startswith(">"):
+                if name is not None:
+                    yield name, description, "".join(chunks)
+                header = line[1:].strip()
+                name, _, description = header.partition(" ")
+                chunks = []
+            else:
+                chunks.append(line.strip())
+        if name is not None:
+            yield name, description, "".join(chunks)
+
+def build_index(fasta: str, path: str, k: int = DEFAULT_K, w: int = DEFAULT_W) -> int:
+    """建立索引，返回参考序列总长度"""
+    os.makedirs(path, exist_ok=True)
+    contigs, offsets = [], []
+    packed_parts, n_starts, n_ends = [], [], []
+    mm_hashes, mm_positions = [], []
+    total = 0
+    carry = np.zeros(0, dtype=np.uint8)
+    for name, description, sequence in _read_fasta(fasta):
+        codes = encode(sequence)
+        contigs.append({"name": name, "description": description, "length": len(codes)})
+        offsets.append(total)
+        # N区间
+        is_n = np.concatenate([[False], codes == N_CODE, [False]])
+        edges = np.flatnonzero(is_n[1:] != is_n[:-1])
+        n_starts.append(edges[0::2] + total)
+        n_ends.append(edges[1::2] + total)
+        # 分块计算minimizer，块之间重叠 w+k-1 个碱基，重复的位置最后去重
+        for start in range(0, max(len(codes) - k + 1, 1), CHUNK_SIZE):
+            chunk = codes[start:start + CHUNK_SIZE + w + k - 1]
+            hashes, positions, strands = minimizers(chunk, k, w)
+            mm_hashes.append(hashes)
+            mm_positions.append(((positions + np.uint64(start + total)) << np.uint64(1)) | strands.astype(np.uint64))
+        # 2-bit压缩：拼接坐标跨序列连续，不足4个碱基的部分留到下一条序列
+        codes = np.concatenate([carry, np.where(codes == N_CODE, 0, codes).astype(np.uint8)])
+        usable = len(codes) // 4 * 4
+        packed_parts.append(_pack(codes[:usable]))
+        carry = codes[usable:]
+        total += len(sequence)
+    if len(carry):
+        packed_parts.append(_pack(np.concatenate([carry, np.zeros(4 - len(carry), dtype=np.uint8)])))
+
+    mm_hash = np.concatenate(mm_hashes) if mm_hashes else np.zeros(0, dtype=np.uint64)
+    mm_pos = np.concatenate(mm_positions) if mm_positions else np.zeros(0, dtype=np.uint64)
+    # 按(哈希, 位置)排序并去掉块重叠造成的重复
+    order = np.lexsort((mm_pos, mm_hash))
+    mm_hash, mm_pos = mm_hash[order], mm_pos[order]
+    keep = np.ones(len(mm_hash), dtype=bool)
+    keep[1:] = (mm_hash[1:] != mm_hash[:-1]) | (mm_pos[1:] != mm_pos[:-1])
+    arrays = {
+        "packed": np.concatenate(packed_parts) if packed_parts else np.zeros(0, dtype=np.uint8),
+        "n_starts": np.concatenate(n_starts).astype(np.int64) if n_starts else np.zeros(0, dtype=np.int64),
+        "n_ends": np.concatenate(n_ends).astype(np.int64) if n_ends else np.zeros(0, dtype=np.int64),
+        "contig_offsets": np.array(offsets + [total], dtype=np.int64),
+        "mm_hash": mm_hash[keep],
+        "mm_pos": mm_pos[keep],
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"k": k, "w": w, "length": total, "source": os.path.basename(fasta), "contigs": contigs}, f)
+    logger.info(f"参考索引构建完成: {len(contigs)} 条序列, {total} bp, {int(keep.sum())} 个minimizer -> {path}")
+    return total
+
+def _pack(codes: np.ndarray) -> np.ndarray:
+    codes = codes.reshape(-1, 4)
+    return ((codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]).astype(np.uint8)
+
+def semiglobal_distance(query: np.ndarray, ref: np.ndarray) -> Tuple[int, int]:
+    """
+    半全局编辑距离：查询序列全长参与比对，参考序列两端不计罚分
+    逐行计算，行内的插入依赖用 minimum.accumulate 向量化；返回(最小距离, 比对在参考上的终点)
+    """
+    columns = np.arange(len(ref) + 1)
+    prev = np.zeros(len(ref) + 1, dtype=np.int32)
+    for i, base in enumerate(query, start=1):
+        mismatch = (ref != base) | (ref == N_CODE) | (base == N_CODE)
+        row = np.empty(len(ref) + 1, dtype=np.int32)
+        row[0] = i
+        row[1:] = np.minimum(prev[:-1] + mismatch, prev[1:] + 1)
+        prev = np.minimum.accumulate(row - columns) + columns
+    end = int(np.argmin(prev))
+    return int(prev[end]), end
+
+def chromosome_label(name: str, description: str) -> str:
+    """序列名转为chrN形式：UCSC命名直接使用，RefSeq序列号或描述中的"chromosome N"转换"""
+    if name.lower().startswith("chr"):
+        return name
+    if name.startswith("NC_") and name.split(".")[0] in REFSEQ_CHROMOSOMES:
+        return f"chr{REFSEQ_CHROMOSOMES[name.split('.')[0]]}"
+    match = re.search(r"chromosome (\w+)", description)
+    return f"chr{match.group(1)}" if match else name
+
+class LocalAligner:
+    """内存映射的只读参考索引"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.k, self.w = self.meta["k"], self.meta["w"]
+        self.contigs = self.meta["contigs"]
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    def _region(self, start: int, end: int) -> np.ndarray:
+        """取出拼接坐标[start, end)的碱基编码，N区间还原为N"""
+        first, last = start // 4, (end + 3) // 4
+        packed = np.asarray(self.packed[first:last])
+        codes = ((packed[:, None] >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3).reshape(-1)
+        codes = codes[start - first * 4:end - first * 4].copy()
+        lo = np.searchsorted(self.n_ends, start, side="right")
+        hi = np.searchsorted(self.n_starts, end, side="left")
+        for n_start, n_end in zip(self.n_starts[lo:hi], self.n_ends[lo:hi]):
+            codes[max(n_start, start) - start:min(n_end, end) - start] = N_CODE
+        return codes
+
+    def _seeds(self, query: np.ndarray):
+        """查询minimizer查表，返回每个种子的(相对链, 对角线)"""
+        hashes, positions, strands = minimizers(query, self.k, self.w)
+        lo = np.searchsorted(self.mm_hash, hashes, side="left")
+        hi = np.searchsorted(self.mm_hash, hashes, side="right")
+        counts = hi - lo
+        usable = (counts > 0) & (counts <= MAX_OCCURRENCES)
+        lo, counts = lo[usable], counts[usable]
+        positions, strands = positions[usable].astype(np.int64), strands[usable]
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        # 展开每个查询minimizer命中的所有参考位置
+        owner = np.repeat(np.arange(len(counts)), counts)
+        index = np.repeat(lo - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + np.arange(total)
+        ref = np.asarray(self.mm_pos[index])
+        ref_pos = (ref >> np.uint64(1)).astype(np.int64)
+        relative = (ref & np.uint64(1)).astype(np.int64) ^ strands[owner].astype(np.int64)
+        query_pos = np.where(relative == 0, positions[owner], len(query) - positions[owner] - self.k)
+        return relative, ref_pos - query_pos
+
+    def align(self, sequence: str, max_hits: int = 3) -> List[Dict[str, Any]]:
+        """返回按一致性排序的比对结果"""
+        query = encode(re.sub(r"\s+", "", sequence))
+        if len(query) < self.k + self.w:
+            return []
+        relative, diagonals = self._seeds(query)
+        if len(diagonals) == 0:
+            return []
+        # 按(链, 对角线分箱)聚类，种子最多的几个区域做精确比对
+        keys = relative * (1 << 40) + (diagonals // DIAGONAL_BIN)
+        clusters, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        hits, seen = [], set()
+        query_rc = reverse_complement_codes(query)
+        for cluster in np.argsort(-counts, kind="stable")[:MAX_CANDIDATES]:
+            members = inverse == cluster
+            strand = int(relative[members][0])
+            diagonal = int(np.median(diagonals[members]))
+            hit = self._extend(query if strand == 0 else query_rc, strand, diagonal, int(counts[cluster]))
+            if hit is not None and (hit["contig"], hit["start"], hit["strand"]) not in seen:
+                seen.add((hit["contig"], hit["start"], hit["strand"]))
+                hits.append(hit)
+        hits.sort(key=lambda hit: (-hit["identity"], -hit["seeds"]))
+        return hits[:max_hits]
+
+    def _extend(self, query: np.ndarray, strand: int, diagonal: int, seeds: int) -> Optional[Dict[str, Any]]:
+        contig = int(np.searchsorted(self.contig_offsets, diagonal + len(query) // 2, side="right")) - 1
+        if contig < 0 or contig >= len(self.contigs):
+            return None
+        contig_start, contig_end = int(self.contig_offsets[contig]), int(self.contig_offsets[contig + 1])
+        pad = max(16, len(query) // 10)
+        start, end = max(contig_start, diagonal - pad), min(contig_end, diagonal + len(query) + pad)
+        if end - start < len(query) // 2:
+            return None
+        ref = self._region(start, end)
+        distance, ref_end = semiglobal_distance(query, ref)
+        # 反向再算一次得到比对起点
+        _, reverse_end = semiglobal_distance(query[::-1], ref[:ref_end][::-1])
+        ref_start = ref_end - reverse_end
+        span = max(len(query), ref_end - ref_start)
+        info = self.contigs[contig]
+        return {
+            "contig": info["name"],
+            "description": info["description"],
+            "chromosome": chromosome_label(info["name"], info["description"]),
+            # 1-based闭区间坐标
+            "start": start + ref_start - contig_start + 1,
+            "end": start + ref_end - contig_start,
+            "strand": "plus" if strand == 0 else "minus",
+            "identity": (span - distance) / span,
+            "edit_distance": distance,
+            "query_length": len(query),
+            "seeds": seeds,
+        }
+
+def render_hits(hits: List[Dict[str, Any]], source: str) -> str:
+    lines = [f"Local alignment against {source}", f"Query length: {hits[0]['query_length']}" if hits else "No hits found"]
+    for i, hit in enumerate(hits, 1):
+        lines.append(
+            f"{i}. {hit['contig']} {hit['description']} | {hit['chromosome']}:{hit['start']}-{hit['end']} | strand {hit['strand']}"
+            f" | identity {hit['identity'] * 100:.1f}% | edits {hit['edit_distance']} | seeds {hit['seeds']}"
+        )
+    return "\n".join(lines)
+
+_aligner = None
+_aligner_lock = threading.Lock()
+
+def get_local_aligner() -> Optional[LocalAligner]:
+    """获取本地参考索引，索引不存在或设置 LOCAL_ALIGN=0 时返回None"""
+    global _aligner
+    if os.getenv("LOCAL_ALIGN", "1") == "0":
+        return None
+    if _aligner is None:
+        path = os.getenv("LOCAL_ALIGN_INDEX", os.path.join(ROOT_DIR, "cache", "ref_index"))
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        with _aligner_lock:
+            if _aligner is None:
+                _aligner = LocalAligner(path)
+    return _aligner
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local minimizer alignment index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="index a reference FASTA (.gz allowed)")
+    build.add_argument("fasta")
+    build.add_argument("--output", default=os.getenv("LOCAL_ALIGN_INDEX", os.path.join(ROOT_DIR, "cache", "ref_index")))
+    build.add_argument("-k", type=int, default=DEFAULT_K)
+    build.add_argument("-w", type=int, default=DEFAULT_W)
+    align = subparsers.add_parser("align", help="align a DNA sequence against the index")
+    align.add_argument("sequence")
+    align.add_argument("--index", default=os.getenv("LOCAL_ALIGN_INDEX", os.path.join(ROOT_DIR, "cache", "ref_index")))
+    args = parser.parse_args()
+    if args.command == "build":
+        total = build_index(args.fasta, args.output, args.k, args.w)
+        print(f"Indexed {total} bp into {args.output}")
+    else:
+        aligner = LocalAligner(args.index)
+        print(render_hits(aligner.align(args.sequence), aligner.meta["source"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import re
+import hashlib
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+# 已使用参数的规范化键，以列表保存在state的metadata中（可JSON序列化），查重时转为集合
+# - esearch: db + 规范化的检索式（小写、合并空白）
+# - efetch/esummary: db + 排序去重后的ID列表（与method无关）
+# - BLAST: 序列哈希（去空白、大写），hitlist_size不参与
+
+def clean_sequence(sequence: str) -> str:
+    """序列规范化：去掉空白并转为大写（查重键与BLAST结果缓存键共用）"""
+    return re.sub(r"\s+", "", sequence).upper()
+
+def sequence_hash(sequence: str) -> str:
+    return hashlib.sha1(clean_sequence(sequence).encode("utf-8")).hexdigest()
+
+def eutils_key(params: Dict[str, Any]) -> str:
+    db = str(params.get("db", ""))
+    if "term" in params:
+        return f"esearch:{db}:{' '.join(str(params['term']).lower().split())}"
+    ids = sorted({i.strip() for i in str(params.get("id", "")).split(",") if i.strip()})
+    return f"fetch:{db}:{','.join(ids)}"
+
+def blast_key(params: Dict[str, Any]) -> str:
+    return f"blast:{sequence_hash(str(params.get('sequence', '')))}"
+
+def used_keys(metadata: Dict[str, Any], params_field: str, keys_field: str, key_func: Callable[[Dict[str, Any]], str]) -> Set[str]:
+    """
+    返回metadata中已使用参数的键集合（新建的集合，不修改metadata）
+    旧的state只有参数列表时，按列表重建
+    """
+    keys = metadata.get(keys_field)
+    if keys is None:
+        return {key_func(params) for params in metadata.get(params_field, [])}
+    return set(keys)
+
+def record_used(metadata: Dict[str, Any], used_params: List[Dict[str, Any]], params: Dict[str, Any],
+                params_field: str, keys_field: str, key_func: Callable[[Dict[str, Any]], str]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    记录使用过的参数，返回(metadata副本, 参数列表副本)
+    state中原有的metadata和列表保持不变，更新只通过节点返回的metadata生效
+    """
+    keys = used_keys(metadata, params_field, keys_field, key_func)
+    keys.add(key_func(params))
+    return {**metadata, keys_field: sorted(keys)}, used_params + [params]
+
+def _short(key: str, value: Any) -> str:
+    text = str(value)
+    if key == "sequence" and len(text) > 30:
+        return f"{text[:30]}...({len(text)} bp)"
+    if key == "id":
+        ids = text.split(",")
+        if len(ids) > 20:
+            return f"{','.join(ids[:20])}(+{len(ids) - 20} more)"
+    return text if len(text) <= 200 else text[:200] + "..."
+
+def render_used_params(used_params: List[Dict[str, Any]]) -> str:
+    """已使用参数的紧凑文本，每组参数一行"""
+    return "\n".join(
+        f"{i}. " + " ".join(f"{key}={_short(key, value)}" for key, value in params.items())
+        for i, params in enumerate(used_params, 1)
+    )
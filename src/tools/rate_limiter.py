@@ -0,0 +1,161 @@
+import os
+import json
+import asyncio
+import time
+import threading
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlparse
+from .endpoints import eutils_host, blast_host
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只能使用进程内限流
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+class TokenBucket:
+    """
+    进程内令牌桶（线程安全）
+    采用预约方式：每个请求预约一个令牌并返回需要等待的时间，
+    空闲时请求立即发出，并发突发时按速率依次排队
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def release(self):
+        """退回一个预约的令牌（预约后放弃发送请求时调用）"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """等待令牌；需要等待的时间超过max_wait时退回令牌并返回False"""
+        wait = self.reserve()
+        if max_wait is not None and wait > max_wait:
+            self.release()
+            return False
+        if wait > 0:
+            logger.info(f"限流等待 {wait:.2f} 秒")
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, max_wait: Optional[float] = None) -> bool:
+        wait = self.reserve()
+        if max_wait is not None and wait > max_wait:
+            self.release()
+            return False
+        if wait > 0:
+            logger.info(f"限流等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+        return True
+
+class FileTokenBucket(TokenBucket):
+    """
+    跨进程令牌桶：桶状态保存在本地文件中，通过 flock 互斥，
+    多个 worker 进程共享同一个 host 的速率配额
+    """
+    def __init__(self, rate: float, capacity: float, path: str):
+        super().__init__(rate, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def reserve(self) -> float:
+        # 线程锁让同进程的线程在内存中排队，不必都阻塞在 flock 上
+        with self._lock:
+            return self._reserve_file()
+
+    def release(self):
+        with self._lock:
+            self._update_file(1)
+
+    async def aacquire(self, max_wait: Optional[float] = None) -> bool:
+        # flock 是阻塞调用，放到线程池执行，不占用事件循环；
+        # 不取线程锁：每次打开文件都是独立的文件描述，flock 本身已保证互斥
+        wait = await asyncio.to_thread(self._reserve_file)
+        if max_wait is not None and wait > max_wait:
+            await asyncio.to_thread(self._update_file, 1)
+            return False
+        if wait > 0:
+            logger.info(f"限流等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+        return True
+
+    def _reserve_file(self) -> float:
+        """在 flock 保护下预约一个令牌，返回需要等待的秒数"""
+        tokens = self._update_file(-1)
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate
+
+    def _update_file(self, delta: int) -> float:
+        """在 flock 保护下补充令牌并加上delta（预约-1，退回+1），返回更新后的令牌数"""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except json.JSONDecodeError:
+                    state = {}
+                # 跨进程需要使用墙上时钟
+                now = time.time()
+                tokens = state.get("tokens", self.capacity)
+                updated = state.get("updated", now)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                tokens = min(self.capacity, tokens + delta)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return tokens
+
+def _host_rate(host: str) -> Optional[float]:
+    """返回 host 的限流速率（次/秒），None 表示不限流"""
+    # NCBI 的限流规则：无 API key 3 次/秒，有 API key 10 次/秒
+    if host in (eutils_host(), blast_host()):
+        default_rate = "10" if os.getenv("NCBI_API_KEY") else "3"
+        return float(os.getenv("NCBI_RATE_LIMIT", default_rate))
+    return None
+
+_limiters: Dict[str, Optional[TokenBucket]] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(url_or_host: str) -> Optional[TokenBucket]:
+    """按 host 获取共享的令牌桶，没有配置限流的 host 返回 None"""
+    host = urlparse(url_or_host).hostname if "://" in url_or_host else url_or_host
+    with _limiters_lock:
+        if host not in _limiters:
+            rate = _host_rate(host)
+            if rate is None:
+                _limiters[host] = None
+            else:
+                capacity = float(os.getenv("NCBI_RATE_BURST", "1"))
+                backend = os.getenv("NCBI_RATE_LIMIT_BACKEND", "memory")
+                if backend == "file" and fcntl is not None:
+                    state_dir = os.getenv("NCBI_RATE_LIMIT_DIR", "/tmp/openbio_ratelimit")
+                    _limiters[host] = FileTokenBucket(rate, capacity, os.path.join(state_dir, f"{host}.json"))
+                else:
+                    if backend == "file":
+                        logger.warning("当前平台不支持文件锁，退回到进程内限流")
+                    _limiters[host] = TokenBucket(rate, capacity)
+                logger.info(f"为 {host} 创建限流器: {rate} 次/秒, backend={backend}")
+        return _limiters[host]
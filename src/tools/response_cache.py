@@ -0,0 +1,160 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from typing import Optional, Dict
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# 各数据库的默认缓存时间（秒），可通过 EUTILS_CACHE_TTL_<DB> 覆盖
+DEFAULT_TTLS = {
+    "gene": 7 * 24 * 3600,
+    "snp": 30 * 24 * 3600,
+    "omim": 7 * 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+# 不参与缓存键的参数
+IGNORED_PARAMS = {"api_key", "tool", "email"}
+
+def normalize_url(url: str) -> str:
+    """
+    规范化URL作为缓存键：
+    参数按名称排序，去掉api_key等与结果无关的参数，id列表去重并按数值排序
+    """
+    parsed = urlparse(url.replace(' ', '+'))
+    params = []
+    for key, value in parse_qsl(parsed.query, keep_blank_values=True):
+        if key in IGNORED_PARAMS:
+            continue
+        if key == "id":
+            ids = {i.strip() for i in value.split(',') if i.strip()}
+            value = ','.join(sorted(ids, key=lambda i: (not i.isdigit(), int(i) if i.isdigit() else 0, i)))
+        elif key == "term":
+            value = ' '.join(value.split())
+        params.append((key, value))
+    params.sort()
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}?{urlencode(params)}"
+
+class ResponseCache:
+    """
+    基于SQLite的E-utilities响应缓存
+    - 以规范化URL为键
+    - 按数据库设置TTL
+    - 超过容量上限时按最近访问时间（LRU）淘汰
+    - 按字节上限截断读取的响应标记为不完整，只用于满足相同或更小上限的请求
+    """
+    def __init__(self, path: str, max_bytes: int, ttls: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls or dict(DEFAULT_TTLS)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL 模式允许多个 worker 进程同时读
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                db TEXT,
+                body BLOB,
+                size INTEGER,
+                expires_at REAL,
+                last_access REAL,
+                complete INTEGER DEFAULT 1
+            )
+        """)
+        # 兼容旧版本创建的缓存文件
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+        if "complete" not in columns:
+            self._conn.execute("ALTER TABLE responses ADD COLUMN complete INTEGER DEFAULT 1")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def _ttl(self, db: str) -> int:
+        env_ttl = os.getenv(f"EUTILS_CACHE_TTL_{db.upper()}")
+        if env_ttl:
+            return int(env_ttl)
+        return self.ttls.get(db, DEFAULT_TTL)
+
+    def get(self, url: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
+        """max_bytes 不为空时返回最多 max_bytes 字节"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT body, expires_at, complete FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            body, _, complete = row
+            # 不完整的条目只能满足不超过已缓存长度的请求
+            if not complete and (max_bytes is None or len(body) < max_bytes):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        logger.info(f"缓存命中: {key}")
+        return body if max_bytes is None else body[:max_bytes]
+
+    def set(self, url: str, body: bytes, complete: bool = True):
+        key = normalize_url(url)
+        db = dict(parse_qsl(urlparse(key).query)).get("db", "")
+        now = time.time()
+        with self._lock:
+            # 不完整的响应不覆盖已有的完整条目
+            self._conn.execute(
+                """INSERT INTO responses (key, db, body, size, expires_at, last_access, complete) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET body = excluded.body, size = excluded.size, expires_at = excluded.expires_at,
+                   last_access = excluded.last_access, complete = excluded.complete
+                   WHERE excluded.complete = 1 OR responses.complete = 0 OR responses.expires_at < excluded.last_access""",
+                (key, db, body, len(body), now + self._ttl(db), now, int(complete))
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """淘汰最久未访问的条目，直到总大小不超过上限"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.info(f"缓存淘汰 {len(evicted)} 条记录")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取共享的响应缓存，设置 EUTILS_CACHE=0 时禁用"""
+    global _cache
+    if os.getenv("EUTILS_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = os.getenv("EUTILS_CACHE_PATH", os.path.join(ROOT_DIR, "cache", "eutils.sqlite3"))
+                max_bytes = int(float(os.getenv("EUTILS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+                _cache = ResponseCache(path, max_bytes)
+    return _cache
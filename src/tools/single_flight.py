@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import logging
+from typing import Any, Callable, Awaitable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    合并相同的并发请求：同一个key已有请求在进行时，
+    后来的调用方等待该请求完成并共享结果，而不是重复发起上游调用
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """timeout: 等待进行中的相同请求的最长时间，超时抛出TimeoutError"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            logger.info(f"等待进行中的相同请求: {key}")
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight request: {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        do的异步版本，同一事件循环内的相同请求共享一个Task
+        共享的调用作为独立的Task运行，所有调用方（包括发起者）都通过shield等待：
+        任何一个调用方被取消（如客户端断开）都不会取消共享的请求，也不影响其他调用方
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        task = self._async_calls.get(loop_key)
+        if task is not None:
+            logger.info(f"等待进行中的相同请求: {key}")
+        else:
+            task = asyncio.ensure_future(fn())
+            self._async_calls[loop_key] = task
+            task.add_done_callback(lambda done: self._finish(loop_key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, loop_key, task: asyncio.Future):
+        if self._async_calls.get(loop_key) is task:
+            del self._async_calls[loop_key]
+        # 所有调用方都已取消时，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,301 @@
+"""
+本地dbSNP rsID索引：按rsID排序的uint64数组，加上并行的染色体、位置数组和基因ID偏移数组
+所有数组保存为.npy文件并以内存映射方式打开，加载只需毫秒级，多个工作进程共享同一份页缓存
+查询是对rsID数组的二分查找
+
+从dbSNP的VCF或JSON（refsnp JSON或扁平JSON行）提取文件增量构建（支持.gz/.bz2）：
+
+    python -m src.tools.snp_index dbsnp_chr16.vcf.gz refsnp-chr16.json.bz2
+
+同一rsID以后导入的数据为准
+"""
+import os
+import re
+import bz2
+import json
+import gzip
+import glob
+import argparse
+import threading
+import logging
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.ERROR)
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+
+# 染色体编码为uint8，0表示未知
+CHROMOSOMES = [""] + [str(i) for i in range(1, 23)] + ["X", "Y", "MT"]
+CHROMOSOME_CODES = {name: code for code, name in enumerate(CHROMOSOMES)}
+# RefSeq染色体序列号到染色体名（dbSNP的VCF使用NC_0000XX.YY作为CHROM）
+REFSEQ_CHROMOSOMES = {**{f"NC_{i:06d}": str(i) for i in range(1, 23)}, "NC_000023": "X", "NC_000024": "Y", "NC_012920": "MT"}
+
+ARRAYS = ("rsids", "chrom", "pos", "gene_offsets", "gene_ids")
+MANIFEST = "manifest.json"
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+def chromosome_code(name: str) -> int:
+    name = str(name or "")
+    if name.startswith("NC_"):
+        name = REFSEQ_CHROMOSOMES.get(name.split(".")[0], "")
+    name = re.sub(r"^chr", "", name, flags=re.I)
+    name = name.upper()
+    return CHROMOSOME_CODES.get("MT" if name == "M" else name, 0)
+
+# 解析得到的条目：(rsID数字, 染色体编码, 位置, [(基因ID, 基因符号)])
+Entry = Tuple[int, int, int, List[Tuple[int, str]]]
+
+def _parse_vcf(path: str) -> Iterator[Entry]:
+    with _open_text(path) as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t", 8)
+            if len(fields) < 8 or not fields[2].startswith("rs"):
+                continue
+            genes = []
+            geneinfo = re.search(r"(?:^|;)GENEINFO=([^;]+)", fields[7])
+            if geneinfo:
+                for item in geneinfo.group(1).split("|"):
+                    symbol, _, gene_id = item.partition(":")
+                    if gene_id.isdigit():
+                        genes.append((int(gene_id), symbol))
+            for rsid in fields[2].split(";"):
+                if rsid.startswith("rs") and rsid[2:].isdigit():
+                    yield int(rsid[2:]), chromosome_code(fields[0]), int(fields[1]), genes
+
+def _parse_refsnp(doc: Dict[str, Any]) -> Optional[Entry]:
+    """dbSNP refsnp JSON：取首选顶层位置（is_ptlp）和注释中的基因"""
+    snapshot = doc.get("primary_snapshot_data") or {}
+    chrom, pos = 0, 0
+    for placement in snapshot.get("placements_with_allele", []):
+        if not placement.get("is_ptlp"):
+            continue
+        alleles = placement.get("alleles") or []
+        if alleles:
+            spdi = alleles[0]["allele"].get("spdi", {})
+            chrom = chromosome_code(spdi.get("seq_id", placement.get("seq_id", "")))
+            # SPDI位置从0开始
+            pos = int(spdi.get("position", -1)) + 1
+        break
+    genes = {}
+    for annotation in snapshot.get("allele_annotations", []):
+        for assembly in annotation.get("assembly_annotation", []):
+            for gene in assembly.get("genes", []):
+                if gene.get("id"):
+                    genes[int(gene["id"])] = gene.get("locus", "")
+    return int(doc["refsnp_id"]), chrom, pos, list(genes.items())
+
+def _parse_flat(doc: Dict[str, Any]) -> Entry:
+    """扁平提取格式：{"rsid": "rs123", "chromosome": "16", "position": 67934506, "genes": [{"id": 5699, "symbol": "PSMB10"}]}"""
+    genes = []
+    for gene in doc.get("genes", []):
+        if isinstance(gene, dict):
+            genes.append((int(gene["id"]), gene.get("symbol", "")))
+        else:
+            genes.append((int(gene), ""))
+    return int(str(doc["rsid"]).lower().lstrip("rs")), chromosome_code(doc.get("chromosome", "")), int(doc.get("position") or 0), genes
+
+def _parse_json(path: str) -> Iterator[Entry]:
+    """每行一个JSON文档"""
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            doc = json.loads(line)
+            entry = _parse_refsnp(doc) if "refsnp_id" in doc else _parse_flat(doc)
+            if entry is not None:
+                yield entry
+
+def parse_extract(path: str) -> Iterator[Entry]:
+    name = re.sub(r"\.(gz|bz2)$", "", path)
+    if name.endswith(".vcf"):
+        return _parse_vcf(path)
+    return _parse_json(path)
+
+class SNPIndex:
+    """内存映射的只读rsID索引"""
+    def __init__(self, path: str):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST)
+        self.loaded_at = os.path.getmtime(manifest_path)
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.generation = manifest["generation"]
+        arrays = {name: np.load(self._file(name), mmap_mode="r") for name in ARRAYS}
+        self.rsids, self.chrom, self.pos = arrays["rsids"], arrays["chrom"], arrays["pos"]
+        self.gene_offsets, self.gene_ids = arrays["gene_offsets"], arrays["gene_ids"]
+        with open(self._file("gene_symbols", "json"), encoding="utf-8") as f:
+            self.gene_symbols = json.load(f)
+
+    def _file(self, name: str, ext: str = "npy") -> str:
+        return os.path.join(self.path, f"{name}.{self.generation}.{ext}")
+
+    def __len__(self) -> int:
+        return len(self.rsids)
+
+    def find(self, rsid) -> Optional[int]:
+        """二分查找rsID（数字或"rs123"），返回行号"""
+        value = int(str(rsid).lower().lstrip("rs"))
+        i = int(np.searchsorted(self.rsids, value))
+        if i < len(self.rsids) and int(self.rsids[i]) == value:
+            return i
+        return None
+
+    def lookup(self, rsid) -> Optional[Dict[str, Any]]:
+        """返回与eutils_agent.parser一致的snp记录，未收录时返回None"""
+        i = self.find(rsid)
+        if i is None:
+            return None
+        gene_ids = self.gene_ids[self.gene_offsets[i]:self.gene_offsets[i + 1]]
+        position = int(self.pos[i])
+        return {
+            "kind": "snp",
+            "uid": str(int(self.rsids[i])),
+            "rsid": f"rs{int(self.rsids[i])}",
+            "genes": [self.gene_symbols.get(str(g)) or str(g) for g in gene_ids.tolist()],
+            "gene_ids": [str(g) for g in gene_ids.tolist()],
+            "chromosome": CHROMOSOMES[int(self.chrom[i])],
+            "position": str(position) if position else "",
+            "variant_class": "",
+            "function": [],
+            "clinical_significance": [],
+        }
+
+def _empty_arrays() -> Dict[str, np.ndarray]:
+    return {
+        "rsids": np.zeros(0, dtype=np.uint64), "chrom": np.zeros(0, dtype=np.uint8),
+        "pos": np.zeros(0, dtype=np.uint32), "gene_offsets": np.zeros(1, dtype=np.uint64),
+        "gene_ids": np.zeros(0, dtype=np.uint32),
+    }
+
+def _collect(paths: List[str], gene_symbols: Dict[str, str]):
+    """解析提取文件，用紧凑的array累积，避免为每个条目创建Python对象列表"""
+    rsids, chrom, pos, lengths, gene_ids = array("Q"), array("B"), array("I"), array("Q"), array("I")
+    for path in paths:
+        for rsid, chrom_code, position, genes in parse_extract(path):
+            rsids.append(rsid)
+            chrom.append(chrom_code)
+            pos.append(max(position, 0))
+            lengths.append(len(genes))
+            for gene_id, symbol in genes:
+                gene_ids.append(gene_id)
+                if symbol:
+                    gene_symbols[str(gene_id)] = symbol
+    lengths = np.frombuffer(lengths, dtype=np.uint64) if len(lengths) else np.zeros(0, dtype=np.uint64)
+    offsets = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(lengths, dtype=np.uint64)])
+    return {
+        "rsids": np.frombuffer(rsids, dtype=np.uint64) if len(rsids) else np.zeros(0, dtype=np.uint64),
+        "chrom": np.frombuffer(chrom, dtype=np.uint8) if len(chrom) else np.zeros(0, dtype=np.uint8),
+        "pos": np.frombuffer(pos, dtype=np.uint32) if len(pos) else np.zeros(0, dtype=np.uint32),
+        "gene_offsets": offsets,
+        "gene_ids": np.frombuffer(gene_ids, dtype=np.uint32) if len(gene_ids) else np.zeros(0, dtype=np.uint32),
+    }
+
+def _merge(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """合并两组数组并按rsID排序，重复的rsID保留后出现的（新导入的）条目"""
+    rsids = np.concatenate([old["rsids"], new["rsids"]])
+    chrom = np.concatenate([old["chrom"], new["chrom"]])
+    pos = np.concatenate([old["pos"], new["pos"]])
+    starts = np.concatenate([old["gene_offsets"][:-1], new["gene_offsets"][:-1] + len(old["gene_ids"])])
+    lengths = np.concatenate([np.diff(old["gene_offsets"]), np.diff(new["gene_offsets"])])
+    gene_ids = np.concatenate([old["gene_ids"], new["gene_ids"]])
+
+    # 稳定排序后，同一rsID的最后一条就是最新的条目
+    order = np.argsort(rsids, kind="stable")
+    sorted_rsids = rsids[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = sorted_rsids[:-1] != sorted_rsids[1:]
+    order = order[keep]
+
+    # 按选中的行重新收集基因ID
+    lengths = lengths[order]
+    offsets = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(lengths, dtype=np.uint64)])
+    total = int(offsets[-1])
+    shift = starts[order].astype(np.int64) - offsets[:-1].astype(np.int64)
+    gather = np.repeat(shift, lengths.astype(np.int64)) + np.arange(total, dtype=np.int64)
+    return {
+        "rsids": rsids[order],
+        "chrom": chrom[order],
+        "pos": pos[order],
+        "gene_offsets": offsets,
+        "gene_ids": gene_ids[gather],
+    }
+
+def build_index(paths: List[str], path: str, incremental: bool = True) -> int:
+    """
+    导入提取文件生成索引，返回索引中的rsID数量
+    incremental为True时与现有索引合并；新一代数组写完后替换manifest，
+    已打开旧索引的进程仍可继续读取旧文件
+    """
+    os.makedirs(path, exist_ok=True)
+    old, gene_symbols, generation = _empty_arrays(), {}, 0
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        index = SNPIndex(path)
+        generation = index.generation
+        if incremental:
+            old = {name: np.asarray(getattr(index, name)) for name in ARRAYS}
+            gene_symbols = dict(index.gene_symbols)
+    merged = _merge(old, _collect(paths, gene_symbols))
+
+    generation += 1
+    for name in ARRAYS:
+        np.save(os.path.join(path, f"{name}.{generation}.npy"), merged[name])
+    with open(os.path.join(path, f"gene_symbols.{generation}.json"), "w", encoding="utf-8") as f:
+        json.dump(gene_symbols, f)
+    tmp_manifest = os.path.join(path, f"{MANIFEST}.tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump({"generation": generation, "count": len(merged["rsids"])}, f)
+    os.replace(tmp_manifest, os.path.join(path, MANIFEST))
+
+    # 删除旧一代的文件（已映射的进程不受影响）
+    for old_file in glob.glob(os.path.join(path, "*.*.*")):
+        parts = os.path.basename(old_file).split(".")
+        if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) < generation:
+            os.remove(old_file)
+    logger.info(f"SNP索引构建完成: {len(merged['rsids'])} 个rsID -> {path}")
+    return len(merged["rsids"])
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_snp_index() -> Optional[SNPIndex]:
+    """获取本地SNP索引，索引不存在或设置 SNP_INDEX=0 时返回None；索引重建后自动重新映射"""
+    global _index
+    if os.getenv("SNP_INDEX", "1") == "0":
+        return None
+    path = os.getenv("SNP_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "snp_index"))
+    manifest = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest):
+        return None
+    with _index_lock:
+        if _index is None or _index.path != path or os.path.getmtime(manifest) > _index.loaded_at:
+            try:
+                _index = SNPIndex(path)
+            except (OSError, ValueError) as e:
+                # 重建过程中旧文件可能已被删除，继续使用已映射的索引
+                logger.error(f"加载SNP索引失败: {str(e)}")
+    return _index
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the local dbSNP rsID index")
+    parser.add_argument("extracts", nargs="+", help="VCF or JSON-lines dbSNP extracts (.gz/.bz2 allowed)")
+    parser.add_argument("--output", default=os.getenv("SNP_INDEX_PATH", os.path.join(ROOT_DIR, "cache", "snp_index")))
+    parser.add_argument("--rebuild", action="store_true", help="discard the existing index instead of merging into it")
+    args = parser.parse_args()
+    count = build_index(args.extracts, args.output, incremental=not args.rebuild)
+    print(f"Indexed {count} rsIDs in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import pytest
+
+from src.tools import blast_cache
+from src.tools.blast_cache import BlastCache, blast_cache_key, MINUS
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(blast_cache, "time", clock)
+    return clock
+
+def _key(sequence):
+    return blast_cache_key(sequence, "blastn", "nt", "on", 10)
+
+def test_rid_and_result_ttl(tmp_path, clock):
+    cache = BlastCache(str(tmp_path / "blast.sqlite3"), result_ttl=100, rid_ttl=10)
+    key, strand = _key("ACGTTGCA")
+    cache.set_rid(key, strand, "RID1")
+    assert cache.get(key) == {"rid": "RID1", "strand": strand, "body": None}
+    clock.now += 11
+    assert cache.get(key) is None
+
+    cache.set_rid(key, strand, "RID2")
+    # 旧RID的结果不会覆盖新RID的条目
+    cache.set_result(key, "RID1", b"stale")
+    assert cache.get(key)["body"] is None
+    cache.set_result(key, "RID2", b"<xml/>")
+    clock.now += 50
+    assert cache.get(key)["body"] == b"<xml/>"
+    clock.now += 51
+    assert cache.get(key) is None
+
+def test_reverse_complement_shares_entry():
+    key, strand = _key("AACCGGTTA")
+    rc_key, rc_strand = _key("taaccggtt")
+    assert key == rc_key and strand != rc_strand
+    assert MINUS in (strand, rc_strand)
+
+def test_least_recently_used_result_is_evicted(tmp_path, clock):
+    cache = BlastCache(str(tmp_path / "blast.sqlite3"), max_bytes=10)
+    keys = [_key(sequence)[0] for sequence in ("AAAA", "CCCA", "GGGA", "TTTC")]
+    for n, key in enumerate(keys[:3]):
+        clock.now += 1
+        cache.set_rid(key, "plus", f"RID{n}")
+        cache.set_result(key, f"RID{n}", b"x" * 4)
+    assert cache.get(keys[0]) is None
+    clock.now += 1
+    assert cache.get(keys[1])["body"] == b"xxxx"
+    clock.now += 1
+    cache.set_rid(keys[3], "plus", "RID3")
+    cache.set_result(keys[3], "RID3", b"x" * 4)
+    assert cache.get(keys[1])["body"] == b"xxxx"
+    assert cache.get(keys[2]) is None
+    assert cache.stats()["bytes"] <= 10
@@ -0,0 +1,77 @@
+import time
+
+from langchain_core.messages import HumanMessage
+
+from src.tools import cassette as cassette_module
+from src.tools import blast_scheduler as scheduler_module
+from src.tools.cassette import Cassette, cassette_key, RECORD
+from src.tools.endpoints import blast_base_url
+from src.agents.blast_agent.graph import create_blast_subgraph
+
+SEQUENCE = "ATTCTGCCTTTAGTAATTTGATGACAGAGACTTCTTGGGAACCACAGCCAGGGAGCCACCCTTTACTCCACCAACAGGTGGCTTATATCCAATCTGAGAAAGAAAGAAAAAAAAAAAAGTATTTCTCT"
+RID = "TESTRID0001"
+RESULT = b"""<?xml version="1.0"?>
+<BlastOutput>
+  <BlastOutput_iterations>
+    <Iteration>
+      <Iteration_query-def>Query_1</Iteration_query-def>
+      <Iteration_query-len>128</Iteration_query-len>
+      <Iteration_hits>
+        <Hit>
+          <Hit_def>Homo sapiens chromosome 15, GRCh38.p14 Primary Assembly</Hit_def>
+          <Hit_accession>NC_000015.10</Hit_accession>
+          <Hit_len>101991189</Hit_len>
+          <Hit_hsps>
+            <Hsp>
+              <Hsp_evalue>1e-58</Hsp_evalue>
+              <Hsp_query-from>1</Hsp_query-from>
+              <Hsp_query-to>128</Hsp_query-to>
+              <Hsp_hit-from>91950805</Hsp_hit-from>
+              <Hsp_hit-to>91950932</Hsp_hit-to>
+              <Hsp_identity>128</Hsp_identity>
+              <Hsp_align-len>128</Hsp_align-len>
+            </Hsp>
+          </Hit_hsps>
+        </Hit>
+      </Iteration_hits>
+    </Iteration>
+  </BlastOutput_iterations>
+</BlastOutput>
+"""
+
+def _record_cassette(path):
+    """录制一次BLAST查询：Put，两次仍在运行的轮询，最后得到结果"""
+    recorder = Cassette(str(path), RECORD)
+    put_url = (f"{blast_base_url()}?CMD=Put&PROGRAM=blastn&MEGABLAST=on&DATABASE=nt&FORMAT_TYPE=XML"
+               f"&QUERY={SEQUENCE}&HITLIST_SIZE=10")
+    get_url = f"{blast_base_url()}?CMD=Get&FORMAT_TYPE=XML&RID={RID}"
+    recorder.record(cassette_key(put_url), f"<!--QBlastInfoBegin\n    RID = {RID}\n    RTOE = 20\nQBlastInfoEnd\n-->\n".encode(), 1.0)
+    waiting = b"<!--QBlastInfoBegin\n\tStatus=WAITING\nQBlastInfoEnd\n-->\n"
+    recorder.record(cassette_key(get_url), waiting, 1.0)
+    recorder.record(cassette_key(get_url), waiting, 1.0)
+    recorder.record(cassette_key(get_url), RESULT, 1.0)
+
+def test_replayed_blast_question_skips_poll_sleeps(tmp_path, monkeypatch):
+    path = tmp_path / "http.jsonl.gz"
+    _record_cassette(path)
+    monkeypatch.setenv("OPENBIO_HTTP_MODE", "replay")
+    monkeypatch.setenv("OPENBIO_CASSETTE_PATH", str(path))
+    monkeypatch.setenv("BLAST_CACHE", "0")
+    monkeypatch.setenv("LOCAL_ALIGN", "0")
+    monkeypatch.setattr(cassette_module, "_cassette", None)
+    monkeypatch.setattr(scheduler_module, "_scheduler", None)
+    # 实际的轮询间隔为15、30秒，回放时不应等待
+    assert scheduler_module.POLL_INTERVAL >= 1
+
+    started = time.monotonic()
+    result = create_blast_subgraph().invoke({
+        "messages": [HumanMessage(content=f"Align the DNA sequence to the human genome: {SEQUENCE}", additional_kwargs={"type": "user_question"})],
+        "metadata": {},
+    })
+    elapsed = time.monotonic() - started
+
+    message = result["messages"][-1]
+    assert message.additional_kwargs["type"] == "blast_response"
+    assert message.additional_kwargs["hits"][0]["accession"] == "NC_000015.10"
+    assert result["metadata"]["attempt"] == 3
+    assert elapsed < scheduler_module.POLL_INTERVAL
@@ -0,0 +1,33 @@
+import asyncio
+import time
+from concurrent.futures import Future
+
+from src.agents.blast_agent import component as blast_component
+
+class _StuckScheduler:
+    """调度线程异常退出时，Future永远不会完成"""
+    def __init__(self):
+        self.future = Future()
+
+    def submit(self, rid, url, max_bytes=None, max_polls=None):
+        return self.future
+
+def _state():
+    return {"messages": [], "metadata": {"blast_rid": "RID123", "attempt": 0}}
+
+def test_stuck_scheduler_returns_waiting_error(monkeypatch):
+    scheduler = _StuckScheduler()
+    monkeypatch.setattr(blast_component, "get_blast_scheduler", lambda: scheduler)
+    monkeypatch.setattr(blast_component, "max_wait", lambda max_polls=None: 0.2)
+    component = blast_component.BlastComponent()
+
+    started = time.monotonic()
+    result = component.fetch_blast_results(_state())
+    assert time.monotonic() - started < 1
+    assert result["status"] == "error"
+    assert result["messages"][-1].content == "BLAST analysis is taking too long, please try again later"
+
+    result = asyncio.run(component.afetch_blast_results(_state()))
+    assert result["messages"][-1].additional_kwargs["type"] == "blast_error"
+    # 超时只放弃等待，调度器中的任务没有被取消
+    assert not scheduler.future.cancelled()
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.tools.call_api import call_api, acall_api
+from src.tools.rate_limiter import TokenBucket
+
+class _DripHandler(BaseHTTPRequestHandler):
+    """每0.1秒发送一个字节，持续约5秒"""
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", "50")
+        self.end_headers()
+        try:
+            for _ in range(50):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.1)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def drip_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DripHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/drip"
+    server.shutdown()
+
+def test_slow_body_is_cut_off_at_deadline(drip_url):
+    started = time.monotonic()
+    assert call_api(drip_url, max_retries=1, deadline=1) is None
+    assert time.monotonic() - started < 2.5
+
+def test_async_slow_body_is_cut_off_at_deadline(drip_url):
+    started = time.monotonic()
+    assert asyncio.run(acall_api(drip_url, max_retries=1, deadline=1)) is None
+    assert time.monotonic() - started < 2.5
+
+def test_rate_limit_wait_is_bounded():
+    bucket = TokenBucket(rate=0.5, capacity=1)
+    assert bucket.acquire(max_wait=0.1)
+    started = time.monotonic()
+    # 下一个令牌需要等2秒，超过max_wait时立即放弃并退回令牌
+    assert not bucket.acquire(max_wait=0.1)
+    assert time.monotonic() - started < 0.1
+    assert bucket.reserve() <= 2.0
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.tools import circuit_breaker as breaker_module
+from src.tools.circuit_breaker import CircuitBreaker, get_circuit_breaker, OPEN, HALF_OPEN, CLOSED
+from src.tools.call_api import acall_api
+from src.agents.search_agent.component import SearchComponent
+
+class _Handler(BaseHTTPRequestHandler):
+    """/hang 一直不返回，/bad 返回400"""
+    def do_GET(self):
+        if self.path.startswith("/hang"):
+            time.sleep(5)
+        self.send_response(400)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+
+def _open(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker("example.org", failure_threshold=2, latency_threshold=0, reset_timeout=0.05)
+    _open(breaker)
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker("example.org", failure_threshold=1, latency_threshold=0, reset_timeout=0.05)
+    _open(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+def test_lost_probe_expires_after_reset_timeout():
+    breaker = CircuitBreaker("example.org", failure_threshold=1, latency_threshold=0, reset_timeout=0.05)
+    _open(breaker)
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    # 探测请求既没有成功也没有失败（结果丢失）
+    assert not breaker.allow_request()
+    time.sleep(0.06)
+    assert breaker.allow_request()
+
+def test_cancelled_probe_releases_half_open_breaker(server_url):
+    breaker = get_circuit_breaker(server_url)
+    breaker.reset_timeout = 0.05
+    _open(breaker)
+    time.sleep(0.06)
+
+    async def main():
+        task = asyncio.create_task(acall_api(f"{server_url}/hang", max_retries=1, deadline=10))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    # reset_timeout之内探测名额已归还，下一个请求可以继续探测
+    breaker.reset_timeout = 60
+    assert breaker.allow_request()
+
+def test_search_client_errors_do_not_open_breaker(server_url):
+    search = SearchComponent()
+    for _ in range(10):
+        assert search._fetch_search(f"{server_url}/bad", {}) is None
+    assert asyncio.run(search._afetch_search(f"{server_url}/bad", {})) is None
+    assert get_circuit_breaker(server_url).state == CLOSED
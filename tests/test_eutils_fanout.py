@@ -0,0 +1,16 @@
+from src.agents.eutils_agent.component import EutilsComponent
+
+ESEARCH = b"<eSearchResult><Count>1</Count><RetMax>1</RetMax><RetStart>0</RetStart><IdList><Id>5699</Id></IdList></eSearchResult>"
+
+def test_failed_database_is_not_recorded_as_used():
+    component = EutilsComponent()
+    gene = {"db": "gene", "term": "PSMB10"}
+    protein = {"db": "protein", "term": "PSMB10"}
+    searches = [(gene, "http://eutils/esearch?db=gene"), (protein, "http://eutils/esearch?db=protein")]
+    result = component._fanout_result({"messages": [], "metadata": {}}, searches, [ESEARCH, None])
+
+    assert result["metadata"]["used_eutils_params"] == [gene]
+    metadata = result["metadata"]
+    assert component.is_duplicate_params(gene, metadata)
+    # 网络失败的库下一轮仍可重试
+    assert not component.is_duplicate_params(protein, metadata)
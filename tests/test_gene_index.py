@@ -0,0 +1,28 @@
+from src.tools.gene_index import build_index, GeneIndex
+
+HEADER = "#tax_id\tGeneID\tSymbol\tSynonyms\tdbXrefs\tchromosome\tmap_location\tdescription\ttype_of_gene\n"
+ROWS = [
+    # 人类基因排在前面，limit较小时其他物种的记录会被截掉
+    "9606\t5699\tPSMB10\tLMP10|MECL1\tMIM:176847|Ensembl:ENSG00000205220\t16\t16q22.1\tproteasome 20S subunit beta 10\tprotein-coding\n",
+    "10090\t19171\tPsmb10\tLmp10|Mecl-1\tEnsembl:ENSMUSG00000031897\t8\t8 D3\tproteasome subunit beta 10\tprotein-coding\n",
+    "10116\t291983\tPsmb10\tLmp10\t-\t19\t19q12\tproteasome 20S subunit beta 10\tprotein-coding\n",
+]
+
+def _index(tmp_path):
+    gene_info = tmp_path / "gene_info.tsv"
+    gene_info.write_text(HEADER + "".join(ROWS))
+    path = str(tmp_path / "gene_index.sqlite3")
+    assert build_index(str(gene_info), path) == 3
+    return GeneIndex(path)
+
+def test_lookup_prefers_human_symbol_match(tmp_path):
+    index = _index(tmp_path)
+    records = index.lookup("lmp10", limit=3)
+    assert [r["uid"] for r in records] == ["5699", "19171", "291983"]
+    assert records[0]["ensembl"] == ["ENSG00000205220"]
+
+def test_organism_filter_is_applied_before_limit(tmp_path):
+    index = _index(tmp_path)
+    records = index.lookup("PSMB10", limit=1, organism="Mus musculus")
+    assert [r["uid"] for r in records] == ["19171"]
+    assert index.lookup("PSMB10", limit=1, organism="Danio rerio") == []
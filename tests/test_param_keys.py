@@ -0,0 +1,24 @@
+import json
+
+from src.agents.blast_agent.component import BlastComponent
+from src.agents.eutils_agent.component import EutilsComponent
+
+ESEARCH = b"<eSearchResult><Count>1</Count><RetMax>1</RetMax><RetStart>0</RetStart><IdList><Id>5699</Id></IdList></eSearchResult>"
+
+def test_recorded_keys_are_serializable_and_state_is_not_mutated():
+    component = EutilsComponent()
+    params = {"db": "gene", "term": "PSMB10  Human"}
+    state = {"messages": [], "metadata": {"used_eutils_params": [{"db": "gene", "term": "LMP10"}]}}
+    snapshot = json.dumps(state["metadata"])
+
+    result = component._search_result(state, params, "http://eutils/esearch", ESEARCH)
+    metadata = result["metadata"]
+    assert json.dumps(state["metadata"]) == snapshot
+    assert json.loads(json.dumps(metadata))["used_eutils_keys"] == ["esearch:gene:lmp10", "esearch:gene:psmb10 human"]
+    assert component.is_duplicate_params({"db": "gene", "term": "psmb10 human"}, metadata)
+
+def test_blast_keys_rebuilt_from_legacy_params():
+    component = BlastComponent()
+    metadata = {"used_blast_params": [{"sequence": "acgt acgt"}]}
+    assert component.is_duplicate_params({"sequence": "ACGTACGT", "hitlist_size": 50}, metadata)
+    assert "used_blast_keys" not in metadata
@@ -0,0 +1,44 @@
+import pytest
+
+from src.tools import response_cache
+from src.tools.response_cache import ResponseCache
+
+BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+def test_entries_expire_per_database_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "eutils.sqlite3"), max_bytes=1024, ttls={"gene": 10, "snp": 100})
+    cache.set(f"{BASE}?db=gene&term=PSMB10", b"gene")
+    cache.set(f"{BASE}?db=snp&term=rs100", b"snp")
+    clock.now += 11
+    assert cache.get(f"{BASE}?db=gene&term=PSMB10") is None
+    assert cache.get(f"{BASE}?term=rs100&db=snp&api_key=secret") == b"snp"
+    assert cache.stats()["entries"] == 1
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "eutils.sqlite3"), max_bytes=10)
+    for n in range(3):
+        clock.now += 1
+        cache.set(f"{BASE}?db=gene&term=T{n}", b"x" * 4)
+    # 上限只容纳两条，写入T2时淘汰最早写入的T0
+    assert cache.get(f"{BASE}?db=gene&term=T0") is None
+    clock.now += 1
+    assert cache.get(f"{BASE}?db=gene&term=T1") == b"xxxx"
+    clock.now += 1
+    cache.set(f"{BASE}?db=gene&term=T3", b"x" * 4)
+    # T1刚被读取过，淘汰的是T2
+    assert cache.get(f"{BASE}?db=gene&term=T1") == b"xxxx"
+    assert cache.get(f"{BASE}?db=gene&term=T2") is None
+    assert cache.stats()["bytes"] <= 10
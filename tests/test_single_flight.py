@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.tools.single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return b"body"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while not calls:
+        pass
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [b"body"] * 5
+    assert len(calls) == 1
+
+def test_follower_survives_leader_cancellation():
+    async def main():
+        flight = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return b"body"
+
+        leader = asyncio.create_task(flight.ado("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("key", fetch))
+        await asyncio.sleep(0)
+        # 发起请求的调用方被取消（如客户端断开）
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == b"body"
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+def test_async_error_is_shared_and_key_released():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(flight.ado("key", fail), flight.ado("key", fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        async def ok():
+            return b"body"
+
+        # 上一次调用结束后同一个key可以重新发起
+        assert await flight.ado("key", ok) == b"body"
+
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import json
+import os
+
+from src.tools.snp_index import build_index, SNPIndex, MANIFEST
+from src.agents.eutils_agent import component as eutils_component
+
+def _write(path, docs):
+    path.write_text("\n".join(json.dumps(doc) for doc in docs) + "\n")
+    return str(path)
+
+def test_incremental_build_replaces_generation(tmp_path):
+    index_path = str(tmp_path / "snp_index")
+    first = _write(tmp_path / "a.jsonl", [
+        {"rsid": "rs100", "chromosome": "16", "position": 67934506, "genes": [{"id": 5699, "symbol": "PSMB10"}]},
+        {"rsid": "rs7", "chromosome": "X", "position": 5},
+    ])
+    assert build_index([first], index_path) == 2
+    second = _write(tmp_path / "b.jsonl", [{"rsid": "rs100", "chromosome": "16", "position": 67934999}])
+    assert build_index([second], index_path) == 2
+
+    index = SNPIndex(index_path)
+    assert index.generation == 2
+    assert index.lookup("rs100")["position"] == "67934999"
+    assert index.lookup("rs7")["chromosome"] == "X"
+    assert index.lookup("rs8") is None
+    # 旧一代的数组文件已删除
+    assert not [name for name in os.listdir(index_path) if ".1." in name]
+    assert json.load(open(os.path.join(index_path, MANIFEST)))["count"] == 2
+
+class _BrokenIndex:
+    def lookup(self, rsid):
+        raise ValueError("mmap length is greater than file size")
+
+def test_broken_snp_index_falls_back_to_network(monkeypatch):
+    monkeypatch.setattr(eutils_component, "get_snp_index", lambda: _BrokenIndex())
+    component = eutils_component.EutilsComponent()
+    state = {"messages": [], "metadata": {}}
+    assert component._local_snp_result(state, {"db": "snp", "term": "rs100"}) is None